@@ -18,21 +18,102 @@ def create_app():
     # Session configuration for private access
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=30)
     
+    # Pricing catalog cache: how often a worker re-checks the catalog version
+    app.config['CATALOG_VERSION_CHECK_SECONDS'] = float(os.environ.get('CATALOG_VERSION_CHECK_SECONDS', 5))
+    app.config['DATA_CACHE_MAX_AGE'] = int(os.environ.get('DATA_CACHE_MAX_AGE', 60))
+    app.config['PRICE_CACHE_MAX_AGE'] = int(os.environ.get('PRICE_CACHE_MAX_AGE', 300))
+    app.config['PRICE_BATCH_MAX_ITEMS'] = int(os.environ.get('PRICE_BATCH_MAX_ITEMS', 500))
+    # Shared price matrix file (defaults to <instance>/price_matrix.bin)
+    app.config['PRICE_MATRIX_PATH'] = os.environ.get('PRICE_MATRIX_PATH')
+    
+    # X-Admin-Key for the admin API; admin endpoints refuse every request while it is unset
+    app.config['ADMIN_API_KEY'] = os.environ.get('ADMIN_API_KEY')
+    
     # Private access token (change this to your secret)
     app.config['ACCESS_TOKEN'] = os.environ.get('ACCESS_TOKEN', 'cctv-demo-2025-secret')
     
     # Flask-Mail Configuration
     app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
     app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', True)
+    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'True') == 'True'
     app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
     app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
     app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', 'noreply@cctvsystem.ma')
     
+    app.config['COMPANY_NAME'] = os.environ.get('COMPANY_NAME', 'CCTV Pro')
+    app.config['COMPANY_EMAIL'] = os.environ.get('COMPANY_EMAIL')
+    
+    # Group-commit /quote inserts in batches (see app/group_commit.py)
+    app.config['QUOTE_GROUP_COMMIT'] = os.environ.get('QUOTE_GROUP_COMMIT', 'False') == 'True'
+    app.config['QUOTE_GROUP_COMMIT_INTERVAL_MS'] = float(os.environ.get('QUOTE_GROUP_COMMIT_INTERVAL_MS', 10))
+    app.config['QUOTE_GROUP_COMMIT_MAX_ROWS'] = int(os.environ.get('QUOTE_GROUP_COMMIT_MAX_ROWS', 100))
+    app.config['QUOTE_GROUP_COMMIT_MAX_PENDING'] = int(os.environ.get('QUOTE_GROUP_COMMIT_MAX_PENDING', 1000))
+    app.config['QUOTE_GROUP_COMMIT_TIMEOUT'] = float(os.environ.get('QUOTE_GROUP_COMMIT_TIMEOUT', 2))
+    app.config['QUOTE_GROUP_COMMIT_STALL_SECONDS'] = float(os.environ.get('QUOTE_GROUP_COMMIT_STALL_SECONDS', 5))
+    
+    # Idempotency-Key replay window and per-process cache of recent keys
+    app.config['IDEMPOTENCY_KEY_TTL_SECONDS'] = int(os.environ.get('IDEMPOTENCY_KEY_TTL_SECONDS', 86400))
+    app.config['IDEMPOTENCY_LOCK_SECONDS'] = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+    app.config['IDEMPOTENCY_CACHE_SIZE'] = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 4096))
+    
+    # App-wide request body cap; schemas in app/validation.py set tighter per-route limits
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))
+    
+    # Admin lists: how long a ?total=true count is reused
+    app.config['PAGINATION_TOTAL_CACHE_SECONDS'] = float(os.environ.get('PAGINATION_TOTAL_CACHE_SECONDS', 30))
+    
+    # Admin read endpoints: responses are fresh for N seconds (0 disables), then
+    # served stale for up to M more while one background refresh runs
+    app.config['RESPONSE_CACHE_SECONDS'] = float(os.environ.get('RESPONSE_CACHE_SECONDS', 10))
+    app.config['RESPONSE_CACHE_STALE_SECONDS'] = float(os.environ.get('RESPONSE_CACHE_STALE_SECONDS', 60))
+    app.config['RESPONSE_CACHE_MAX_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 500))
+    
+    # Rows fetched per round trip by streaming exports (GET /quotes)
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    
+    # Duplicate-lead detection: link repeat quotes to an open one from the last N days (0 disables)
+    app.config['DUPLICATE_WINDOW_DAYS'] = int(os.environ.get('DUPLICATE_WINDOW_DAYS', 7))
+    app.config['DUPLICATE_BLOOM_CAPACITY'] = int(os.environ.get('DUPLICATE_BLOOM_CAPACITY', 100000))
+    app.config['DUPLICATE_BLOOM_REFRESH_SECONDS'] = float(os.environ.get('DUPLICATE_BLOOM_REFRESH_SECONDS', 5))
+    
+    # Partner bulk quote uploads (POST /api/partner/quotes); keys are name:key,name:key
+    app.config['PARTNER_API_KEYS'] = os.environ.get('PARTNER_API_KEYS', '')
+    app.config['PARTNER_INGEST_MAX_BYTES'] = int(os.environ.get('PARTNER_INGEST_MAX_BYTES', 50 * 1024 * 1024))
+    app.config['PARTNER_INGEST_CHUNK_SIZE'] = int(os.environ.get('PARTNER_INGEST_CHUNK_SIZE', 500))
+    
+    # Per-IP rate limits shared by the workers on this node (see app/rate_limit.py)
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'True') == 'True'
+    app.config['RATE_LIMITS'] = os.environ.get('RATE_LIMITS', '')
+    app.config['RATE_LIMIT_DB_PATH'] = os.environ.get('RATE_LIMIT_DB_PATH')
+    # Number of reverse proxies in front of the app (1 on Railway) for X-Forwarded-For
+    app.config['RATE_LIMIT_PROXY_COUNT'] = int(os.environ.get('RATE_LIMIT_PROXY_COUNT', 0))
+    
+    # Email outbox worker (flask outbox-worker)
+    app.config['OUTBOX_BATCH_SIZE'] = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+    app.config['OUTBOX_POLL_INTERVAL'] = float(os.environ.get('OUTBOX_POLL_INTERVAL', 2))
+    app.config['OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+    app.config['OUTBOX_BACKOFF_BASE'] = float(os.environ.get('OUTBOX_BACKOFF_BASE', 30))
+    app.config['OUTBOX_BACKOFF_MAX'] = float(os.environ.get('OUTBOX_BACKOFF_MAX', 3600))
+    app.config['OUTBOX_LEASE_SECONDS'] = int(os.environ.get('OUTBOX_LEASE_SECONDS', 300))
+    app.config['OUTBOX_SMTP_IDLE_SECONDS'] = float(os.environ.get('OUTBOX_SMTP_IDLE_SECONDS', 60))
+    
+    # Admin new-quote notifications: 'immediate' sends one per quote, 'digest' batches them
+    app.config['ADMIN_NOTIFICATION_MODE'] = os.environ.get('ADMIN_NOTIFICATION_MODE', 'immediate')
+    app.config['ADMIN_DIGEST_WINDOW_SECONDS'] = int(os.environ.get('ADMIN_DIGEST_WINDOW_SECONDS', 300))
+    app.config['ADMIN_DIGEST_MAX_ITEMS'] = int(os.environ.get('ADMIN_DIGEST_MAX_ITEMS', 50))
+    # Quotes matching either threshold skip the digest (empty disables it)
+    app.config['ADMIN_URGENT_MIN_PRICE'] = float(os.environ.get('ADMIN_URGENT_MIN_PRICE') or 0) or None
+    app.config['ADMIN_URGENT_MIN_CAMERAS'] = int(os.environ.get('ADMIN_URGENT_MIN_CAMERAS') or 0) or None
+    
     # Initialize extensions
     db.init_app(app)
     mail.init_app(app)
     
+    # rollups, response_cache and search register their session hooks on import
+    from . import rate_limit, response_cache, rollups, search, validation  # noqa: F401
+    rate_limit.init_app(app)
+    validation.init_app(app)
+    
     with app.app_context():
         # Import and register blueprints
         from .routes import main_bp, api_bp, contact_bp, admin_bp, technician_bp, payment_bp
@@ -0,0 +1,143 @@
+"""Time series of quotes, conversions and revenue for the admin charts.
+
+Points are summed from the cube slice that breaks the metrics down by
+exactly the group and the filtered fields (``quote_metrics`` and
+``revenue_metrics``, see app/rollups.py), one row per day and combination,
+and summed into day, week (Monday to Sunday) or month buckets by the
+query. So a year of points is at most a few thousand rollup rows however
+many quotes there are. The rollups are updated in the same transaction as every write,
+so the current bucket is as fresh as the live tables without reading them.
+
+Quotes and conversions are counted by the day the quote was created, so a
+bucket's conversion rate is the share of that bucket's quotes that are
+converted now. Revenue is the total of paid and issued invoices by issue
+day, grouped by the invoice's quote.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import Date, cast, func, literal, select, type_coerce
+
+from app.models_extended import QuoteMetrics, RevenueMetrics
+from app.rollups import slice_name
+
+BUCKETS = ('day', 'week', 'month')
+GROUPS = {'location': 'location_id', 'resolution': 'resolution', 'service': 'service'}
+MAX_POINTS = 1000
+
+
+def bucket_start(day: date, bucket: str) -> date:
+    """First day of the bucket holding ``day``"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next(start: date, bucket: str) -> date:
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _bucket(day, bucket: str, dialect: str):
+    """SQL expression for the first day of the bucket holding ``day``"""
+    if bucket == 'day':
+        return day
+    if dialect == 'sqlite':
+        # 'weekday 1' moves forward to a Monday, so step back 6 days first
+        modifiers = ('-6 days', 'weekday 1') if bucket == 'week' else ('start of month',)
+        return type_coerce(func.date(day, *modifiers), Date)
+    return cast(func.date_trunc(bucket, day), Date)
+
+
+def _points(model, measures: tuple, start: date, end: date, bucket: str, group: str, filters: dict,
+            dialect: str):
+    """Rows with ``day`` (bucket start), ``grp`` (None without ``group``) and the measures"""
+    columns = {GROUPS[name]: value for name, value in filters.items()}
+    day = _bucket(model.day, bucket, dialect).label('day')
+    keys = [day] + ([getattr(model, GROUPS[group])] if group else [])
+    where = [
+        model.dimensions == slice_name(set(columns) | ({GROUPS[group]} if group else set())),
+        model.day >= start, model.day < end,
+    ]
+    where += [getattr(model, column) == value for column, value in columns.items()]
+    return select(
+        day, (keys[1] if group else literal(None)).label('grp'),
+        *(func.sum(getattr(model, name)).label(name) for name in measures)
+    ).where(*where).group_by(*keys)
+
+
+def _group_value(group: str, value):
+    # The rollups store 0 / '' for a quote without a location / resolution
+    return (value or None) if group in ('location', 'resolution') else value
+
+
+def timeseries(session, start: date, end: date, bucket: str = 'day', group_by: str = None,
+               filters: dict = None) -> dict:
+    """Points from ``start`` (inclusive) to ``end`` (exclusive), widened to
+    whole buckets. ``filters`` maps GROUPS names to a value. Raises
+    ValueError for an empty range or more than MAX_POINTS buckets."""
+    if bucket not in BUCKETS:
+        raise ValueError(f'bucket must be one of: {", ".join(BUCKETS)}')
+    if group_by is not None and group_by not in GROUPS:
+        raise ValueError(f'group_by must be one of: {", ".join(GROUPS)}')
+    if end <= start:
+        raise ValueError('end must be after start')
+
+    start = bucket_start(start, bucket)
+    last = bucket_start(end - timedelta(days=1), bucket)
+    starts = [start]
+    while starts[-1] < last:
+        if len(starts) >= MAX_POINTS:
+            raise ValueError(f'at most {MAX_POINTS} buckets per request; use a larger bucket')
+        starts.append(_next(starts[-1], bucket))
+    end = _next(last, bucket)
+    filters = filters or {}
+
+    dialect = session.get_bind().dialect.name
+    quotes = _points(QuoteMetrics, ('quotes', 'converted'), start, end, bucket, group_by, filters, dialect)
+    revenue = _points(RevenueMetrics, ('revenue',), start, end, bucket, group_by, filters, dialect)
+
+    series = {}
+
+    def point(day, group):
+        points = series.setdefault(_group_value(group_by, group), {})
+        return points.setdefault(day, {'quotes': 0, 'converted': 0, 'revenue': 0.0})
+
+    for row in session.execute(quotes):
+        values = point(row.day, row.grp)
+        values['quotes'] += row.quotes
+        values['converted'] += row.converted
+    for row in session.execute(revenue):
+        point(row.day, row.grp)['revenue'] += row.revenue or 0
+    if not series:
+        series[None] = {}
+
+    empty = {'quotes': 0, 'converted': 0, 'revenue': 0.0}
+    return {
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'group_by': group_by,
+        'currency': 'MAD',
+        'series': [
+            {
+                'group': group,
+                'points': [
+                    {
+                        'start': day.isoformat(),
+                        'quotes': values['quotes'],
+                        'converted': values['converted'],
+                        'conversion_rate': round(values['converted'] / values['quotes'] * 100, 2)
+                        if values['quotes'] else 0,
+                        'revenue': round(values['revenue'], 2),
+                    }
+                    for day, values in ((day, points.get(day, empty)) for day in starts)
+                ]
+            }
+            for group, points in sorted(series.items(), key=lambda item: (item[0] is None, str(item[0])))
+        ]
+    }
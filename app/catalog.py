@@ -0,0 +1,266 @@
+"""In-process cache of the pricing reference tables.
+
+Locations, camera specifications, difficulty levels and the pricing rules
+change a few times a year, so each worker loads them once into an immutable
+``Catalog`` snapshot with the per-language dictionaries already built and the
+pricing plan compiled. Every flush that touches one of those tables bumps the ``catalog_version`` row; workers compare their
+snapshot against it at most every ``CATALOG_VERSION_CHECK_SECONDS`` and reload
+when it moved. The worker that made the change drops its snapshot on commit.
+"""
+import json
+import threading
+import time
+from datetime import datetime
+from types import MappingProxyType
+from typing import NamedTuple
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import (
+    Location, CameraSpecification, InstallationDifficulty, CatalogVersion, PricingRuleSet
+)
+from app.pricing import compile_plan
+
+LANGUAGES = ('ar', 'fr', 'en')
+CATALOG_MODELS = (Location, CameraSpecification, InstallationDifficulty, PricingRuleSet)
+
+
+class LocationEntry(NamedTuple):
+    id: int
+    names: MappingProxyType
+    difficulty_multiplier: float
+    travel_fee: float
+
+    def get_name(self, lang: str) -> str:
+        return self.names.get(lang, self.names['ar'])
+
+    def to_dict(self, lang: str) -> dict:
+        """Same shape as ``Location.to_dict``"""
+        return {
+            'id': self.id,
+            'name': self.get_name(lang),
+            'difficulty_multiplier': self.difficulty_multiplier,
+            'travel_fee': self.travel_fee,
+            'language': lang
+        }
+
+
+class ResolutionEntry(NamedTuple):
+    id: int
+    resolution: str
+    base_price: float
+    descriptions: MappingProxyType
+
+    def get_description(self, lang: str) -> str:
+        return self.descriptions.get(lang, self.descriptions['ar'])
+
+    def to_dict(self, lang: str) -> dict:
+        """Same shape as ``CameraSpecification.to_dict``"""
+        return {
+            'id': self.id,
+            'resolution': self.resolution,
+            'base_price': self.base_price,
+            'description': self.get_description(lang),
+            'currency': 'MAD',
+            'language': lang
+        }
+
+
+class DifficultyEntry(NamedTuple):
+    id: int
+    level: str
+    levels: MappingProxyType
+    cost_multiplier: float
+    hours_required: float
+    descriptions: MappingProxyType
+
+    def get_level(self, lang: str) -> str:
+        return self.levels.get(lang, self.levels['ar'])
+
+    def get_description(self, lang: str) -> str:
+        return self.descriptions.get(lang, self.descriptions['ar'])
+
+    def to_dict(self, lang: str) -> dict:
+        """Same shape as ``InstallationDifficulty.to_dict``"""
+        return {
+            'id': self.id,
+            'level': self.get_level(lang),
+            'cost_multiplier': self.cost_multiplier,
+            'hours_required': self.hours_required,
+            'description': self.get_description(lang),
+            'language': lang
+        }
+
+
+class Catalog:
+    """Immutable snapshot of the pricing reference tables at one version"""
+
+    def __init__(self, version: int, locations, resolutions, difficulties,
+                 rules: dict = None, rules_version: int = None):
+        self.version = version
+        self.locations = tuple(locations)
+        self.resolutions = tuple(resolutions)
+        self.difficulties = tuple(difficulties)
+        self.rules_version = rules_version
+        self.pricing_plan = compile_plan(rules, self.locations, self.resolutions, self.difficulties)
+
+        self.location_by_id = MappingProxyType({l.id: l for l in self.locations})
+        self.resolution_by_name = MappingProxyType({r.resolution: r for r in self.resolutions})
+        self.difficulty_by_level = MappingProxyType({d.level: d for d in self.difficulties})
+
+        self._dicts = {
+            lang: {
+                'locations': [l.to_dict(lang) for l in self.locations],
+                'resolutions': [r.to_dict(lang) for r in self.resolutions],
+                'difficulties': [d.to_dict(lang) for d in self.difficulties],
+            }
+            for lang in LANGUAGES
+        }
+        self._memo = {}
+
+    def as_dicts(self, kind: str, lang: str) -> list:
+        """Serialized rows of one table ('locations', 'resolutions' or
+        'difficulties'). The returned list is shared and must not be mutated."""
+        if lang in self._dicts:
+            return self._dicts[lang][kind]
+        return [entry.to_dict(lang) for entry in getattr(self, kind)]
+
+    def memoize(self, key, factory):
+        """Cache a value derived from this snapshot; it is dropped together
+        with the snapshot when the version moves."""
+        try:
+            return self._memo[key]
+        except KeyError:
+            return self._memo.setdefault(key, factory())
+
+    def __repr__(self):
+        return f'<Catalog v{self.version}>'
+
+
+class _CatalogState:
+    """Per-application holder for the current snapshot"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.catalog = None
+        self.checked_at = 0.0
+
+
+def _state() -> _CatalogState:
+    return current_app.extensions.setdefault('catalog', _CatalogState())
+
+
+def _read_version() -> int:
+    version = db.session.execute(
+        select(CatalogVersion.version).where(CatalogVersion.id == 1)
+    ).scalar()
+    return version or 0
+
+
+def _load(version: int) -> Catalog:
+    locations = [
+        LocationEntry(
+            id=l.id,
+            names=MappingProxyType({'ar': l.name_ar, 'fr': l.name_fr, 'en': l.name_en}),
+            difficulty_multiplier=l.difficulty_multiplier,
+            travel_fee=l.travel_fee
+        )
+        for l in Location.query.order_by(Location.id).all()
+    ]
+    resolutions = [
+        ResolutionEntry(
+            id=c.id,
+            resolution=c.resolution,
+            base_price=c.base_price,
+            descriptions=MappingProxyType({'ar': c.description_ar, 'fr': c.description_fr, 'en': c.description_en})
+        )
+        for c in CameraSpecification.query.order_by(CameraSpecification.id).all()
+    ]
+    difficulties = [
+        DifficultyEntry(
+            id=d.id,
+            level=d.level,
+            levels=MappingProxyType({'ar': d.level_ar, 'fr': d.level_fr, 'en': d.level}),
+            cost_multiplier=d.cost_multiplier,
+            hours_required=d.hours_required,
+            descriptions=MappingProxyType({'ar': d.description_ar, 'fr': d.description_fr, 'en': d.description_en})
+        )
+        for d in InstallationDifficulty.query.order_by(InstallationDifficulty.id).all()
+    ]
+    rule_set = (PricingRuleSet.query.filter_by(is_active=True)
+                .order_by(PricingRuleSet.id.desc()).first())
+    rules = json.loads(rule_set.definition) if rule_set else None
+    return Catalog(version, locations, resolutions, difficulties,
+                   rules=rules, rules_version=rule_set.id if rule_set else None)
+
+
+def get_catalog() -> Catalog:
+    """Return the current catalog snapshot, reloading it if the version moved"""
+    state = _state()
+    interval = current_app.config.get('CATALOG_VERSION_CHECK_SECONDS', 5)
+    catalog = state.catalog
+    if catalog is not None and time.monotonic() - state.checked_at < interval:
+        return catalog
+
+    with state.lock:
+        # The version is read before the rows: a write landing in between
+        # leaves us with newer rows under an older version, which the next
+        # check corrects. The other order could pin stale rows forever.
+        version = _read_version()
+        if state.catalog is None or state.catalog.version != version:
+            state.catalog = _load(version)
+        state.checked_at = time.monotonic()
+        return state.catalog
+
+
+def invalidate():
+    """Force the next ``get_catalog`` call in this worker to re-check the version"""
+    if has_app_context():
+        _state().checked_at = 0.0
+
+
+def bump_version(connection):
+    """Increment the catalog version on the given connection"""
+    table = CatalogVersion.__table__
+    now = datetime.utcnow()
+    result = connection.execute(
+        table.update()
+        .where(table.c.id == 1)
+        .values(version=table.c.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(id=1, version=1, updated_at=now))
+
+
+def _touches_catalog(session) -> bool:
+    for obj in session.new:
+        if isinstance(obj, CATALOG_MODELS):
+            return True
+    for obj in session.deleted:
+        if isinstance(obj, CATALOG_MODELS):
+            return True
+    for obj in session.dirty:
+        if isinstance(obj, CATALOG_MODELS) and session.is_modified(obj):
+            return True
+    return False
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    if _touches_catalog(session):
+        bump_version(session.connection())
+        session.info['catalog_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop('catalog_dirty', False):
+        invalidate()
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _after_rollback(session, previous_transaction):
+    session.info.pop('catalog_dirty', None)
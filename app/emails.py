@@ -0,0 +1,100 @@
+"""Email rendering from per-language Jinja templates.
+
+Templates live in ``app/templates/email/<lang>/`` as ``<kind>.subject.txt``,
+``<kind>.txt`` and ``<kind>.html``; the HTML ones extend ``base.html``, which
+switches to right-to-left layout for Arabic. A kind missing for a language
+falls back to English (admin emails only exist in English).
+
+They are rendered through a dedicated Jinja environment rather than Flask's:
+it keeps compiled templates in memory, persists their bytecode under
+``<instance>/email_templates_cache`` so a new worker skips the parsing and
+compilation step, and only autoescapes the HTML variants. Only the requested
+language is ever rendered.
+"""
+import os
+from typing import NamedTuple
+
+from flask import current_app
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, TemplateNotFound
+
+FALLBACK_LANGUAGE = 'en'
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    body: str
+    html: str
+
+
+class _EmailTemplates:
+    """Compiled templates per (kind, lang), resolved once per process"""
+
+    def __init__(self, app):
+        cache_dir = os.path.join(app.instance_path, 'email_templates_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        self.environment = Environment(
+            loader=FileSystemLoader(os.path.join(app.root_path, 'templates', 'email')),
+            bytecode_cache=FileSystemBytecodeCache(cache_dir),
+            autoescape=lambda name: bool(name) and name.endswith('.html'),
+            auto_reload=app.debug,
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        self.environment.globals['company_name'] = app.config['COMPANY_NAME']
+        self._resolved = {}
+
+    def get(self, kind: str, lang: str) -> tuple:
+        key = (kind, lang)
+        templates = self._resolved.get(key)
+        if templates is None:
+            templates = tuple(
+                self._select(kind, lang, suffix) for suffix in ('subject.txt', 'txt', 'html')
+            )
+            self._resolved[key] = templates
+        return templates
+
+    def _select(self, kind: str, lang: str, suffix: str):
+        try:
+            return self.environment.get_template(f'{lang}/{kind}.{suffix}')
+        except TemplateNotFound:
+            return self.environment.get_template(f'{FALLBACK_LANGUAGE}/{kind}.{suffix}')
+
+
+def _templates() -> _EmailTemplates:
+    templates = current_app.extensions.get('email_templates')
+    if templates is None:
+        templates = current_app.extensions['email_templates'] = _EmailTemplates(current_app)
+    return templates
+
+
+def _render(templates: tuple, lang: str, context: dict) -> RenderedEmail:
+    subject_template, text_template, html_template = templates
+    subject = subject_template.render(context, lang=lang).strip()
+    return RenderedEmail(
+        subject=subject,
+        body=text_template.render(context, lang=lang),
+        html=html_template.render(context, lang=lang, subject=subject),
+    )
+
+
+def render(kind: str, lang: str, **context) -> RenderedEmail:
+    """Render the subject, text and HTML bodies of one email"""
+    return _render(_templates().get(kind, lang), lang, context)
+
+
+def render_many(kind: str, messages) -> list:
+    """Render many emails of one kind.
+
+    ``messages`` is an iterable of ``(lang, context)`` pairs. Templates are
+    resolved once per language for the whole batch.
+    """
+    templates = _templates()
+    by_lang = {}
+    rendered = []
+    for lang, context in messages:
+        compiled = by_lang.get(lang)
+        if compiled is None:
+            compiled = by_lang[lang] = templates.get(kind, lang)
+        rendered.append(_render(compiled, lang, context))
+    return rendered
+
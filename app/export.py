@@ -0,0 +1,61 @@
+"""Streaming encoders for large exports.
+
+Each encoder takes an iterable of dicts (all with the same keys) and yields
+text chunks, so a view can return them as a chunked response while rows
+are still being read. Rows are buffered into chunks of ``CHUNK_ROWS``
+before being yielded, which keeps the number of writes to the socket low
+without holding more than one chunk in memory.
+"""
+import csv
+import io
+import json
+
+CHUNK_ROWS = 500
+
+
+def _chunked(lines):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= CHUNK_ROWS:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _dumps(row: dict) -> str:
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_ndjson(rows):
+    """One JSON object per line"""
+    return _chunked(_dumps(row) + '\n' for row in rows)
+
+
+def iter_csv(rows, columns: list):
+    """CSV with a header row; values of other types are written with str()"""
+    def lines():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row.get(column) for column in columns])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    return _chunked(lines())
+
+
+def iter_json(rows, key: str = 'data'):
+    """``{"success": true, "<key>": [...], "count": n}``, with the count
+    written after the rows since it is only known at the end"""
+    def lines():
+        count = 0
+        yield f'{{"success":true,"{key}":['
+        for row in rows:
+            yield (',' if count else '') + _dumps(row)
+            count += 1
+        yield f'],"count":{count}}}'
+    return _chunked(lines())
@@ -0,0 +1,225 @@
+"""Group commit for bursty inserts (opt-in with ``QUOTE_GROUP_COMMIT``).
+
+Instead of one transaction per request, request threads hand validated rows
+to a per-process flusher thread and wait. The flusher collects rows for up
+to ``QUOTE_GROUP_COMMIT_INTERVAL_MS`` or ``QUOTE_GROUP_COMMIT_MAX_ROWS``,
+inserts them in one flush (SQLAlchemy turns same-table inserts into
+multi-row ``INSERT ... RETURNING`` on SQLite and Postgres), runs each row's
+``after_insert`` callback (e.g. to queue its emails) and commits once. Each
+waiting request is released with its row's ``to_dict()`` after that commit.
+
+Durability: a request is only answered after the transaction holding its row
+has committed, so every acknowledged row is exactly as durable as with a
+per-request commit. What the batching trades is latency (up to one interval)
+and failure isolation: if a batch fails it is rolled back and its rows are
+retried one transaction each, so one bad row cannot fail its neighbours.
+Rows still queued when the process is killed were never acknowledged; their
+clients see a dropped connection. On a normal interpreter exit the queue is
+drained first.
+
+Batches only fill up when one process serves several requests at once, so
+group commit needs threaded workers (``gunicorn --worker-class gthread
+--threads N``, or gevent). A sync worker has one request in flight, so its
+batches would hold a single row and only add latency; there ``enabled()``
+logs a warning once and requests commit their rows directly.
+
+Fallback: ``insert`` raises ``Unavailable`` (and the caller commits the row
+itself) when the flusher thread is dead, has not been heard from within
+``QUOTE_GROUP_COMMIT_STALL_SECONDS``, has failed several batches in a row, or
+has ``QUOTE_GROUP_COMMIT_MAX_PENDING`` rows waiting. A row that waited
+``QUOTE_GROUP_COMMIT_TIMEOUT`` seconds without being picked up is withdrawn
+the same way; once the flusher has picked it up the request waits for the
+outcome, since falling back then could insert it twice.
+"""
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from flask import current_app, request
+
+from app import db
+
+MAX_CONSECUTIVE_FAILURES = 3
+
+
+class Unavailable(Exception):
+    """The group committer cannot take this row; commit it directly"""
+
+
+class _Pending:
+    __slots__ = ('model', 'fields', 'after_insert', 'future')
+
+    def __init__(self, model, fields: dict, after_insert):
+        self.model = model
+        self.fields = fields
+        self.after_insert = after_insert
+        self.future = Future()
+
+
+class GroupCommitter:
+    """Per-process flusher thread and its queue"""
+
+    def __init__(self, app):
+        self.app = app
+        self.interval = app.config['QUOTE_GROUP_COMMIT_INTERVAL_MS'] / 1000
+        self.max_rows = app.config['QUOTE_GROUP_COMMIT_MAX_ROWS']
+        self.max_pending = app.config['QUOTE_GROUP_COMMIT_MAX_PENDING']
+        self.stall_seconds = app.config['QUOTE_GROUP_COMMIT_STALL_SECONDS']
+        self._queue = queue.Queue()
+        self._stopping = False
+        self._last_beat = time.monotonic()
+        self._consecutive_failures = 0
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def healthy(self) -> bool:
+        return (
+            not self._stopping
+            and self._thread.is_alive()
+            and time.monotonic() - self._last_beat < self.stall_seconds
+            and self._consecutive_failures < MAX_CONSECUTIVE_FAILURES
+            and self._queue.qsize() < self.max_pending
+        )
+
+    def needs_restart(self) -> bool:
+        return not self._stopping and not self._thread.is_alive()
+
+    def submit(self, model, fields: dict, after_insert=None) -> Future:
+        if not self.healthy():
+            raise Unavailable('group commit flusher is unhealthy')
+        pending = _Pending(model, fields, after_insert)
+        self._queue.put(pending)
+        return pending.future
+
+    def stop(self, timeout: float = 5):
+        """Drain the queue and stop the flusher"""
+        if self._stopping:
+            return
+        self._stopping = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            try:
+                first = self._queue.get(timeout=min(1.0, self.stall_seconds / 2))
+            except queue.Empty:
+                self._last_beat = time.monotonic()
+                continue
+            batch, stop = self._collect(first)
+            self._last_beat = time.monotonic()
+            if batch:
+                self._flush(batch)
+            self._last_beat = time.monotonic()
+            if stop:
+                return
+
+    def _collect(self, first):
+        """Gather rows until the interval elapses or the batch is full"""
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_rows:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                return self._claim(batch), True
+            batch.append(item)
+        return self._claim(batch), False
+
+    @staticmethod
+    def _claim(batch: list) -> list:
+        # Rows withdrawn by a request that stopped waiting are dropped here
+        return [p for p in batch if p.future.set_running_or_notify_cancel()]
+
+    def _flush(self, batch: list):
+        with self.app.app_context():
+            try:
+                results = self._commit(batch)
+            except Exception as e:
+                db.session.rollback()
+                self._consecutive_failures += 1
+                self.app.logger.warning(f"Group commit of {len(batch)} rows failed, retrying singly: {e}")
+                for pending in batch:
+                    try:
+                        (result,) = self._commit([pending])
+                    except Exception as row_error:
+                        db.session.rollback()
+                        pending.future.set_exception(row_error)
+                    else:
+                        pending.future.set_result(result)
+                return
+            self._consecutive_failures = 0
+            for pending, result in zip(batch, results):
+                pending.future.set_result(result)
+
+    @staticmethod
+    def _commit(batch: list) -> list:
+        """Insert ``batch`` in one transaction; returns each row's ``to_dict()``"""
+        rows = [p.model(**p.fields) for p in batch]
+        db.session.add_all(rows)
+        db.session.flush()
+        for pending, row in zip(batch, rows):
+            if pending.after_insert:
+                pending.after_insert(row)
+        # Serialize before commit expires the instances
+        results = [row.to_dict() for row in rows]
+        db.session.commit()
+        return results
+
+
+_lock = threading.Lock()
+_warned_single_threaded = False
+
+
+def _committer() -> GroupCommitter:
+    app = current_app._get_current_object()
+    committer = app.extensions.get('group_commit')
+    if committer is None or committer.needs_restart():
+        with _lock:
+            committer = app.extensions.get('group_commit')
+            if committer is None or committer.needs_restart():
+                committer = app.extensions['group_commit'] = GroupCommitter(app)
+    return committer
+
+
+def enabled() -> bool:
+    """True if ``QUOTE_GROUP_COMMIT`` is on and this worker serves requests
+    concurrently (see the module docstring)"""
+    global _warned_single_threaded
+    if not current_app.config['QUOTE_GROUP_COMMIT']:
+        return False
+    if request.environ.get('wsgi.multithread'):
+        return True
+    if not _warned_single_threaded:
+        _warned_single_threaded = True
+        current_app.logger.warning(
+            "QUOTE_GROUP_COMMIT needs threaded workers (gunicorn --worker-class gthread --threads N); "
+            "committing quotes directly"
+        )
+    return False
+
+
+def insert(model, fields: dict, after_insert=None) -> dict:
+    """Insert ``model(**fields)`` through the group committer.
+
+    ``after_insert(row)`` runs in the same transaction once the row has its
+    id. Returns ``row.to_dict()`` after the commit, or raises ``Unavailable``
+    if the caller should insert the row itself. Errors from the row's own
+    transaction are re-raised.
+    """
+    future = _committer().submit(model, fields, after_insert)
+    try:
+        return future.result(timeout=current_app.config['QUOTE_GROUP_COMMIT_TIMEOUT'])
+    except FutureTimeoutError:
+        if future.cancel():
+            raise Unavailable('group commit flusher did not pick up the row in time')
+        return future.result()
+
@@ -0,0 +1,91 @@
+"""Translated user-facing strings (Arabic, French, English).
+
+Arabic is the default: unknown languages and missing keys fall back to it,
+then to the key itself.
+"""
+from flask import g
+
+TRANSLATIONS = {
+    'ar': {
+        'thank_you': 'شكراً لطلبك',
+        'received': 'تم استقبال طلبك بنجاح',
+        'error': 'حدث خطأ في المعالجة',
+        'invalid_email': 'البريد الإلكتروني غير صحيح',
+        'invalid_phone': 'رقم الهاتف غير صحيح',
+        'invalid_name': 'الاسم غير صحيح',
+        'invalid_message': 'الرسالة يجب أن تكون 10 أحرف على الأقل',
+        'quote_id': 'رقم الطلب',
+        'invalid_price_token': 'عرض السعر غير صالح، يرجى إعادة الحساب',
+        'required': 'هذا الحقل مطلوب',
+        'invalid_value': 'قيمة غير صالحة',
+        'invalid_format': 'الصيغة غير صحيحة',
+        'invalid_date': 'التاريخ غير صحيح',
+        'too_short': 'يجب أن يحتوي على {min_length} أحرف على الأقل',
+        'too_long': 'يجب ألا يتجاوز {max_length} حرفاً',
+        'too_small': 'يجب أن تكون القيمة {min} على الأقل',
+        'too_large': 'يجب ألا تتجاوز القيمة {max}',
+        'invalid_choice': 'يجب أن تكون إحدى القيم: {choices}',
+        'too_many_items': 'الحد الأقصى {max_items} عنصر',
+        'validation_failed': 'الطلب غير صالح',
+        'invalid_json': 'يجب أن يكون محتوى الطلب كائن JSON',
+        'payload_too_large': 'حجم الطلب كبير جداً',
+    },
+    'fr': {
+        'thank_you': 'Merci pour votre demande',
+        'received': 'Votre demande a été reçue avec succès',
+        'error': 'Une erreur s\'est produite lors du traitement',
+        'invalid_email': 'E-mail invalide',
+        'invalid_phone': 'Numéro de téléphone invalide',
+        'invalid_name': 'Nom invalide',
+        'invalid_message': 'Le message doit contenir au moins 10 caractères',
+        'quote_id': 'ID de devis',
+        'invalid_price_token': 'Devis de prix invalide, veuillez recalculer',
+        'required': 'Ce champ est obligatoire',
+        'invalid_value': 'Valeur invalide',
+        'invalid_format': 'Format invalide',
+        'invalid_date': 'Date invalide',
+        'too_short': 'Doit contenir au moins {min_length} caractères',
+        'too_long': 'Doit contenir au plus {max_length} caractères',
+        'too_small': 'Doit être au moins {min}',
+        'too_large': 'Doit être au plus {max}',
+        'invalid_choice': 'Doit être l\'une des valeurs : {choices}',
+        'too_many_items': '{max_items} éléments au maximum',
+        'validation_failed': 'Requête invalide',
+        'invalid_json': 'Le corps de la requête doit être un objet JSON',
+        'payload_too_large': 'La requête est trop volumineuse',
+    },
+    'en': {
+        'thank_you': 'Thank you for your request',
+        'received': 'Your request has been received successfully',
+        'error': 'An error occurred during processing',
+        'invalid_email': 'Invalid email address',
+        'invalid_phone': 'Invalid phone number',
+        'invalid_name': 'Invalid name',
+        'invalid_message': 'Message must be at least 10 characters',
+        'quote_id': 'Quote ID',
+        'invalid_price_token': 'Invalid price quote, please recalculate',
+        'required': 'This field is required',
+        'invalid_value': 'Invalid value',
+        'invalid_format': 'Invalid format',
+        'invalid_date': 'Invalid date',
+        'too_short': 'Must be at least {min_length} characters',
+        'too_long': 'Must be at most {max_length} characters',
+        'too_small': 'Must be at least {min}',
+        'too_large': 'Must be at most {max}',
+        'invalid_choice': 'Must be one of: {choices}',
+        'too_many_items': 'At most {max_items} items',
+        'validation_failed': 'Invalid request',
+        'invalid_json': 'Request body must be a JSON object',
+        'payload_too_large': 'Request body is too large',
+    }
+}
+
+
+def get_translation(lang: str, key: str) -> str:
+    """Get translated string"""
+    return TRANSLATIONS.get(lang, TRANSLATIONS['ar']).get(key, key)
+
+
+def current_language() -> str:
+    """Language of the current request"""
+    return g.get('current_lang', 'ar')
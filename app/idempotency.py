@@ -0,0 +1,213 @@
+"""``Idempotency-Key`` support for POST endpoints.
+
+A client that may retry a request (double taps, flaky mobile networks)
+sends a unique ``Idempotency-Key`` header. The first request with a key
+claims it in ``idempotency_keys`` before the view runs; a successful (2xx)
+response is stored on that row and every later request with the same key
+gets the stored response back (with ``Idempotent-Replayed: true``) without
+the view running again: no validation, no insert, no email, no gateway call.
+
+Recent completed keys are also kept in a per-process LRU, so a replay
+usually costs a dict lookup. Non-2xx responses and exceptions release the
+key so the client can retry. A retry that arrives while the first request is
+still running gets 409; reusing a key with a different body gets 422. Keys
+expire after ``IDEMPOTENCY_KEY_TTL_SECONDS`` (``flask purge-idempotency-keys``
+deletes them).
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import NamedTuple
+
+from flask import current_app, jsonify, make_response, request
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse(NamedTuple):
+    request_hash: str
+    status: int
+    body: str
+    mimetype: str
+    created_at: datetime
+
+
+class ResponseCache:
+    """Thread-safe LRU of completed keys"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            stored = self._entries.get(key)
+            if stored is not None:
+                self._entries.move_to_end(key)
+            return stored
+
+    def put(self, key, stored: StoredResponse):
+        with self._lock:
+            self._entries[key] = stored
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _cache() -> ResponseCache:
+    cache = current_app.extensions.get('idempotency_cache')
+    if cache is None:
+        cache = current_app.extensions['idempotency_cache'] = ResponseCache(
+            current_app.config['IDEMPOTENCY_CACHE_SIZE']
+        )
+    return cache
+
+
+def _expired(created_at: datetime) -> bool:
+    ttl = timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL_SECONDS'])
+    return created_at < datetime.utcnow() - ttl
+
+
+def _claim(endpoint: str, key: str, request_hash: str):
+    """Return (stored_response, claimed).
+
+    ``claimed`` is True if this request now owns the key; otherwise
+    ``stored_response`` is the completed response, or None while another
+    request is still running with the key.
+    """
+    for _ in range(2):
+        row = IdempotencyKey.query.filter_by(endpoint=endpoint, key=key).first()
+        if row is not None:
+            lock_timeout = timedelta(seconds=current_app.config['IDEMPOTENCY_LOCK_SECONDS'])
+            abandoned = row.status == 'in_progress' and row.created_at < datetime.utcnow() - lock_timeout
+            if not (abandoned or _expired(row.created_at)):
+                if row.status != 'completed':
+                    return None, False
+                stored = StoredResponse(row.request_hash, row.response_status, row.response_body,
+                                        row.response_mimetype, row.created_at)
+                db.session.rollback()
+                return stored, False
+            db.session.delete(row)
+            db.session.flush()
+
+        db.session.add(IdempotencyKey(endpoint=endpoint, key=key, request_hash=request_hash,
+                                      status='in_progress'))
+        try:
+            db.session.commit()
+            return None, True
+        except IntegrityError:
+            # Another request claimed it between our read and insert
+            db.session.rollback()
+    return None, False
+
+
+def _complete(endpoint: str, key: str, request_hash: str, response) -> StoredResponse:
+    now = datetime.utcnow()
+    stored = StoredResponse(request_hash, response.status_code, response.get_data(as_text=True),
+                            response.mimetype, now)
+    db.session.rollback()
+    IdempotencyKey.query.filter_by(endpoint=endpoint, key=key).update({
+        'status': 'completed',
+        'response_status': stored.status,
+        'response_body': stored.body,
+        'response_mimetype': stored.mimetype,
+        'completed_at': now,
+    })
+    db.session.commit()
+    return stored
+
+
+def _release(endpoint: str, key: str):
+    try:
+        db.session.rollback()
+        IdempotencyKey.query.filter_by(endpoint=endpoint, key=key).delete()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Could not release idempotency key {key!r} for {endpoint}: {e}")
+
+
+def _replay(stored: StoredResponse):
+    response = current_app.response_class(stored.body, status=stored.status, mimetype=stored.mimetype)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(f):
+    """Decorator making a POST endpoint safe to retry with an Idempotency-Key"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if request.method != 'POST' or key is None:
+            return f(*args, **kwargs)
+        key = key.strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return jsonify({
+                'success': False,
+                'error': f'{HEADER} must be 1-{MAX_KEY_LENGTH} characters'
+            }), 400
+
+        endpoint = request.endpoint
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        cache = _cache()
+        stored = cache.get((endpoint, key))
+        if stored is not None and _expired(stored.created_at):
+            cache.discard((endpoint, key))
+            stored = None
+
+        if stored is None:
+            stored, claimed = _claim(endpoint, key, request_hash)
+            if stored is None and not claimed:
+                response = jsonify({
+                    'success': False,
+                    'error': 'A request with this Idempotency-Key is already in progress'
+                })
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            if stored is not None:
+                cache.put((endpoint, key), stored)
+
+        if stored is not None:
+            if stored.request_hash != request_hash:
+                return jsonify({
+                    'success': False,
+                    'error': f'{HEADER} was already used with a different request'
+                }), 422
+            return _replay(stored)
+
+        try:
+            response = make_response(f(*args, **kwargs))
+        except Exception:
+            _release(endpoint, key)
+            raise
+
+        if 200 <= response.status_code < 300:
+            try:
+                cache.put((endpoint, key), _complete(endpoint, key, request_hash, response))
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Could not store idempotent response for {endpoint}: {e}")
+        else:
+            _release(endpoint, key)
+        return response
+    return decorated
+
+
+def purge_expired() -> int:
+    """Delete keys older than the TTL; returns how many were removed"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL_SECONDS'])
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete()
+    db.session.commit()
+    return deleted
@@ -0,0 +1,224 @@
+"""Duplicate-lead detection.
+
+Quotes carry a normalized email (lowercased, ``+tag`` removed) and phone
+(E.164, Moroccan national numbers assumed), each indexed together with
+``created_at``. A new quote whose email or phone matches an open quote
+(``new`` or ``contacted``) from the last ``DUPLICATE_WINDOW_DAYS`` days is
+linked to it through ``duplicate_of_id`` and does not notify the admins
+again. Links point at the first quote of the group while it is open.
+
+Most quotes are from new customers, so each process keeps a bloom filter of
+the normalized contacts seen in the window: a miss (the common case) skips
+the database lookup entirely. The filter picks up other workers' quotes by
+reading new rows every ``DUPLICATE_BLOOM_REFRESH_SECONDS``, so a repeat
+sent to another worker within that interval can go undetected. Ids are
+handed out before their transaction commits, so a quote can become visible
+after a higher id; each refresh re-reads the last ``RESCAN_IDS`` ids to
+catch it (a quote committing later than that is only found at the next
+rebuild). The filter is rebuilt hourly to drop contacts that left the
+window. A false positive only costs the indexed lookup.
+"""
+import hashlib
+import math
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_
+
+from app import db
+from app.models import QuoteRequest
+
+OPEN_STATUSES = ('new', 'contacted')
+MOROCCO_CODE = '212'
+REBUILD_SECONDS = 3600
+# Ids re-read behind the newest one seen, for quotes that committed late
+RESCAN_IDS = 200
+
+PHONE_SEPARATORS = re.compile(r'[\s\-\(\)\.]')
+
+
+def normalize_email(email: str):
+    if not email:
+        return None
+    local, _, domain = email.strip().lower().rpartition('@')
+    if not local:
+        return None
+    local = local.split('+', 1)[0]
+    return f'{local}@{domain}'
+
+
+def normalize_phone(phone: str):
+    """E.164 form of a phone number, reading national numbers as Moroccan;
+    None if it cannot be normalized"""
+    if not phone:
+        return None
+    phone = PHONE_SEPARATORS.sub('', phone)
+    if phone.startswith('00'):
+        phone = '+' + phone[2:]
+    international = phone.startswith('+')
+    digits = phone.lstrip('+')
+    if not digits.isdigit():
+        return None
+    if international or (digits.startswith(MOROCCO_CODE) and len(digits) == 12):
+        if digits.startswith(MOROCCO_CODE + '0'):
+            # +212 0612... is a common way of writing +212 612...
+            digits = MOROCCO_CODE + digits[4:]
+        return '+' + digits if 8 <= len(digits) <= 15 else None
+    if digits.startswith('0') and len(digits) == 10:
+        return '+' + MOROCCO_CODE + digits[1:]
+    if len(digits) == 9 and digits[0] in '5678':
+        return '+' + MOROCCO_CODE + digits
+    return None
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (no false negatives)"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+
+def _keys(email_normalized, phone_normalized) -> list:
+    keys = []
+    if email_normalized:
+        keys.append('e:' + email_normalized)
+    if phone_normalized:
+        keys.append('p:' + phone_normalized)
+    return keys
+
+
+class ContactIndex:
+    """Per-process bloom filter of the contacts of recent quotes"""
+
+    def __init__(self, capacity: int, window: timedelta, refresh_seconds: float):
+        self.capacity = capacity
+        self.window = window
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._filter = None
+        self._last_id = 0
+        self._refreshed = self._rebuilt = 0
+
+    def might_exist(self, keys: list) -> bool:
+        self._refresh()
+        with self._lock:
+            return any(key in self._filter for key in keys)
+
+    def add(self, keys: list):
+        with self._lock:
+            if self._filter is not None:
+                for key in keys:
+                    self._filter.add(key)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._filter is not None and now - self._refreshed < self.refresh_seconds:
+            return
+        with self._lock:
+            if self._filter is not None and now - self._refreshed < self.refresh_seconds:
+                return
+            if self._filter is None or now - self._rebuilt >= REBUILD_SECONDS:
+                self._filter, self._last_id, self._rebuilt = BloomFilter(self.capacity), 0, now
+            rows = db.session.query(
+                QuoteRequest.id, QuoteRequest.email_normalized, QuoteRequest.phone_normalized
+            ).filter(
+                QuoteRequest.id > self._last_id - RESCAN_IDS,
+                QuoteRequest.created_at >= datetime.utcnow() - self.window
+            ).order_by(QuoteRequest.id).yield_per(1000)
+            for quote_id, email_normalized, phone_normalized in rows:
+                for key in _keys(email_normalized, phone_normalized):
+                    self._filter.add(key)
+                self._last_id = max(self._last_id, quote_id)
+            self._refreshed = now
+
+
+def _index() -> ContactIndex:
+    index = current_app.extensions.get('contact_index')
+    if index is None:
+        index = current_app.extensions['contact_index'] = ContactIndex(
+            current_app.config['DUPLICATE_BLOOM_CAPACITY'],
+            timedelta(days=current_app.config['DUPLICATE_WINDOW_DAYS']),
+            current_app.config['DUPLICATE_BLOOM_REFRESH_SECONDS'],
+        )
+    return index
+
+
+def find_duplicate(email_normalized, phone_normalized):
+    """Id of the open quote a new quote with this contact should be linked
+    to (the first of its group), or None"""
+    window_days = current_app.config['DUPLICATE_WINDOW_DAYS']
+    keys = _keys(email_normalized, phone_normalized)
+    if not window_days or not keys:
+        return None
+    index = _index()
+    if not index.might_exist(keys):
+        index.add(keys)
+        return None
+
+    conditions = []
+    if email_normalized:
+        conditions.append(QuoteRequest.email_normalized == email_normalized)
+    if phone_normalized:
+        conditions.append(QuoteRequest.phone_normalized == phone_normalized)
+    match = db.session.query(QuoteRequest.id, QuoteRequest.duplicate_of_id).filter(
+        or_(*conditions),
+        QuoteRequest.created_at >= datetime.utcnow() - timedelta(days=window_days),
+        QuoteRequest.status.in_(OPEN_STATUSES)
+    ).order_by(QuoteRequest.created_at.desc()).first()
+    index.add(keys)
+    if match is None:
+        return None
+    if match.duplicate_of_id is None:
+        return match.id
+    # Join the group unless its first quote has been closed meanwhile
+    root_open = db.session.query(QuoteRequest.id).filter(
+        QuoteRequest.id == match.duplicate_of_id, QuoteRequest.status.in_(OPEN_STATUSES)
+    ).first()
+    return match.duplicate_of_id if root_open else match.id
+
+
+def contact_fields(email: str, phone: str) -> dict:
+    """Normalized contact columns and duplicate link for a new quote"""
+    email_normalized = normalize_email(email)
+    phone_normalized = normalize_phone(phone)
+    return dict(
+        email_normalized=email_normalized,
+        phone_normalized=phone_normalized,
+        duplicate_of_id=find_duplicate(email_normalized, phone_normalized),
+    )
+
+
+def backfill(batch_size: int = 1000) -> int:
+    """Fill the normalized columns of quotes created before they existed"""
+    updated = 0
+    last_id = 0
+    while True:
+        quotes = QuoteRequest.query.filter(
+            QuoteRequest.id > last_id, QuoteRequest.email_normalized.is_(None)
+        ).order_by(QuoteRequest.id).limit(batch_size).all()
+        if not quotes:
+            return updated
+        for quote in quotes:
+            quote.email_normalized = normalize_email(quote.email)
+            quote.phone_normalized = normalize_phone(quote.phone)
+        last_id = quotes[-1].id
+        db.session.commit()
+        updated += len(quotes)
@@ -1,4 +1,5 @@
 from app import db
+import json
 from datetime import datetime
 from flask import g
 
@@ -126,11 +127,20 @@ class InstallationDifficulty(db.Model):
 class QuoteRequest(db.Model):
     """Customer quote requests from contact form"""
     __tablename__ = 'quote_requests'
+    __table_args__ = (
+        # Duplicate-lead lookups: same contact within the window (see app/leads.py)
+        db.Index('ix_quote_requests_email_normalized_created', 'email_normalized', 'created_at'),
+        db.Index('ix_quote_requests_phone_normalized_created', 'phone_normalized', 'created_at'),
+        # Admin list and dashboard counts filtered by status, newest first
+        db.Index('ix_quote_requests_status_created', 'status', 'created_at', 'id'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(255), nullable=False, index=True)
     phone = db.Column(db.String(20), nullable=False)
+    email_normalized = db.Column(db.String(255), nullable=True)  # lowercased, +tag removed
+    phone_normalized = db.Column(db.String(20), nullable=True)  # E.164, e.g. '+212612345678'
     service = db.Column(db.String(100), nullable=False)  # e.g., 'CCTV Installation', 'Maintenance', 'Consultation'
     message = db.Column(db.Text, nullable=False)
     language = db.Column(db.String(5), default='ar')  # Language of request
@@ -150,6 +160,8 @@ class QuoteRequest(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     followed_up_at = db.Column(db.DateTime, nullable=True)
+    # Earlier open quote from the same customer this one was linked to
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('quote_requests.id'), nullable=True, index=True)
 
     def to_dict(self) -> dict:
         """Serialize to dictionary"""
@@ -167,6 +179,7 @@ class QuoteRequest(db.Model):
             'difficulty_level': self.difficulty_level,
             'estimated_price': self.estimated_price,
             'status': self.status,
+            'duplicate_of_id': self.duplicate_of_id,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'currency': 'MAD'
@@ -191,3 +204,92 @@ class Admin(db.Model):
 
     def __repr__(self):
         return f'<Admin {self.email}>'
+
+
+class CatalogVersion(db.Model):
+    """Single-row counter bumped on every write to the pricing reference tables"""
+    __tablename__ = 'catalog_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CatalogVersion {self.version}>'
+
+
+class PricingRuleSet(db.Model):
+    """Versioned pricing rules (labor rate, TVA, tiers, surcharges, promotions).
+
+    Each published change is a new row; the latest active row is compiled
+    into the pricing plan (see app/pricing.py).
+    """
+    __tablename__ = 'pricing_rule_sets'
+
+    id = db.Column(db.Integer, primary_key=True)
+    definition = db.Column(db.Text, nullable=False)  # JSON, merged over pricing.DEFAULT_RULES
+    is_active = db.Column(db.Boolean, default=True, index=True)
+    notes = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self) -> dict:
+        """Serialize to dictionary"""
+        return {
+            'version': self.id,
+            'definition': json.loads(self.definition),
+            'is_active': self.is_active,
+            'notes': self.notes,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def __repr__(self):
+        return f'<PricingRuleSet {self.id}>'
+
+
+class EmailOutbox(db.Model):
+    """Outgoing emails, written in the same transaction as the change that
+    triggers them and delivered by the outbox worker (see app/outbox.py)"""
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # confirmation, admin_notification, admin_digest_item, admin_digest
+    recipient = db.Column(db.String(255), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text, nullable=True)
+    quote_id = db.Column(db.Integer, db.ForeignKey('quote_requests.id'), nullable=True)
+    status = db.Column(db.String(20), default='pending')  # pending, sent, failed, buffered, coalesced
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.kind} -> {self.recipient}>'
+
+
+class IdempotencyKey(db.Model):
+    """Client-supplied Idempotency-Key and the response it produced
+    (see app/idempotency.py)"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('endpoint', 'key', name='uq_idempotency_keys_endpoint_key'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    endpoint = db.Column(db.String(100), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), default='in_progress')  # in_progress, completed
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    response_mimetype = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.endpoint} {self.key}>'
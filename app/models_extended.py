@@ -6,6 +6,11 @@ from app import db
 class Technician(db.Model):
     """Technician profiles for field work"""
     __tablename__ = 'technician'
+    __table_args__ = (
+        # Admin list, optionally by status, ordered by name
+        db.Index('ix_technician_status_name', 'status', 'name', 'id'),
+        db.Index('ix_technician_name', 'name', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -43,6 +48,14 @@ class Technician(db.Model):
 class Installation(db.Model):
     """Track completed installations"""
     __tablename__ = 'installation'
+    __table_args__ = (
+        # Technician job list and profile counts; admin list by technician
+        db.Index('ix_installation_technician_status_scheduled', 'technician_id', 'status', 'scheduled_date', 'id'),
+        # Admin list and dashboard counts by status
+        db.Index('ix_installation_status_scheduled', 'status', 'scheduled_date', 'id'),
+        db.Index('ix_installation_scheduled', 'scheduled_date', 'id'),
+        db.Index('ix_installation_quote_id', 'quote_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     quote_id = db.Column(db.Integer, db.ForeignKey('quote_requests.id'), nullable=False)
@@ -79,6 +92,11 @@ class Installation(db.Model):
 class Payment(db.Model):
     """Payment records for quotes"""
     __tablename__ = 'payment'
+    __table_args__ = (
+        # Admin list, optionally by status, newest first (quote_id is unique, so already indexed)
+        db.Index('ix_payment_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_payment_created', 'created_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     quote_id = db.Column(db.Integer, db.ForeignKey('quote_requests.id'), nullable=False, unique=True)
@@ -115,6 +133,12 @@ class Payment(db.Model):
 class Invoice(db.Model):
     """Invoice generation and tracking"""
     __tablename__ = 'invoice'
+    __table_args__ = (
+        # Admin list and revenue sums by status and issue date
+        db.Index('ix_invoice_status_issued', 'status', 'issued_date', 'id'),
+        db.Index('ix_invoice_issued', 'issued_date', 'id'),
+        db.Index('ix_invoice_quote_id', 'quote_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)  # INV-2026-00001
@@ -156,3 +180,65 @@ class Invoice(db.Model):
             'pdf_url': self.pdf_url,
             'created_at': self.created_at.isoformat()
         }
+
+
+# ============================================================================
+# ROLLUPS (maintained in the same transaction as the rows they count, see app/rollups.py)
+# ============================================================================
+
+class QuoteDailyStats(db.Model):
+    """Quotes by creation day, current status and service"""
+    __tablename__ = 'quote_daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    service = db.Column(db.String(100), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class InvoiceDailyStats(db.Model):
+    """Invoice count and total by issue day and current status"""
+    __tablename__ = 'invoice_daily_stats'
+    
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0)  # MAD
+
+
+class InstallationStats(db.Model):
+    """Installations by technician (0 = unassigned) and current status"""
+    __tablename__ = 'installation_stats'
+    
+    technician_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class QuoteMetrics(db.Model):
+    """Quotes and conversions per creation day for every combination of
+    location, resolution and service. ``dimensions`` names the columns a
+    row is broken down by (e.g. 'location_id,resolution', '' for all
+    quotes); the other dimension columns hold 0 / ''."""
+    __tablename__ = 'quote_metrics'
+    
+    dimensions = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    location_id = db.Column(db.Integer, primary_key=True)  # 0 = none
+    resolution = db.Column(db.String(50), primary_key=True)  # '' = none
+    service = db.Column(db.String(100), primary_key=True)
+    quotes = db.Column(db.Integer, nullable=False, default=0)
+    converted = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RevenueMetrics(db.Model):
+    """Paid and issued invoice totals per issue day, broken down like
+    ``QuoteMetrics`` by the invoice's quote"""
+    __tablename__ = 'revenue_metrics'
+    
+    dimensions = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    location_id = db.Column(db.Integer, primary_key=True)  # 0 = none
+    resolution = db.Column(db.String(50), primary_key=True)  # '' = none
+    service = db.Column(db.String(100), primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0)  # MAD
@@ -0,0 +1,223 @@
+"""Durable email outbox.
+
+Request handlers never talk to SMTP. They call ``enqueue`` to add an
+``EmailOutbox`` row to the current session, so the email is committed (or
+rolled back) together with the change that triggered it. A separate worker
+process (``flask outbox-worker``) drains due rows over one persistent SMTP
+connection.
+
+Delivery is at-least-once. A batch is claimed by pushing its
+``next_attempt_at`` forward by ``OUTBOX_LEASE_SECONDS`` and committing, so a
+worker that dies mid-batch only delays those rows until the lease expires.
+On Postgres the claim uses ``FOR UPDATE SKIP LOCKED`` and several workers
+can run side by side; on SQLite run a single worker. Failed sends are
+retried with exponential backoff and jitter up to ``OUTBOX_MAX_ATTEMPTS``.
+
+Admin new-quote notifications can be coalesced: ``enqueue_digest_item``
+stores them as ``buffered`` rows, and on each pass the worker folds a
+recipient's buffered rows into one ``admin_digest`` email once the oldest
+has waited ``ADMIN_DIGEST_WINDOW_SECONDS`` or ``ADMIN_DIGEST_MAX_ITEMS`` have
+piled up. The digest is created and its items marked ``coalesced`` in one
+transaction, so every item ends up in exactly one digest.
+"""
+import random
+import smtplib
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import func
+
+from app import db, emails, mail
+from app.models import EmailOutbox
+
+
+def enqueue(recipient: str, subject: str, body: str, kind: str,
+            quote_id: int = None, html: str = None) -> EmailOutbox:
+    """Add an email to the outbox in the current session (caller commits)"""
+    entry = EmailOutbox(
+        kind=kind,
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        html=html,
+        quote_id=quote_id,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def enqueue_digest_item(recipient: str, summary: str, body: str, quote_id: int = None) -> EmailOutbox:
+    """Buffer an admin notification for the next digest (caller commits).
+
+    ``summary`` is the one-line entry for the digest index; ``body`` is
+    appended below it with the other items' details.
+    """
+    entry = enqueue(recipient, summary[:255], body, kind='admin_digest_item', quote_id=quote_id)
+    entry.status = 'buffered'
+    return entry
+
+
+def coalesce_digests() -> int:
+    """Turn due buffered notifications into digest emails; returns digests created"""
+    now = datetime.utcnow()
+    window = timedelta(seconds=current_app.config['ADMIN_DIGEST_WINDOW_SECONDS'])
+    max_items = current_app.config['ADMIN_DIGEST_MAX_ITEMS']
+
+    buffered = (
+        db.session.query(EmailOutbox.recipient, func.count(), func.min(EmailOutbox.created_at))
+        .filter(EmailOutbox.status == 'buffered')
+        .group_by(EmailOutbox.recipient)
+        .all()
+    )
+    created = 0
+    for recipient, count, oldest in buffered:
+        if count < max_items and oldest > now - window:
+            continue
+        while True:
+            items = (
+                EmailOutbox.query
+                .filter(EmailOutbox.status == 'buffered', EmailOutbox.recipient == recipient)
+                .order_by(EmailOutbox.created_at, EmailOutbox.id)
+                .limit(max_items)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not items:
+                break
+            if len(items) < max_items and items[0].created_at > now - window:
+                db.session.rollback()
+                break
+            email = emails.render('admin_digest', 'en', items=items,
+                                  first=items[0].created_at, last=items[-1].created_at)
+            enqueue(recipient, email.subject, email.body, kind='admin_digest', html=email.html)
+            for item in items:
+                item.status = 'coalesced'
+                item.sent_at = now
+            db.session.commit()
+            created += 1
+    return created
+
+
+class SMTPSession:
+    """A single SMTP connection kept open across batches.
+
+    It is opened lazily, re-opened once if the server dropped it, and closed
+    after ``idle_timeout`` seconds without traffic.
+    """
+
+    def __init__(self, idle_timeout: float = 60):
+        self.idle_timeout = idle_timeout
+        self._connection = None
+        self._last_used = 0.0
+
+    def send(self, message: Message):
+        if self._connection is None:
+            self._open()
+        try:
+            self._connection.send(message)
+        except smtplib.SMTPServerDisconnected:
+            self.close()
+            self._open()
+            self._connection.send(message)
+        self._last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.__exit__(None, None, None)
+            except (smtplib.SMTPException, OSError):
+                pass
+
+    def _open(self):
+        connection = mail.connect()
+        connection.__enter__()
+        self._connection = connection
+        self._last_used = time.monotonic()
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before retry number ``attempts`` (1-based), with jitter"""
+    base = current_app.config['OUTBOX_BACKOFF_BASE']
+    delay = min(base * 2 ** (attempts - 1), current_app.config['OUTBOX_BACKOFF_MAX'])
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim_batch(batch_size: int) -> list:
+    """Lease up to ``batch_size`` due rows to this worker"""
+    now = datetime.utcnow()
+    entries = (
+        EmailOutbox.query
+        .filter(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    lease_until = now + timedelta(seconds=current_app.config['OUTBOX_LEASE_SECONDS'])
+    for entry in entries:
+        entry.attempts += 1
+        entry.next_attempt_at = lease_until
+    db.session.commit()
+    return entries
+
+
+def deliver(entry: EmailOutbox, smtp: SMTPSession):
+    """Send one leased row and record the outcome"""
+    try:
+        smtp.send(Message(
+            subject=entry.subject,
+            recipients=[entry.recipient],
+            body=entry.body,
+            html=entry.html
+        ))
+    except Exception as e:
+        smtp.close()
+        entry.last_error = str(e)[:1000]
+        if entry.attempts >= current_app.config['OUTBOX_MAX_ATTEMPTS']:
+            entry.status = 'failed'
+            current_app.logger.error(f"Outbox email #{entry.id} failed permanently: {e}")
+        else:
+            entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(entry.attempts))
+            current_app.logger.warning(f"Outbox email #{entry.id} attempt {entry.attempts} failed: {e}")
+    else:
+        entry.status = 'sent'
+        entry.sent_at = datetime.utcnow()
+        entry.last_error = None
+    # Commit per email so a crash never re-sends what already went out
+    db.session.commit()
+
+
+def drain(smtp: SMTPSession, batch_size: int = None) -> int:
+    """Deliver one batch of due emails; returns how many rows were attempted"""
+    coalesce_digests()
+    entries = claim_batch(batch_size or current_app.config['OUTBOX_BATCH_SIZE'])
+    for entry in entries:
+        deliver(entry, smtp)
+    return len(entries)
+
+
+def run_worker(once: bool = False):
+    """Drain the outbox until interrupted (or until empty with ``once``)"""
+    smtp = SMTPSession(current_app.config['OUTBOX_SMTP_IDLE_SECONDS'])
+    poll_interval = current_app.config['OUTBOX_POLL_INTERVAL']
+    try:
+        while True:
+            attempted = drain(smtp)
+            if attempted:
+                continue
+            if once:
+                break
+            smtp.close_if_idle()
+            time.sleep(poll_interval)
+    finally:
+        smtp.close()
@@ -0,0 +1,143 @@
+"""Keyset (cursor) pagination for the admin lists.
+
+A page is read with ``WHERE (key1, key2) < (:last1, :last2) ORDER BY key1,
+key2 LIMIT n + 1`` on the list's sort key, which always ends with the
+primary key so it is unique. With an index on the key this costs the same
+on page 500 as on page 1, unlike ``OFFSET`` which reads and throws away
+every earlier row. The position is handed back to the client as opaque
+``next_cursor`` / ``prev_cursor`` strings; the extra row tells whether
+there is a next page, so no ``COUNT(*)`` is needed.
+
+The total is only computed with ``?total=true`` and is then cached per
+filter for ``PAGINATION_TOTAL_CACHE_SECONDS``, so it can lag slightly
+behind. Only the first key column may be NULL: its NULL rows come after
+all the others (in both sort orders) and are read as a second segment
+ordered by the remaining keys, so both segments use the same index.
+"""
+import base64
+import binascii
+import json
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import tuple_
+
+from app.validation import Field, Invalid
+
+
+def encode_cursor(direction: str, values) -> str:
+    payload = [direction] + [
+        {'t': value.isoformat()} if isinstance(value, datetime) else value for value in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Return (direction, values); raises Invalid for a malformed cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direction, *values = payload
+        if direction not in ('next', 'prev') or not values:
+            raise ValueError(direction)
+        return direction, [
+            datetime.fromisoformat(value['t']) if isinstance(value, dict) else value for value in values
+        ]
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise Invalid('invalid_value')
+
+
+# Query string fields shared by the paginated admin lists
+CURSOR = Field('string', max_length=500, convert=decode_cursor)
+PER_PAGE = Field('integer', min=1, max=100, default=20)
+TOTAL = Field('boolean', default=False)
+
+
+class _TotalCache:
+    """Per-process cache of list totals keyed by the filters used"""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute, max_age: float) -> int:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and now - entry[1] < max_age:
+            return entry[0]
+        total = compute()
+        with self._lock:
+            self._entries[key] = (total, now)
+        return total
+
+
+_totals = _TotalCache()
+
+
+def keyset_page(query, keys: list, args: dict, descending: bool = False, total_key=None) -> dict:
+    """Read one page of ``query`` ordered by ``keys`` (model columns, the
+    last one unique).
+
+    ``args`` holds the validated ``cursor``, ``per_page`` and ``total``
+    fields. Returns a dict with ``items``, ``next_cursor``, ``prev_cursor``
+    and, if asked for, ``total``; ``total_key`` identifies the list and its
+    filters in the total cache.
+    """
+    limit = args['per_page']
+    cursor = args.get('cursor')
+    backward = cursor is not None and cursor[0] == 'prev'
+    filtered = query
+
+    # Reading backwards flips both the comparison and the order
+    reverse = descending != backward
+    values = cursor[1] if cursor is not None else None
+    if keys[0].expression.nullable:
+        first = keys[0]
+        in_nulls = values is not None and values[0] is None
+        segments = []
+        if not (in_nulls and not backward):
+            segments.append((query.filter(first.is_not(None)), keys, None if in_nulls else values))
+        if not (values is not None and not in_nulls and backward):
+            segments.append((query.filter(first.is_(None)), keys[1:], values[1:] if in_nulls else None))
+        if backward:
+            segments.reverse()
+    else:
+        segments = [(query, keys, values)]
+
+    rows = []
+    for segment, segment_keys, segment_values in segments:
+        rows += _ordered(segment, segment_keys, segment_values, reverse).limit(limit + 1 - len(rows)).all()
+        if len(rows) > limit:
+            break
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+
+    has_next = True if backward else more
+    has_prev = more if backward else cursor is not None
+    page = {
+        'items': rows,
+        'next_cursor': encode_cursor('next', _key_values(rows[-1], keys)) if rows and has_next else None,
+        'prev_cursor': encode_cursor('prev', _key_values(rows[0], keys)) if rows and has_prev else None,
+    }
+    if args.get('total'):
+        page['total'] = _totals.get(
+            total_key, lambda: filtered.order_by(None).count(),
+            current_app.config['PAGINATION_TOTAL_CACHE_SECONDS']
+        )
+    return page
+
+
+def _ordered(query, keys: list, values, reverse: bool):
+    if values is not None:
+        position, bound = tuple_(*keys), tuple_(*values)
+        query = query.filter(position < bound if reverse else position > bound)
+    return query.order_by(*(key.desc() if reverse else key.asc() for key in keys))
+
+
+def _key_values(row, keys: list) -> list:
+    return [getattr(row, key.key) for key in keys]
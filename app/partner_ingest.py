@@ -0,0 +1,181 @@
+"""Bulk lead ingestion for partners (``POST /api/partner/quotes``).
+
+The request body is NDJSON: one quote per line with the same fields and
+rules as ``POST /quote``, plus an optional ``ref`` echoed back so the
+partner can match results to its own records. The body is read line by line
+from the WSGI input and the response streams one NDJSON result per input
+line, so memory stays bounded by one chunk whatever the upload size.
+
+Valid lines are inserted ``PARTNER_INGEST_CHUNK_SIZE`` at a time with one
+multi-row INSERT and one commit; a chunk's results are written after its
+commit, so an ``"ok": true`` line means the quote is stored. A chunk that
+fails is retried one row per transaction so a bad row fails alone.
+
+Partner leads get no confirmation email (the partner owns the customer
+contact); the admins get one digest entry per chunk instead of one email
+per lead.
+"""
+import hmac
+import json
+
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
+
+from app import db, outbox, response_cache, rollups, search
+from app.models import QuoteRequest
+
+HEADER = 'X-Partner-Key'
+
+
+def parse_partner_keys(text: str) -> dict:
+    """Parse ``name:key,name:key`` into {key: name}"""
+    keys = {}
+    for part in (text or '').split(','):
+        name, _, key = part.strip().partition(':')
+        if name and key:
+            keys[key.strip()] = name.strip()
+    return keys
+
+
+def authenticate(key: str):
+    """Partner name for an API key, or None"""
+    if not key:
+        return None
+    partner = None
+    for known, name in parse_partner_keys(current_app.config.get('PARTNER_API_KEYS')).items():
+        # Compare against every key so the time taken does not reveal a match
+        if hmac.compare_digest(known.encode(), key.encode()):
+            partner = name
+    return partner
+
+
+def read_lines(stream, max_line_bytes: int):
+    """Yield ``(line_number, line)`` from a byte stream; ``line`` is None for
+    a line longer than ``max_line_bytes``, whose remainder is skipped"""
+    number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes)
+            yield number, None
+        else:
+            yield number, line
+
+
+def ingest(lines, partner: str, build, chunk_size: int):
+    """Validate, insert and report on NDJSON quote lines.
+
+    ``build(data)`` returns ``(fields, errors)`` for one decoded line.
+    Yields the NDJSON response: one result per non-blank line, then a
+    summary line.
+    """
+    counts = {'received': 0, 'created': 0, 'rejected': 0}
+    chunk = []
+    try:
+        for number, line in lines:
+            if line is not None and not line.strip():
+                continue
+            counts['received'] += 1
+            chunk.append(_parse(number, line, build))
+            if len(chunk) >= chunk_size:
+                yield from _flush(chunk, partner, counts)
+                chunk = []
+        yield from _flush(chunk, partner, counts)
+    except (ClientDisconnected, RequestEntityTooLarge) as e:
+        # Lines already reported stay committed; the rest of the upload is lost
+        yield from _flush(chunk, partner, counts)
+        yield _dump({'ok': False, 'error': e.description})
+    yield _dump({'summary': counts})
+
+
+def _parse(number: int, line, build):
+    """Return (result, fields) for one line; fields is None if it is rejected"""
+    result = {'line': number}
+    if line is None:
+        result['errors'] = {'line': 'Line too long'}
+        return result, None
+    try:
+        data = json.loads(line)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        result['errors'] = {'line': 'Each line must be a JSON object'}
+        return result, None
+    if isinstance(data.get('ref'), (str, int)):
+        result['ref'] = data['ref']
+    try:
+        fields, errors = build(data)
+    except Exception as e:
+        # One bad line must not abort the rest of the upload
+        current_app.logger.error(f"Partner line {number} could not be validated: {e}")
+        result['errors'] = {'line': 'Could not be validated'}
+        return result, None
+    if errors:
+        result['errors'] = errors
+        return result, None
+    return result, fields
+
+
+def _flush(chunk: list, partner: str, counts: dict):
+    rows = [fields for _, fields in chunk if fields is not None]
+    ids = []
+    if rows:
+        try:
+            ids = _insert(rows, partner)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(f"Partner chunk of {len(rows)} rows failed, retrying singly: {e}")
+            ids = []
+            for fields in rows:
+                try:
+                    ids.extend(_insert([fields], partner))
+                except Exception as row_error:
+                    db.session.rollback()
+                    current_app.logger.error(f"Partner {partner} lead rejected: {row_error}")
+                    ids.append(None)
+
+    inserted = iter(ids)
+    for result, fields in chunk:
+        quote_id = next(inserted) if fields is not None else None
+        if quote_id is not None:
+            counts['created'] += 1
+            yield _dump({'ok': True, 'quote_id': quote_id, **result})
+        else:
+            counts['rejected'] += 1
+            result.setdefault('errors', {'line': 'Could not be stored'})
+            yield _dump({'ok': False, **result})
+
+
+def _insert(rows: list, partner: str) -> list:
+    """Insert ``rows`` in one transaction; returns their ids in order"""
+    inserted = db.session.execute(
+        insert(QuoteRequest).returning(
+            QuoteRequest.id, QuoteRequest.created_at, QuoteRequest.status, QuoteRequest.service,
+            QuoteRequest.location_id, QuoteRequest.resolution, sort_by_parameter_order=True
+        ),
+        rows
+    ).all()
+    rollups.record_inserts(db.session, QuoteRequest, inserted)
+    response_cache.invalidate_on_commit(db.session, 'quotes')
+    ids = [row.id for row in inserted]
+    search.reindex(db.session, QuoteRequest, ids)
+    admin_email = current_app.config.get('COMPANY_EMAIL')
+    if admin_email:
+        details = '\n'.join(
+            f"#{quote_id} {row['name']} <{row['email']}> {row['phone']} - "
+            f"{row['camera_count'] or '-'} x {row['resolution'] or '-'}, {row['estimated_price'] or '-'} MAD"
+            for quote_id, row in zip(ids, rows)
+        )
+        summary = f"{len(ids)} leads from partner {partner} (#{ids[0]}-#{ids[-1]})"
+        outbox.enqueue_digest_item(admin_email, summary, details)
+    db.session.commit()
+    return ids
+
+
+def _dump(result: dict) -> str:
+    return json.dumps(result, ensure_ascii=False) + '\n'
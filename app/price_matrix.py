@@ -0,0 +1,152 @@
+"""Precomputed price table shared by all workers through a memory-mapped file.
+
+The pricing space is small (locations x resolutions x difficulties x
+1..MAX_CAMERAS), so the full breakdown for every configuration is computed
+once per catalog version and written to ``PRICE_MATRIX_PATH``. Every worker
+maps that file read-only, which keeps a single copy in the page cache and
+turns ``/api/calculate-price`` into an index computation. The first worker to
+see a new catalog version rebuilds the file; the others just re-map it.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from itertools import product
+
+from flask import current_app
+
+from app.pricing import MAX_CAMERAS
+
+MAGIC = b'CCTVPMX2'
+HEADER = struct.Struct('=8sI20sIIII')
+FIELDS = ('base_cost', 'equipment', 'labor_cost', 'travel_fee', 'subtotal', 'total_price')
+CELL = struct.Struct('=%dd' % len(FIELDS))
+
+
+class PriceMatrix:
+    """Read-only view over a mapped price matrix file"""
+
+    def __init__(self, buffer, catalog, max_cameras: int):
+        self._buffer = buffer
+        self.version = catalog.version
+        self.max_cameras = max_cameras
+        self._location_index = {l.id: i for i, l in enumerate(catalog.locations)}
+        self._resolution_index = {r.resolution: i for i, r in enumerate(catalog.resolutions)}
+        self._difficulty_index = {d.level: i for i, d in enumerate(catalog.difficulties)}
+        self._strides = (
+            len(catalog.resolutions) * len(catalog.difficulties) * max_cameras,
+            len(catalog.difficulties) * max_cameras,
+            max_cameras
+        )
+
+    def lookup(self, camera_count: int, camera_spec, location, difficulty) -> dict:
+        """Return the same keys as ``PricingPlan.price``"""
+        loc_stride, res_stride, diff_stride = self._strides
+        cell = (self._location_index[location.id] * loc_stride
+                + self._resolution_index[camera_spec.resolution] * res_stride
+                + self._difficulty_index[difficulty.level] * diff_stride
+                + camera_count - 1)
+        values = CELL.unpack_from(self._buffer, HEADER.size + cell * CELL.size)
+        return dict(zip(FIELDS, values))
+
+
+def fingerprint(catalog) -> bytes:
+    """Digest of every input to the price formula"""
+    digest = hashlib.sha1()
+    for l in catalog.locations:
+        digest.update(repr((l.id, l.difficulty_multiplier, l.travel_fee)).encode())
+    for r in catalog.resolutions:
+        digest.update(repr((r.resolution, r.base_price)).encode())
+    for d in catalog.difficulties:
+        digest.update(repr((d.level, d.cost_multiplier, d.hours_required)).encode())
+    digest.update(json.dumps(catalog.pricing_plan.rules, sort_keys=True).encode())
+    return digest.digest()
+
+
+def build(catalog, max_cameras: int = MAX_CAMERAS) -> bytes:
+    """Serialize the full price matrix for ``catalog``"""
+    cells = list(product(catalog.locations, catalog.resolutions, catalog.difficulties,
+                         range(1, max_cameras + 1)))
+    locations, specs, difficulties, counts = zip(*cells) if cells else ((), (), (), ())
+    columns = catalog.pricing_plan.batch_price(counts, specs, locations, difficulties)
+
+    values = array('d')
+    for row in zip(*(columns[field] for field in FIELDS)):
+        values.extend(row)
+
+    header = HEADER.pack(MAGIC, catalog.version, fingerprint(catalog),
+                         len(catalog.locations), len(catalog.resolutions),
+                         len(catalog.difficulties), max_cameras)
+    return header + values.tobytes()
+
+
+def _matrix_path() -> str:
+    return current_app.config.get('PRICE_MATRIX_PATH') or os.path.join(
+        current_app.instance_path, 'price_matrix.bin'
+    )
+
+
+def _write(path: str, data: bytes):
+    """Write atomically so other workers never map a half-written file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.price_matrix-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _map(path: str, catalog, max_cameras: int):
+    """Map ``path`` and return (matrix, file_version); matrix is None unless
+    the file holds exactly the matrix for ``catalog``."""
+    try:
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None, None
+
+    if len(buffer) < HEADER.size or buffer[:len(MAGIC)] != MAGIC:
+        buffer.close()
+        return None, None
+
+    header = HEADER.unpack_from(buffer)
+    expected = (MAGIC, catalog.version, fingerprint(catalog), len(catalog.locations),
+                len(catalog.resolutions), len(catalog.difficulties), max_cameras)
+    cells = len(catalog.locations) * len(catalog.resolutions) * len(catalog.difficulties) * max_cameras
+    if header != expected or len(buffer) != HEADER.size + cells * CELL.size:
+        buffer.close()
+        return None, header[1]
+    return PriceMatrix(buffer, catalog, max_cameras), header[1]
+
+
+def _load_or_build(catalog):
+    path = _matrix_path()
+    matrix, file_version = _map(path, catalog, MAX_CAMERAS)
+    if matrix is None:
+        if file_version is not None and file_version > catalog.version:
+            # Another worker already moved to a newer catalog; ours is about
+            # to be refreshed, so don't overwrite its file in the meantime.
+            return None
+        _write(path, build(catalog, MAX_CAMERAS))
+        matrix, _ = _map(path, catalog, MAX_CAMERAS)
+    return matrix
+
+
+def get_price_matrix(catalog):
+    """Return the mapped matrix for ``catalog``, or None if it is unavailable
+    (callers then fall back to ``PricingPlan.price``)."""
+    def load():
+        try:
+            return _load_or_build(catalog)
+        except OSError as e:
+            current_app.logger.warning(f"Price matrix unavailable: {e}")
+            return None
+
+    return catalog.memoize('price_matrix', load)
@@ -0,0 +1,70 @@
+"""Compact HMAC-signed price quotes.
+
+``/api/calculate-price`` hands out a token binding the configuration, the
+total and the catalog version it was priced under. ``/quote`` verifies it
+with a single HMAC instead of trusting a client-supplied price or re-running
+the catalog lookups. Tokens look like ``<payload>.<signature>`` where both
+parts are unpadded base64url and the payload is a JSON array.
+"""
+import base64
+import hashlib
+import hmac
+import json
+from typing import NamedTuple
+
+from flask import current_app
+
+SIGNATURE_BYTES = 16
+
+
+class PriceToken(NamedTuple):
+    catalog_version: int
+    camera_count: int
+    resolution: str
+    location_id: int
+    difficulty_level: str
+    total_price: float
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _signing_key() -> bytes:
+    key = current_app.config['SECRET_KEY']
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+    return hashlib.sha256(b'price-token:' + key).digest()
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(_signing_key(), payload.encode('ascii'), hashlib.sha256).digest()
+    return _b64encode(digest[:SIGNATURE_BYTES])
+
+
+def issue(catalog_version: int, camera_count: int, resolution: str, location_id: int,
+          difficulty_level: str, total_price: float) -> str:
+    """Sign a priced configuration"""
+    payload = _b64encode(json.dumps(
+        [catalog_version, camera_count, resolution, location_id, difficulty_level, total_price],
+        separators=(',', ':'), ensure_ascii=False
+    ).encode('utf-8'))
+    return f'{payload}.{_sign(payload)}'
+
+
+def verify(token: str):
+    """Return the ``PriceToken`` if the signature is valid, else None"""
+    # compare_digest only takes ASCII strings, and signed tokens are ASCII
+    if not isinstance(token, str) or not token.isascii() or token.count('.') != 1:
+        return None
+    payload, signature = token.split('.')
+    if not hmac.compare_digest(_sign(payload), signature):
+        return None
+    try:
+        return PriceToken(*json.loads(_b64decode(payload)))
+    except (ValueError, TypeError):
+        return None
@@ -0,0 +1,246 @@
+"""Installation pricing: rule definitions compiled into a flat evaluation plan.
+
+    equipment = base_price * camera_count * difficulty.cost_multiplier
+                * location.difficulty_multiplier * location surcharge multiplier
+                * discount factor(camera_count)
+    labor     = difficulty.hours_required * labor_rate
+    total     = equipment + labor + location.travel_fee + location surcharge
+
+The rules (labor rate, TVA, volume tiers, per-location surcharges and
+promotions) are stored as a versioned ``PricingRuleSet`` and compiled once
+per catalog version by ``compile_plan``. Compilation folds everything that
+does not depend on the camera count into one ``PlanCell`` per
+(location, resolution, difficulty), and turns tiers and promotions into a
+step function of the camera count looked up with ``bisect``. Evaluating a
+price is then a dict lookup, a bisect over a handful of thresholds and the
+same multiplications as the original hand-written formula.
+
+With the default rules every extra factor is exactly 1.0 (or 0 for
+surcharges), so prices are bit-for-bit those of the original formula.
+``PricingPlan.batch_price`` evaluates the same steps column by column, in
+the same order, so batch totals match single-item totals exactly.
+"""
+import copy
+from bisect import bisect_right
+from operator import add, mul
+from typing import NamedTuple
+
+MAX_CAMERAS = 100
+
+DEFAULT_RULES = {
+    'labor_rate': 250,  # MAD per hour
+    'tax_rate': 0.2,  # 20% TVA in Morocco
+    # [{"min_cameras": 10, "discount": 0.05}, ...]
+    'volume_tiers': [],
+    # {"<location_id>": {"multiplier": 1.1, "flat": 150}}
+    'location_surcharges': {},
+    # [{"name": "...", "discount": 0.1, "min_cameras": 4,
+    #   "resolutions": [...], "location_ids": [...], "difficulty_levels": [...]}]
+    # Only the best matching promotion applies; it stacks with the volume tier.
+    'promotions': [],
+}
+
+
+class PlanCell(NamedTuple):
+    """Everything needed to price one (location, resolution, difficulty)"""
+    base_price: float
+    cost_multiplier: float
+    location_multiplier: float
+    labor_cost: float
+    travel_fee: float
+    thresholds: tuple
+    factors: tuple
+
+
+class PricingPlan:
+    """Compiled pricing rules for one catalog version"""
+
+    def __init__(self, rules: dict, cells: dict):
+        self.rules = rules
+        self.labor_rate = rules['labor_rate']
+        self.tax_rate = rules['tax_rate']
+        self._cells = cells
+
+    def _cell(self, camera_spec, location, difficulty) -> PlanCell:
+        return self._cells[(location.id, camera_spec.resolution, difficulty.level)]
+
+    def price(self, camera_count: int, camera_spec, location, difficulty) -> dict:
+        """Price one configuration from catalog entries"""
+        cell = self._cell(camera_spec, location, difficulty)
+        factor = cell.factors[bisect_right(cell.thresholds, camera_count) - 1]
+
+        # Step 1: Base camera cost
+        base_cost = cell.base_price * camera_count
+
+        # Step 2: Apply difficulty multiplier
+        difficulty_adjusted = base_cost * cell.cost_multiplier
+
+        # Step 3: Apply location multiplier, then volume/promotional discounts
+        location_adjusted = difficulty_adjusted * cell.location_multiplier * factor
+
+        # Step 4: Labor cost and travel fee are fixed per cell
+        subtotal = location_adjusted + cell.labor_cost
+        total_price = subtotal + cell.travel_fee
+
+        return {
+            'base_cost': base_cost,
+            'equipment': location_adjusted,
+            'labor_cost': cell.labor_cost,
+            'travel_fee': cell.travel_fee,
+            'subtotal': subtotal,
+            'total_price': total_price
+        }
+
+    def batch_price(self, camera_counts, camera_specs, locations, difficulties) -> dict:
+        """Price many configurations at once.
+
+        Takes parallel sequences (one element per configuration) and returns
+        a dict of columns with the same keys as ``price``.
+        """
+        cells = list(map(self._cell, camera_specs, locations, difficulties))
+        factors = [c.factors[bisect_right(c.thresholds, n) - 1] for c, n in zip(cells, camera_counts)]
+        labor_cost = [c.labor_cost for c in cells]
+        travel_fees = [c.travel_fee for c in cells]
+
+        base_cost = list(map(mul, [c.base_price for c in cells], camera_counts))
+        difficulty_adjusted = map(mul, base_cost, [c.cost_multiplier for c in cells])
+        location_adjusted = map(mul, difficulty_adjusted, [c.location_multiplier for c in cells])
+        location_adjusted = list(map(mul, location_adjusted, factors))
+        subtotal = list(map(add, location_adjusted, labor_cost))
+        total_price = list(map(add, subtotal, travel_fees))
+
+        return {
+            'base_cost': base_cost,
+            'equipment': location_adjusted,
+            'labor_cost': labor_cost,
+            'travel_fee': travel_fees,
+            'subtotal': subtotal,
+            'total_price': total_price
+        }
+
+    def invoice_totals(self, subtotal: float):
+        """Return (subtotal, tax_amount, total_amount) for an invoice"""
+        tax_amount = subtotal * self.tax_rate
+        return subtotal, tax_amount, subtotal + tax_amount
+
+
+def _fraction(value, name: str) -> float:
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 <= value < 1:
+        raise ValueError(f'{name} must be a number between 0 and 1')
+    return float(value)
+
+
+def _camera_threshold(value, name: str) -> int:
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f'{name} must be a positive integer')
+    return value
+
+
+def normalize_rules(definition: dict = None) -> dict:
+    """Merge ``definition`` over ``DEFAULT_RULES`` and validate it.
+
+    Raises ValueError describing the first invalid rule.
+    """
+    definition = definition or {}
+    if not isinstance(definition, dict):
+        raise ValueError('rules must be an object')
+    unknown = set(definition) - set(DEFAULT_RULES)
+    if unknown:
+        raise ValueError(f"unknown rule keys: {', '.join(sorted(unknown))}")
+
+    rules = copy.deepcopy(DEFAULT_RULES)
+    rules.update(copy.deepcopy(definition))
+
+    labor_rate = rules['labor_rate']
+    if not isinstance(labor_rate, (int, float)) or isinstance(labor_rate, bool) or labor_rate < 0:
+        raise ValueError('labor_rate must be a non-negative number')
+    _fraction(rules['tax_rate'], 'tax_rate')
+
+    if not isinstance(rules['volume_tiers'], list):
+        raise ValueError('volume_tiers must be a list')
+    for i, tier in enumerate(rules['volume_tiers']):
+        if not isinstance(tier, dict):
+            raise ValueError(f'volume_tiers[{i}] must be an object')
+        _camera_threshold(tier.get('min_cameras'), f'volume_tiers[{i}].min_cameras')
+        _fraction(tier.get('discount'), f'volume_tiers[{i}].discount')
+
+    if not isinstance(rules['location_surcharges'], dict):
+        raise ValueError('location_surcharges must be an object')
+    surcharges = {}
+    for location_id, surcharge in rules['location_surcharges'].items():
+        try:
+            key = str(int(location_id))
+        except (TypeError, ValueError):
+            raise ValueError(f'location_surcharges key {location_id!r} must be a location id')
+        if not isinstance(surcharge, dict):
+            raise ValueError(f'location_surcharges[{key}] must be an object')
+        multiplier = surcharge.get('multiplier', 1.0)
+        flat = surcharge.get('flat', 0)
+        if not isinstance(multiplier, (int, float)) or isinstance(multiplier, bool) or multiplier <= 0:
+            raise ValueError(f'location_surcharges[{key}].multiplier must be a positive number')
+        if not isinstance(flat, (int, float)) or isinstance(flat, bool):
+            raise ValueError(f'location_surcharges[{key}].flat must be a number')
+        surcharges[key] = {'multiplier': multiplier, 'flat': flat}
+    rules['location_surcharges'] = surcharges
+
+    if not isinstance(rules['promotions'], list):
+        raise ValueError('promotions must be a list')
+    for i, promo in enumerate(rules['promotions']):
+        if not isinstance(promo, dict):
+            raise ValueError(f'promotions[{i}] must be an object')
+        _fraction(promo.get('discount'), f'promotions[{i}].discount')
+        if 'min_cameras' in promo:
+            _camera_threshold(promo['min_cameras'], f'promotions[{i}].min_cameras')
+        for key in ('resolutions', 'location_ids', 'difficulty_levels'):
+            if key in promo and not isinstance(promo[key], list):
+                raise ValueError(f'promotions[{i}].{key} must be a list')
+
+    return rules
+
+
+def _promotion_applies(promo: dict, location, camera_spec, difficulty) -> bool:
+    if 'resolutions' in promo and camera_spec.resolution not in promo['resolutions']:
+        return False
+    if 'location_ids' in promo and location.id not in promo['location_ids']:
+        return False
+    if 'difficulty_levels' in promo and difficulty.level not in promo['difficulty_levels']:
+        return False
+    return True
+
+
+def _step_function(tiers, promotions):
+    """Merge volume tiers and promotions into (thresholds, factors)"""
+    thresholds = sorted({1} | {t['min_cameras'] for t in tiers}
+                        | {p.get('min_cameras', 1) for p in promotions})
+    factors = []
+    for count in thresholds:
+        tier = max((t['discount'] for t in tiers if t['min_cameras'] <= count), default=0.0)
+        promo = max((p['discount'] for p in promotions if p.get('min_cameras', 1) <= count), default=0.0)
+        factors.append((1.0 - tier) * (1.0 - promo))
+    return (0,) + tuple(thresholds), (1.0,) + tuple(factors)
+
+
+def compile_plan(definition: dict, locations, resolutions, difficulties) -> PricingPlan:
+    """Compile a rules definition against the catalog entries"""
+    rules = normalize_rules(definition)
+    tiers = rules['volume_tiers']
+    cells = {}
+    for location in locations:
+        surcharge = rules['location_surcharges'].get(str(location.id), {})
+        location_multiplier = location.difficulty_multiplier * surcharge.get('multiplier', 1.0)
+        travel_fee = location.travel_fee + surcharge.get('flat', 0)
+        for camera_spec in resolutions:
+            for difficulty in difficulties:
+                promotions = [p for p in rules['promotions']
+                              if _promotion_applies(p, location, camera_spec, difficulty)]
+                thresholds, factors = _step_function(tiers, promotions)
+                cells[(location.id, camera_spec.resolution, difficulty.level)] = PlanCell(
+                    base_price=camera_spec.base_price,
+                    cost_multiplier=difficulty.cost_multiplier,
+                    location_multiplier=location_multiplier,
+                    labor_cost=difficulty.hours_required * rules['labor_rate'],
+                    travel_fee=travel_fee,
+                    thresholds=thresholds,
+                    factors=factors
+                )
+    return PricingPlan(rules, cells)
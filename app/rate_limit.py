@@ -0,0 +1,202 @@
+"""Per-IP, per-route token-bucket rate limiting shared by all workers on a node.
+
+Buckets live in a small SQLite file (``RATE_LIMIT_DB_PATH``, default
+``<instance>/rate_limits.db``) in WAL mode with ``synchronous=OFF``, so every
+gunicorn worker on the machine sees the same buckets and a check is one short
+local transaction (no network round trip, nothing touches the main
+database). The bucket update is a single UPSERT ... RETURNING, which SQLite
+applies atomically.
+
+Limits are ``"<requests>/<seconds>"`` strings keyed by endpoint
+(``contact.submit_quote``) or blueprint (``api``); the endpoint entry wins.
+``RATE_LIMITS`` overrides the defaults as ``name=requests/seconds`` pairs
+separated by ``;`` (``name=off`` disables one). The check runs in a
+``before_request`` hook, before any view or database access, and answers 429
+with ``Retry-After`` when the bucket is empty. If the limiter file cannot be
+used the request is let through (fail open) and counted as an error.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import current_app, jsonify, request
+
+DEFAULT_LIMITS = {
+    'contact.submit_quote': '10/60',
+    'api.calculate_price': '60/60',
+    'api.calculate_price_batch': '20/60',
+    'api.get_price': '120/60',
+    'validate_access': '10/60',
+}
+
+# Drop refilled buckets every this many checks per process
+PURGE_EVERY = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    allowed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS counters (
+    rule TEXT PRIMARY KEY,
+    allowed INTEGER NOT NULL DEFAULT 0,
+    limited INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Refill the bucket for the time elapsed, then take a token if there is one
+_TAKE_TOKEN = """
+INSERT INTO buckets (key, tokens, updated, allowed) VALUES (:key, :capacity - 1, :now, 1)
+ON CONFLICT (key) DO UPDATE SET
+    tokens = min(:capacity, tokens + (:now - updated) * :rate)
+             - (min(:capacity, tokens + (:now - updated) * :rate) >= 1),
+    allowed = min(:capacity, tokens + (:now - updated) * :rate) >= 1,
+    updated = :now
+RETURNING tokens, allowed
+"""
+
+_COUNT = """
+INSERT INTO counters (rule, allowed, limited) VALUES (:rule, :allowed, 1 - :allowed)
+ON CONFLICT (rule) DO UPDATE SET allowed = allowed + :allowed, limited = limited + 1 - :allowed
+"""
+
+
+def parse_limits(text: str, base: dict = None) -> dict:
+    """Parse ``name=requests/seconds;...`` into {name: (capacity, seconds)}"""
+    limits = dict(base or {})
+    for part in (text or '').split(';'):
+        if not part.strip():
+            continue
+        name, _, value = part.partition('=')
+        limits[name.strip()] = value.strip()
+
+    parsed = {}
+    for name, value in limits.items():
+        if value in ('', 'off', None):
+            continue
+        try:
+            capacity, seconds = (float(x) for x in value.split('/'))
+        except ValueError:
+            raise ValueError(f'rate limit for {name!r} must look like "10/60", got {value!r}')
+        if capacity < 1 or seconds <= 0:
+            raise ValueError(f'rate limit for {name!r} must allow at least 1 request per positive period')
+        parsed[name] = (capacity, seconds)
+    return parsed
+
+
+class RateLimiter:
+    """Token buckets in a SQLite file shared by the node's workers"""
+
+    def __init__(self, path: str, limits: dict, proxy_count: int = 0):
+        self.path = path
+        self.limits = limits
+        self.proxy_count = proxy_count
+        self.errors = 0
+        self._checks = 0
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, reopened after a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=0.5, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=OFF')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def rule_for(self, endpoint: str, blueprint: str):
+        if endpoint in self.limits:
+            return endpoint
+        if blueprint in self.limits:
+            return blueprint
+        return None
+
+    def client_ip(self) -> str:
+        if self.proxy_count and len(request.access_route) >= self.proxy_count:
+            return request.access_route[-self.proxy_count]
+        return request.remote_addr or 'unknown'
+
+    def take(self, rule: str, client: str):
+        """Take a token; returns seconds to wait, or 0 if allowed"""
+        capacity, seconds = self.limits[rule]
+        rate = capacity / seconds
+        connection = self._connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            (tokens, allowed), = connection.execute(_TAKE_TOKEN, {
+                'key': f'{rule}|{client}', 'capacity': capacity, 'rate': rate, 'now': time.time()
+            }).fetchall()
+            connection.execute(_COUNT, {'rule': rule, 'allowed': int(allowed)})
+        self._checks += 1
+        if self._checks % PURGE_EVERY == 0:
+            self.purge()
+        return 0 if allowed else (1 - tokens) / rate
+
+    def stats(self) -> dict:
+        rows = self._connection().execute('SELECT rule, allowed, limited FROM counters').fetchall()
+        return {
+            'limits': {name: f'{capacity:g}/{seconds:g}' for name, (capacity, seconds) in self.limits.items()},
+            'counters': {rule: {'allowed': allowed, 'limited': limited} for rule, allowed, limited in rows},
+            'errors_this_process': self.errors,
+        }
+
+    def purge(self) -> int:
+        """Drop buckets that have refilled completely (same as having no row)"""
+        connection = self._connection()
+        now = time.time()
+        deleted = 0
+        for name, (capacity, seconds) in self.limits.items():
+            deleted += connection.execute(
+                'DELETE FROM buckets WHERE key LIKE ? AND updated < ?',
+                (f'{name}|%', now - seconds)
+            ).rowcount
+        return deleted
+
+
+def init_app(app):
+    path = app.config.get('RATE_LIMIT_DB_PATH') or os.path.join(app.instance_path, 'rate_limits.db')
+    limits = parse_limits(app.config.get('RATE_LIMITS'), DEFAULT_LIMITS)
+    app.extensions['rate_limiter'] = RateLimiter(path, limits, app.config.get('RATE_LIMIT_PROXY_COUNT', 0))
+    app.before_request(check)
+
+
+def get_limiter() -> RateLimiter:
+    return current_app.extensions['rate_limiter']
+
+
+def check():
+    """before_request hook: 429 if the client's bucket for this route is empty"""
+    if not current_app.config.get('RATE_LIMIT_ENABLED') or request.method == 'OPTIONS':
+        return None
+    limiter = get_limiter()
+    rule = limiter.rule_for(request.endpoint, request.blueprint)
+    if rule is None:
+        return None
+
+    try:
+        retry_after = limiter.take(rule, limiter.client_ip())
+    except sqlite3.Error as e:
+        limiter.errors += 1
+        current_app.logger.warning(f"Rate limiter unavailable, allowing request: {e}")
+        return None
+    if not retry_after:
+        return None
+
+    retry_after = max(1, math.ceil(retry_after))
+    response = jsonify({
+        'success': False,
+        'error': 'Too many requests, please slow down',
+        'retry_after': retry_after
+    })
+    response.status_code = 429
+    response.headers['Retry-After'] = str(retry_after)
+    return response
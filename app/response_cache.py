@@ -0,0 +1,237 @@
+"""Stale-while-revalidate cache for the admin read endpoints.
+
+``@cached('quotes', ...)`` keeps a view's 200 responses in a per-process
+LRU keyed on the endpoint, its URL arguments and its validated query
+arguments (so ``?per_page=20`` and no ``per_page`` share an entry). An
+entry younger than ``RESPONSE_CACHE_SECONDS`` is served as is. For another
+``RESPONSE_CACHE_STALE_SECONDS`` it is still served while one background
+thread recomputes it, so an expiry never sends every waiting request to the
+database at once. On a miss the first request computes the response and
+concurrent requests for the same key wait for it.
+
+Writes invalidate by tag. The session's flush hook maps the models a
+transaction wrote to their tags (``quotes``, ``installations``,
+``payments``, ``invoices``, ``technicians``) and bumps those tags when it
+commits, so every write handler in admin, technician, contact and payment
+invalidates what it changed; writes that bypass the flush call
+``invalidate_on_commit``. An entry computed before a bump of one of its
+tags is never served again, stale or not. Bumps are per process: other
+workers drop their copy when it expires.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from functools import wraps
+from typing import NamedTuple
+
+from flask import copy_current_request_context, current_app, g, has_app_context, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models import QuoteRequest
+from app.models_extended import Installation, Invoice, Payment, Technician
+
+TAGS = {
+    QuoteRequest: 'quotes',
+    Installation: 'installations',
+    Payment: 'payments',
+    Invoice: 'invoices',
+    Technician: 'technicians',
+}
+HEADER = 'X-Cache'
+WAIT_SECONDS = 30
+
+
+class Entry(NamedTuple):
+    body: bytes
+    status: int
+    mimetype: str
+    stored_at: float
+    versions: tuple
+
+
+class ResponseCache:
+    """Per-process entries, tag versions and in-flight computations"""
+
+    def __init__(self, fresh: float, stale: float, capacity: int):
+        self.fresh = fresh
+        self.stale = stale
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._pending = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _current(self, tags: tuple) -> tuple:
+        return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    def lookup(self, key, tags: tuple):
+        """Return (entry, state): state is 'HIT', 'STALE', or 'REFRESH' when the
+        caller should start the background refresh; (None, None) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+            age = time.monotonic() - entry.stored_at
+            if entry.versions != self._current(tags) or age >= self.fresh + self.stale:
+                del self._entries[key]
+                return None, None
+            self._entries.move_to_end(key)
+            if age < self.fresh:
+                return entry, 'HIT'
+            if key in self._refreshing:
+                return entry, 'STALE'
+            self._refreshing.add(key)
+            return entry, 'REFRESH'
+
+    def compute(self, key, tags: tuple, view):
+        """Run ``view`` and store its response; returns (response, entry).
+
+        While one caller computes a key, others wait for its entry instead;
+        they get (None, entry), or run ``view`` themselves if it produced
+        nothing cacheable.
+        """
+        with self._lock:
+            future = self._pending.get(key)
+            leader = future is None
+            if leader:
+                future = self._pending[key] = Future()
+            versions = self._current(tags)
+
+        if not leader:
+            try:
+                entry = future.result(timeout=WAIT_SECONDS)
+            except FutureTimeoutError:
+                entry = None
+            if entry is not None:
+                return None, entry
+            return make_response(view()), None
+
+        entry = None
+        try:
+            response = make_response(view())
+            if response.status_code == 200 and not response.is_streamed:
+                entry = Entry(response.get_data(), 200, response.mimetype, time.monotonic(), versions)
+                with self._lock:
+                    self._entries[key] = entry
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.capacity:
+                        self._entries.popitem(last=False)
+            return response, entry
+        finally:
+            with self._lock:
+                del self._pending[key]
+            future.set_result(entry)
+
+    def refreshed(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+
+def _cache() -> ResponseCache:
+    cache = current_app.extensions.get('response_cache')
+    if cache is None:
+        cache = current_app.extensions['response_cache'] = ResponseCache(
+            current_app.config['RESPONSE_CACHE_SECONDS'],
+            current_app.config['RESPONSE_CACHE_STALE_SECONDS'],
+            current_app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+        )
+    return cache
+
+
+def _key(view_args: dict) -> tuple:
+    # g.args is set by @validate: typed, with defaults filled in
+    args = g.args if 'args' in g else sorted(request.args.items(multi=True))
+    return (request.endpoint,
+            json.dumps(view_args, sort_keys=True, default=str),
+            json.dumps(args, sort_keys=True, default=str))
+
+
+def _respond(entry: Entry, state: str):
+    response = current_app.response_class(entry.body, status=entry.status, mimetype=entry.mimetype)
+    response.headers[HEADER] = state
+    return response
+
+
+def cached(*tags):
+    """Decorator caching a GET view's responses until one of ``tags`` is
+    written; goes under ``@validate`` so the key uses the validated args"""
+    tags = tuple(sorted(tags))
+
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method != 'GET' or not current_app.config['RESPONSE_CACHE_SECONDS']:
+                return f(*args, **kwargs)
+            cache = _cache()
+            key = _key(kwargs)
+            entry, state = cache.lookup(key, tags)
+
+            if state == 'REFRESH':
+                validated = g.get('args')
+
+                @copy_current_request_context
+                def refresh():
+                    # The copied request context starts with an empty g
+                    if validated is not None:
+                        g.args = validated
+                    try:
+                        response, _ = cache.compute(key, tags, lambda: f(*args, **kwargs))
+                        if response is not None and response.status_code != 200:
+                            current_app.logger.warning(
+                                f"Background refresh of {request.endpoint} returned {response.status_code}"
+                            )
+                    except Exception as e:
+                        current_app.logger.error(f"Background refresh of {request.endpoint} failed: {e}")
+                    finally:
+                        cache.refreshed(key)
+                threading.Thread(target=refresh, name='response-cache-refresh', daemon=True).start()
+                state = 'STALE'
+            if entry is not None:
+                return _respond(entry, state)
+
+            response, entry = cache.compute(key, tags, lambda: f(*args, **kwargs))
+            if response is None:
+                return _respond(entry, 'HIT')
+            response.headers[HEADER] = 'MISS'
+            return response
+        return decorated
+    return decorator
+
+
+def invalidate(*tags):
+    """Drop this worker's entries for ``tags`` now"""
+    if has_app_context() and tags:
+        _cache().invalidate(tags)
+
+
+def invalidate_on_commit(session, *tags):
+    """Invalidate ``tags`` when ``session``'s transaction commits"""
+    session.info.setdefault('cache_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    written = [obj for obj in session.new] + [obj for obj in session.deleted]
+    written += [obj for obj in session.dirty if session.is_modified(obj)]
+    tags = {TAGS[type(obj)] for obj in written if type(obj) in TAGS}
+    if tags:
+        invalidate_on_commit(session, *tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    invalidate(*session.info.pop('cache_tags', ()))
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _after_rollback(session, previous_transaction):
+    session.info.pop('cache_tags', None)
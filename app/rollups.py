@@ -0,0 +1,322 @@
+"""Rollup tables for the dashboard and analytics.
+
+Small tables summarize the large ones:
+
+- ``quote_daily_stats``: quotes by creation day, status and service
+- ``invoice_daily_stats``: invoice count and total by issue day and status
+- ``installation_stats``: installations by technician and status
+- ``quote_metrics``: quotes and converted quotes by creation day
+- ``revenue_metrics``: paid and issued invoice totals by issue day
+
+The two metrics tables are cubes: every day has one slice per subset of
+location, resolution and service (``dimensions`` names it), so a chart
+grouped by location and filtered on a service reads a single slice of at
+most a few dozen rows per day, however many quotes there are.
+
+They are kept up to date by the session's ``after_flush`` hook. Every
+inserted, deleted or changed row of a summarized table turns into a -1 on
+its old rollup keys and a +1 on its new ones, and the deltas are applied as
+``INSERT ... ON CONFLICT DO UPDATE`` increments on the flush's connection.
+So the rollups commit or roll back with the change itself, whichever route
+made it (``update_quote``, ``assign_technician``, ``complete_installation``,
+``verify_payment``, invoice generation, the group committer, ...). Rows
+inserted with ``session.execute(insert(...))`` bypass the flush; their
+writer calls ``record_inserts`` (see ``app/partner_ingest.py``).
+
+An invoice's quote fields are read when the invoice is written; quotes
+do not change service, location or resolution after they are submitted.
+``flask rebuild-rollups`` recomputes the tables from the live ones, and
+``--check`` only reports rows that drifted.
+"""
+from datetime import datetime
+from itertools import combinations
+from typing import NamedTuple
+
+from sqlalchemy import case, cast, delete, event, func, literal, or_, select, text, type_coerce
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, object_session
+
+from app import db
+from app.models import QuoteRequest
+from app.models_extended import (
+    Installation, InstallationStats, Invoice, InvoiceDailyStats, QuoteDailyStats, QuoteMetrics,
+    RevenueMetrics
+)
+from app.stats import REVENUE_STATUSES
+
+CUBE_COLUMNS = ('location_id', 'resolution', 'service')
+
+
+class Measure(NamedTuple):
+    column: str
+    amount: str = None  # source attribute summed; rows are counted without one
+    when: tuple = None  # (source attribute, values): only rows whose attribute is in values
+
+
+class Rollup(NamedTuple):
+    model: type
+    source: type
+    keys: tuple  # (rollup column, source attribute or relationship.attribute) pairs
+    measures: tuple = (Measure('count'),)
+    fixed: tuple = ()  # (rollup column, value) pairs, the same for every row
+
+    @property
+    def watched(self) -> tuple:
+        attrs = [attr for _, attr in self.keys if '.' not in attr]
+        for measure in self.measures:
+            attrs += [measure.amount] if measure.amount else []
+            attrs += [measure.when[0]] if measure.when else []
+        return tuple(dict.fromkeys(attrs))
+
+
+def slice_name(columns) -> str:
+    """``dimensions`` value of the cube slice broken down by ``columns``"""
+    return ','.join(column for column in CUBE_COLUMNS if column in columns)
+
+
+def _cube(model, source, day: str, prefix: str, measures: tuple) -> tuple:
+    """One rollup per subset of CUBE_COLUMNS; ``prefix`` reaches the source's quote"""
+    table = model.__table__
+    return tuple(
+        Rollup(model, source, (('day', day),) + tuple((column, prefix + column) for column in columns),
+               measures,
+               (('dimensions', slice_name(columns)),) + tuple(
+                   (column, _key_value(table.c[column], None))
+                   for column in CUBE_COLUMNS if column not in columns
+               ))
+        for size in range(len(CUBE_COLUMNS) + 1)
+        for columns in combinations(CUBE_COLUMNS, size)
+    )
+
+
+def _key_value(column, value):
+    if isinstance(column.type, db.Date):
+        return value.date() if isinstance(value, datetime) else value
+    if value is None:
+        return 0 if isinstance(column.type, db.Integer) else ''
+    return value
+
+
+ROLLUPS = (
+    Rollup(QuoteDailyStats, QuoteRequest, (('day', 'created_at'), ('status', 'status'), ('service', 'service'))),
+    Rollup(InvoiceDailyStats, Invoice, (('day', 'issued_date'), ('status', 'status')),
+           (Measure('count'), Measure('total_amount', amount='total_amount'))),
+    Rollup(InstallationStats, Installation, (('technician_id', 'technician_id'), ('status', 'status'))),
+) + _cube(QuoteMetrics, QuoteRequest, 'created_at', '', (
+    Measure('quotes'), Measure('converted', when=('status', ('converted',))),
+)) + _cube(RevenueMetrics, Invoice, 'issued_date', 'quote.', (
+    Measure('revenue', amount='total_amount', when=('status', REVENUE_STATUSES)),
+))
+BY_SOURCE = {}
+for _rollup in ROLLUPS:
+    BY_SOURCE.setdefault(_rollup.source, []).append(_rollup)
+TABLES = tuple(dict.fromkeys(rollup.model.__table__ for rollup in ROLLUPS))
+
+
+def _noop(target, value, oldvalue, initiator):
+    pass
+
+
+# active_history loads the old value before an expired attribute is
+# overwritten, so the flush always knows which rollup key to decrement
+for _source, _rollups in BY_SOURCE.items():
+    for _attr in dict.fromkeys(attr for rollup in _rollups for attr in rollup.watched):
+        event.listen(getattr(_source, _attr), 'set', _noop, active_history=True)
+
+
+def _get(obj, path: str):
+    if '.' not in path:
+        return getattr(obj, path)
+    relation, attr = path.split('.')
+    # Objects are still pending during the flush hook, so their
+    # relationships are not loaded yet; look the row up by foreign key
+    prop = db.inspect(type(obj)).relationships[relation]
+    (column,) = prop.local_columns
+    key = getattr(obj, prop.parent.get_property_by_column(column).key)
+    related = object_session(obj).get(prop.mapper.class_, key) if key is not None else None
+    return getattr(related, attr) if related is not None else None
+
+
+def _measure_value(measure: Measure, get):
+    if measure.when and get(measure.when[0]) not in measure.when[1]:
+        return 0
+    return (get(measure.amount) or 0) if measure.amount else 1
+
+
+def _add(deltas: dict, rollups, get, sign: int):
+    """Add ``sign`` times the row read by ``get(attr)`` to ``deltas``"""
+    values = {}
+    for rollup in rollups:
+        table = rollup.model.__table__
+        keys = {}
+        for column, attr in rollup.keys:
+            if attr not in values:
+                values[attr] = get(attr)
+            keys[column] = _key_value(table.c[column], values[attr])
+        if None in keys.values():
+            continue
+        row = {**dict(rollup.fixed), **keys}
+        key = tuple(row[column.name] for column in table.primary_key.columns)
+        delta = deltas.setdefault(table, {}).setdefault(key, dict.fromkeys((m.column for m in rollup.measures), 0))
+        for measure in rollup.measures:
+            delta[measure.column] += sign * _measure_value(measure, get)
+
+
+def _old_value(obj, attr: str):
+    if '.' in attr:
+        return _get(obj, attr)
+    history = db.inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+
+def _apply(connection, deltas: dict):
+    dialect = postgresql if connection.dialect.name == 'postgresql' else sqlite
+    # Sorted so concurrent transactions lock rollup rows in the same order
+    for table in TABLES:
+        keys = [column.name for column in table.primary_key.columns]
+        rows = [
+            {**dict(zip(keys, key)), **delta}
+            for key, delta in sorted(deltas.get(table, {}).items())
+            if any(delta.values())
+        ]
+        if not rows:
+            continue
+        statement = dialect.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + statement.excluded[name] for name in rows[0] if name not in keys}
+        )
+        connection.execute(statement, rows)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        rollups = BY_SOURCE.get(type(obj))
+        if rollups:
+            _add(deltas, rollups, lambda attr: _get(obj, attr), 1)
+    for obj in session.deleted:
+        rollups = BY_SOURCE.get(type(obj))
+        if rollups:
+            _add(deltas, rollups, lambda attr: _old_value(obj, attr), -1)
+    for obj in session.dirty:
+        rollups = BY_SOURCE.get(type(obj))
+        if rollups and any(db.inspect(obj).attrs[attr].history.has_changes()
+                           for rollup in rollups for attr in rollup.watched):
+            _add(deltas, rollups, lambda attr: _old_value(obj, attr), -1)
+            _add(deltas, rollups, lambda attr: _get(obj, attr), 1)
+    if deltas:
+        _apply(session.connection(), deltas)
+
+
+def record_inserts(session, source: type, rows):
+    """Count rows inserted without a flush; each row needs the rollups'
+    source attributes (e.g. a ``RETURNING`` row)"""
+    deltas = {}
+    for row in rows:
+        _add(deltas, BY_SOURCE[source], lambda attr: getattr(row, attr), 1)
+    if deltas:
+        _apply(session.connection(), deltas)
+
+
+def _aggregate(rollup: Rollup, dialect):
+    """SELECT of the rollup rows computed from the live table"""
+    table = rollup.model.__table__
+    keys = []
+    where = []
+    relations = []
+    for column, attr in rollup.keys:
+        if '.' in attr:
+            relation, attr = attr.split('.')
+            relation = getattr(rollup.source, relation)
+            if relation not in relations:
+                relations.append(relation)
+            source = getattr(relation.property.mapper.class_, attr)
+        else:
+            source = getattr(rollup.source, attr)
+        column_type = table.c[column].type
+        if isinstance(column_type, db.Date):
+            # CAST(... AS DATE) has numeric affinity on SQLite
+            keys.append((type_coerce(func.date(source), db.Date) if dialect.name == 'sqlite'
+                         else cast(source, db.Date)).label(column))
+            where.append(source.is_not(None))
+        else:
+            keys.append(func.coalesce(source, 0 if isinstance(column_type, db.Integer) else '').label(column))
+    measures = []
+    for measure in rollup.measures:
+        value = getattr(rollup.source, measure.amount) if measure.amount else literal(1)
+        if measure.when:
+            value = case((getattr(rollup.source, measure.when[0]).in_(measure.when[1]), value), else_=0)
+        elif not measure.amount:
+            measures.append(func.count().label(measure.column))
+            continue
+        measures.append(func.coalesce(func.sum(value), 0).label(measure.column))
+    fixed = [literal(value, table.c[column].type).label(column) for column, value in rollup.fixed]
+    query = select(*fixed, *keys, *measures).select_from(rollup.source)
+    for relation in relations:
+        query = query.outerjoin(relation)
+    return query.where(*where).group_by(*keys)
+
+
+def rebuild(session) -> dict:
+    """Recompute every rollup from its table and commit; returns {table: rows}"""
+    dialect = session.get_bind().dialect
+    if dialect.name == 'postgresql':
+        # Writers that already changed a source row wait here, and add their
+        # delta on top of the rebuilt rows once this transaction commits
+        session.execute(text('LOCK TABLE ' + ', '.join(table.name for table in TABLES)
+                             + ' IN SHARE ROW EXCLUSIVE MODE'))
+    counts = {}
+    for table in TABLES:
+        session.execute(delete(table))
+        for rollup in ROLLUPS:
+            if rollup.model.__table__ is table:
+                query = _aggregate(rollup, dialect)
+                session.execute(table.insert().from_select([c.name for c in query.selected_columns], query))
+        counts[table.name] = session.execute(select(func.count()).select_from(table)).scalar()
+    session.commit()
+    return counts
+
+
+def unbuilt(session) -> list:
+    """Rollup tables that are empty although the table they summarize is not"""
+    sources = {rollup.model.__table__: rollup.source for rollup in ROLLUPS}
+    return [
+        table.name for table, source in sources.items()
+        if session.execute(select(table).limit(1)).first() is None
+        and session.execute(select(source.id).limit(1)).first() is not None
+    ]
+
+
+def check(session) -> dict:
+    """Return {table: [problems]} comparing each rollup with its table (empty if fine)"""
+    dialect = session.get_bind().dialect
+    results = {}
+    for table in TABLES:
+        keys = [column.name for column in table.primary_key.columns]
+        measures = [column.name for column in table.columns if not column.primary_key]
+
+        def split(rows):
+            return {
+                tuple(row[name] for name in keys): tuple(row[name] for name in measures)
+                for row in rows if any(row[name] for name in measures)
+            }
+
+        expected = {}
+        for rollup in ROLLUPS:
+            if rollup.model.__table__ is table:
+                expected.update(split(session.execute(_aggregate(rollup, dialect)).mappings()))
+        stored = split(session.execute(
+            select(table).where(or_(*(table.c[name] != 0 for name in measures)))
+        ).mappings())
+        problems = []
+        for key in sorted(expected.keys() | stored.keys(), key=repr):
+            want, have = expected.get(key), stored.get(key)
+            if want is None or have is None or any(abs(a - b) > 0.005 for a, b in zip(want, have)):
+                problems.append(f'{dict(zip(keys, key))}: '
+                                f'expected {tuple(want or ())}, stored {tuple(have or ())}')
+        results[table.name] = problems
+    return results
@@ -1,17 +1,116 @@
 from flask import jsonify, render_template, request, current_app, g
 from app.routes import admin_bp
-from app.models import QuoteRequest, Location
+from app.models import QuoteRequest, Location, PricingRuleSet
 from app.models_extended import Technician, Installation, Payment, Invoice
 from app import db
+from app.catalog import get_catalog
+from app.pricing import normalize_rules
+from app import analytics, search, simulator, stats
+from app.pagination import CURSOR, PER_PAGE, TOTAL, keyset_page
+from app.rate_limit import get_limiter
+from app.response_cache import cached
+from app.validation import Field, Schema, validate
 from datetime import datetime, timedelta
+from functools import wraps
+import hmac
 import json
 
+# Cursor pagination fields shared by the list endpoints (see app/pagination.py)
+PAGE = dict(cursor=CURSOR, per_page=PER_PAGE, total=TOTAL)
+
+QUOTE_LIST_QUERY = Schema(
+    status=Field('string', choices=['new', 'contacted', 'converted', 'rejected']),
+    duplicates=Field('boolean', default=True),
+    **PAGE,
+)
+
+LIST_QUERY = Schema(status=Field('string', max_length=20), **PAGE)
+
+INSTALLATION_LIST_QUERY = Schema(
+    status=Field('string', max_length=20),
+    technician_id=Field('integer', min=1),
+    **PAGE,
+)
+
+ASSIGN_TECHNICIAN_SCHEMA = Schema(
+    technician_id=Field('integer', required=True, min=1),
+    scheduled_date=Field('datetime', required=True),
+)
+
+COMPLETE_INSTALLATION_SCHEMA = Schema(
+    labor_hours_actual=Field('number', min=0),
+    satisfaction=Field('integer', min=1, max=5, default=5),
+    notes=Field('string', max_length=5000),
+)
+
+PAYMENT_SCHEMA = Schema(
+    amount=Field('number', min=0, default=0),
+    payment_method=Field('string', max_length=50, default='pending'),
+    payment_gateway=Field('string', max_length=50, default='manual'),
+)
+
+INVOICE_SCHEMA = Schema(
+    subtotal=Field('number', min=0, default=0),
+    tax_amount=Field('number', min=0),
+    total_amount=Field('number', min=0),
+    notes=Field('string', max_length=5000, default=''),
+)
+
+TECHNICIAN_SCHEMA = Schema(
+    name=Field('string', required=True, min_length=2, max_length=100),
+    email=Field('email', required=True, max_length=100),
+    phone=Field('phone', required=True, max_length=20),
+    specialization=Field('string', max_length=100),
+    salary=Field('number', min=0, default=0),
+)
+
+TECHNICIAN_UPDATE_SCHEMA = Schema(
+    status=Field('string', choices=['available', 'busy', 'off-duty']),
+    specialization=Field('string', max_length=100),
+    salary=Field('number', min=0),
+)
+
+PRICING_RULES_SCHEMA = Schema(
+    rules=Field('object', default={}),
+    notes=Field('string', max_length=500),
+)
+
+TIMESERIES_QUERY = Schema(
+    bucket=Field('string', lower=True, choices=analytics.BUCKETS, default='day'),
+    group_by=Field('string', lower=True, choices=list(analytics.GROUPS)),
+    start=Field('datetime'),
+    end=Field('datetime'),
+    location_id=Field('integer', min=1),
+    resolution=Field('string', max_length=50),
+    service=Field('string', max_length=100),
+)
+
+SEARCH_QUERY = Schema(
+    q=Field('string', required=True, max_length=search.MAX_QUERY_LENGTH),
+    type=Field('string', lower=True, choices=list(search.KINDS)),
+    limit=Field('integer', min=1, max=50, default=20),
+)
+
+SIMULATION_SCHEMA = Schema(
+    locations=Field('object'),
+    resolutions=Field('object'),
+    difficulties=Field('object'),
+    rules=Field('object'),
+    start=Field('datetime'),
+    end=Field('datetime'),
+    statuses=Field('list', items=Field('string', max_length=20), max_items=10),
+)
+
 # Admin authentication decorator (basic example)
 def require_admin(f):
+    """Decorator requiring the X-Admin-Key header to match ADMIN_API_KEY"""
+    @wraps(f)
     def decorated(*args, **kwargs):
         # TODO: Implement proper JWT/session-based auth
-        admin_key = request.headers.get('X-Admin-Key')
-        if admin_key != current_app.config.get('ADMIN_API_KEY'):
+        expected = current_app.config.get('ADMIN_API_KEY')
+        admin_key = request.headers.get('X-Admin-Key', '')
+        # Without a configured key every request is refused
+        if not expected or not hmac.compare_digest(admin_key.encode(), expected.encode()):
             return jsonify({'success': False, 'error': 'Unauthorized'}), 401
         return f(*args, **kwargs)
     return decorated
@@ -28,66 +127,11 @@ def dashboard():
 
 
 @admin_bp.route('/api/dashboard/stats')
+@cached('quotes', 'installations', 'invoices', 'technicians')
 def dashboard_stats():
-    """Get dashboard statistics"""
+    """Get dashboard statistics (one query, see app/stats.py)"""
     try:
-        today = datetime.utcnow().date()
-        month_start = today.replace(day=1)
-        year_start = today.replace(month=1, day=1)
-        
-        # Quote statistics
-        total_quotes = QuoteRequest.query.count()
-        new_quotes = QuoteRequest.query.filter(
-            QuoteRequest.created_at >= datetime.utcnow() - timedelta(days=7),
-            QuoteRequest.status == 'new'
-        ).count()
-        converted_quotes = QuoteRequest.query.filter_by(status='converted').count()
-        conversion_rate = (converted_quotes / total_quotes * 100) if total_quotes > 0 else 0
-        
-        # Revenue statistics
-        month_revenue = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-            Invoice.issued_date >= month_start,
-            Invoice.status.in_(['paid', 'issued'])
-        ).scalar() or 0
-        
-        year_revenue = db.session.query(db.func.sum(Invoice.total_amount)).filter(
-            Invoice.issued_date >= year_start,
-            Invoice.status.in_(['paid', 'issued'])
-        ).scalar() or 0
-        
-        # Installation statistics
-        completed_installations = Installation.query.filter_by(status='completed').count()
-        pending_installations = Installation.query.filter_by(status='pending').count()
-        in_progress = Installation.query.filter_by(status='in-progress').count()
-        
-        # Technician statistics
-        available_technicians = Technician.query.filter_by(status='available').count()
-        busy_technicians = Technician.query.filter_by(status='busy').count()
-        
-        return jsonify({
-            'success': True,
-            'quotes': {
-                'total': total_quotes,
-                'new': new_quotes,
-                'converted': converted_quotes,
-                'conversion_rate': round(conversion_rate, 2)
-            },
-            'revenue': {
-                'this_month': round(month_revenue, 2),
-                'this_year': round(year_revenue, 2),
-                'currency': 'MAD'
-            },
-            'installations': {
-                'completed': completed_installations,
-                'pending': pending_installations,
-                'in_progress': in_progress
-            },
-            'team': {
-                'available': available_technicians,
-                'busy': busy_technicians,
-                'total': Technician.query.count()
-            }
-        }), 200
+        return jsonify({'success': True, **stats.dashboard_stats(db.session)}), 200
     except Exception as e:
         current_app.logger.error(f"Dashboard stats error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -98,34 +142,36 @@ def dashboard_stats():
 # ============================================================================
 
 @admin_bp.route('/api/quotes')
+@validate(query=QUOTE_LIST_QUERY)
+@cached('quotes')
 def list_quotes():
     """Get all quotes with filtering"""
     try:
-        status = request.args.get('status')
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
+        status = g.args.get('status')
         
         query = QuoteRequest.query
         
         if status:
             query = query.filter_by(status=status)
+        if not g.args['duplicates']:
+            query = query.filter(QuoteRequest.duplicate_of_id.is_(None))
         
-        quotes = query.order_by(QuoteRequest.created_at.desc()).paginate(
-            page=page, per_page=per_page
-        )
+        page = keyset_page(query, [QuoteRequest.created_at, QuoteRequest.id], g.args, descending=True,
+                           total_key=('quotes', status, g.args['duplicates']))
         
         return jsonify({
             'success': True,
-            'total': quotes.total,
-            'pages': quotes.pages,
-            'current_page': page,
-            'data': [q.to_dict() for q in quotes.items]
+            'total': page.get('total'),
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
+            'data': [q.to_dict() for q in page['items']]
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @admin_bp.route('/api/quotes/<int:quote_id>')
+@cached('quotes', 'installations', 'payments', 'invoices', 'technicians')
 def get_quote_detail(quote_id):
     """Get quote details with related data"""
     try:
@@ -136,10 +182,14 @@ def get_quote_detail(quote_id):
         installation = Installation.query.filter_by(quote_id=quote_id).first()
         payment = Payment.query.filter_by(quote_id=quote_id).first()
         invoice = Invoice.query.filter_by(quote_id=quote_id).first()
+        duplicates = QuoteRequest.query.filter_by(
+            duplicate_of_id=quote.duplicate_of_id or quote.id
+        ).order_by(QuoteRequest.created_at.asc()).all()
         
         return jsonify({
             'success': True,
             'quote': quote.to_dict(),
+            'duplicates': [q.to_dict() for q in duplicates if q.id != quote.id],
             'installation': installation.to_dict() if installation else None,
             'payment': payment.to_dict() if payment else None,
             'invoice': invoice.to_dict() if invoice else None
@@ -149,10 +199,11 @@ def get_quote_detail(quote_id):
 
 
 @admin_bp.route('/api/quotes/<int:quote_id>/assign-technician', methods=['POST'])
+@validate(body=ASSIGN_TECHNICIAN_SCHEMA)
 def assign_technician(quote_id):
     """Assign technician to a quote"""
     try:
-        data = request.get_json()
+        data = g.body
         technician_id = data.get('technician_id')
         scheduled_date = data.get('scheduled_date')
         
@@ -171,7 +222,7 @@ def assign_technician(quote_id):
             db.session.add(installation)
         
         installation.technician_id = technician_id
-        installation.scheduled_date = datetime.fromisoformat(scheduled_date)
+        installation.scheduled_date = scheduled_date
         installation.status = 'pending'
         
         quote.status = 'contacted'
@@ -194,12 +245,13 @@ def assign_technician(quote_id):
 # ============================================================================
 
 @admin_bp.route('/api/installations')
+@validate(query=INSTALLATION_LIST_QUERY)
+@cached('installations', 'technicians')
 def list_installations():
     """Get all installations"""
     try:
-        status = request.args.get('status')
-        technician_id = request.args.get('technician_id', type=int)
-        page = request.args.get('page', 1, type=int)
+        status = g.args.get('status')
+        technician_id = g.args.get('technician_id')
         
         query = Installation.query
         
@@ -208,24 +260,26 @@ def list_installations():
         if technician_id:
             query = query.filter_by(technician_id=technician_id)
         
-        installations = query.order_by(Installation.scheduled_date.asc()).paginate(
-            page=page, per_page=20
-        )
+        page = keyset_page(query, [Installation.scheduled_date, Installation.id], g.args,
+                           total_key=('installations', status, technician_id))
         
         return jsonify({
             'success': True,
-            'total': installations.total,
-            'data': [i.to_dict() for i in installations.items]
+            'total': page.get('total'),
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
+            'data': [i.to_dict() for i in page['items']]
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @admin_bp.route('/api/installations/<int:installation_id>/complete', methods=['POST'])
+@validate(body=COMPLETE_INSTALLATION_SCHEMA)
 def complete_installation(installation_id):
     """Mark installation as complete"""
     try:
-        data = request.get_json()
+        data = g.body
         installation = Installation.query.get(installation_id)
         if not installation:
             return jsonify({'success': False, 'error': 'Installation not found'}), 404
@@ -260,30 +314,33 @@ def complete_installation(installation_id):
 # ============================================================================
 
 @admin_bp.route('/api/payments')
+@validate(query=LIST_QUERY)
+@cached('payments')
 def list_payments():
     """Get all payments"""
     try:
-        status = request.args.get('status')
-        page = request.args.get('page', 1, type=int)
+        status = g.args.get('status')
         
         query = Payment.query
         if status:
             query = query.filter_by(status=status)
         
-        payments = query.order_by(Payment.created_at.desc()).paginate(
-            page=page, per_page=20
-        )
+        page = keyset_page(query, [Payment.created_at, Payment.id], g.args, descending=True,
+                           total_key=('payments', status))
         
         return jsonify({
             'success': True,
-            'total': payments.total,
-            'data': [p.to_dict() for p in payments.items]
+            'total': page.get('total'),
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
+            'data': [p.to_dict() for p in page['items']]
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @admin_bp.route('/api/payments/<int:quote_id>/create', methods=['POST'])
+@validate(body=PAYMENT_SCHEMA)
 def create_payment(quote_id):
     """Create payment record for quote"""
     try:
@@ -291,7 +348,7 @@ def create_payment(quote_id):
         if not quote:
             return jsonify({'success': False, 'error': 'Quote not found'}), 404
         
-        data = request.get_json()
+        data = g.body
         
         payment = Payment(
             quote_id=quote_id,
@@ -342,30 +399,33 @@ def mark_payment_paid(payment_id):
 # ============================================================================
 
 @admin_bp.route('/api/invoices')
+@validate(query=LIST_QUERY)
+@cached('invoices')
 def list_invoices():
     """Get all invoices"""
     try:
-        status = request.args.get('status')
-        page = request.args.get('page', 1, type=int)
+        status = g.args.get('status')
         
         query = Invoice.query
         if status:
             query = query.filter_by(status=status)
         
-        invoices = query.order_by(Invoice.issued_date.desc()).paginate(
-            page=page, per_page=20
-        )
+        page = keyset_page(query, [Invoice.issued_date, Invoice.id], g.args, descending=True,
+                           total_key=('invoices', status))
         
         return jsonify({
             'success': True,
-            'total': invoices.total,
-            'data': [i.to_dict() for i in invoices.items]
+            'total': page.get('total'),
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
+            'data': [i.to_dict() for i in page['items']]
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @admin_bp.route('/api/invoices/<int:quote_id>/generate', methods=['POST'])
+@validate(body=INVOICE_SCHEMA)
 def generate_invoice(quote_id):
     """Generate invoice from quote"""
     try:
@@ -373,14 +433,24 @@ def generate_invoice(quote_id):
         if not quote:
             return jsonify({'success': False, 'error': 'Quote not found'}), 404
         
-        data = request.get_json()
+        data = g.body
+        
+        # Explicit amounts win; otherwise TVA comes from the pricing rules
+        if 'tax_amount' in data or 'total_amount' in data:
+            subtotal = data.get('subtotal', 0)
+            tax_amount = data.get('tax_amount', 0)
+            total_amount = data.get('total_amount', 0)
+        else:
+            subtotal, tax_amount, total_amount = get_catalog().pricing_plan.invoice_totals(
+                data.get('subtotal', 0)
+            )
         
         # Create invoice
         invoice = Invoice(
             quote_id=quote_id,
-            subtotal=data.get('subtotal', 0),
-            tax_amount=data.get('tax_amount', 0),
-            total_amount=data.get('total_amount', 0),
+            subtotal=subtotal,
+            tax_amount=tax_amount,
+            total_amount=total_amount,
             due_date=datetime.utcnow() + timedelta(days=30),
             notes=data.get('notes', '')
         )
@@ -406,34 +476,37 @@ def generate_invoice(quote_id):
 # ============================================================================
 
 @admin_bp.route('/api/technicians')
+@validate(query=LIST_QUERY)
+@cached('technicians')
 def list_technicians():
     """Get all technicians"""
     try:
-        status = request.args.get('status')
-        page = request.args.get('page', 1, type=int)
+        status = g.args.get('status')
         
         query = Technician.query
         if status:
             query = query.filter_by(status=status)
         
-        technicians = query.order_by(Technician.name).paginate(
-            page=page, per_page=20
-        )
+        page = keyset_page(query, [Technician.name, Technician.id], g.args,
+                           total_key=('technicians', status))
         
         return jsonify({
             'success': True,
-            'total': technicians.total,
-            'data': [t.to_dict() for t in technicians.items]
+            'total': page.get('total'),
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
+            'data': [t.to_dict() for t in page['items']]
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @admin_bp.route('/api/technicians', methods=['POST'])
+@validate(body=TECHNICIAN_SCHEMA)
 def create_technician():
     """Create new technician"""
     try:
-        data = request.get_json()
+        data = g.body
         
         technician = Technician(
             name=data.get('name'),
@@ -457,6 +530,7 @@ def create_technician():
 
 
 @admin_bp.route('/api/technicians/<int:technician_id>', methods=['PUT'])
+@validate(body=TECHNICIAN_UPDATE_SCHEMA)
 def update_technician(technician_id):
     """Update technician"""
     try:
@@ -464,7 +538,7 @@ def update_technician(technician_id):
         if not technician:
             return jsonify({'success': False, 'error': 'Technician not found'}), 404
         
-        data = request.get_json()
+        data = g.body
         
         if 'status' in data:
             technician.status = data['status']
@@ -484,3 +558,168 @@ def update_technician(technician_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ============================================================================
+# PRICING RULES ROUTES
+# ============================================================================
+
+@admin_bp.route('/api/pricing-rules')
+@require_admin
+def get_pricing_rules():
+    """Get the pricing rules currently in effect"""
+    try:
+        catalog = get_catalog()
+        return jsonify({
+            'success': True,
+            'version': catalog.rules_version,
+            'catalog_version': catalog.version,
+            'rules': catalog.pricing_plan.rules
+        }), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@admin_bp.route('/api/pricing-rules', methods=['PUT'])
+@require_admin
+@validate(body=PRICING_RULES_SCHEMA)
+def publish_pricing_rules():
+    """Publish a new pricing rules version
+    
+    Expected JSON body:
+    {
+        "rules": {"labor_rate": 250, "volume_tiers": [{"min_cameras": 10, "discount": 0.05}]},
+        "notes": "Spring volume discount"
+    }
+    """
+    try:
+        data = g.body
+        definition = data.get('rules') or {}
+        
+        try:
+            normalize_rules(definition)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': 'Invalid pricing rules', 'details': str(e)}), 400
+        
+        PricingRuleSet.query.filter_by(is_active=True).update({'is_active': False})
+        rule_set = PricingRuleSet(
+            definition=json.dumps(definition),
+            is_active=True,
+            notes=data.get('notes')
+        )
+        db.session.add(rule_set)
+        db.session.commit()
+        
+        return jsonify({
+            'success': True,
+            'message': f'Pricing rules v{rule_set.id} published',
+            'rule_set': rule_set.to_dict()
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@admin_bp.route('/api/pricing/simulate', methods=['POST'])
+@require_admin
+@validate(body=SIMULATION_SCHEMA)
+def simulate_pricing():
+    """Reprice historical quotes under a proposed catalog
+    
+    Expected JSON body (every key optional):
+    {
+        "locations": {"1": {"difficulty_multiplier": 1.1, "travel_fee": 250}},
+        "resolutions": {"4mp": {"base_price": 2700}},
+        "difficulties": {"Medium": {"cost_multiplier": 1.4}},
+        "rules": {"labor_rate": 275},
+        "start": "2026-01-01",
+        "end": "2026-07-01",
+        "statuses": ["converted"]
+    }
+    """
+    try:
+        data = g.body
+        proposal = {k: data[k] for k in ('locations', 'resolutions', 'difficulties', 'rules') if k in data}
+        
+        try:
+            start = data.get('start')
+            end = data.get('end')
+            if 'rules' in proposal:
+                normalize_rules(proposal['rules'])
+            history = simulator.load_history(start, end, data.get('statuses'))
+            result = simulator.simulate(get_catalog(), proposal, history)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': 'Invalid proposal', 'details': str(e)}), 400
+        
+        return jsonify({'success': True, 'currency': 'MAD', **result}), 200
+    except Exception as e:
+        current_app.logger.error(f"Pricing simulation error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ============================================================================
+# SEARCH ROUTES
+# ============================================================================
+
+@admin_bp.route('/api/search')
+@require_admin
+@validate(query=SEARCH_QUERY)
+@cached('quotes', 'invoices', 'payments')
+def search_records():
+    """Quotes, invoices and payments matching a name, phone, email or number, best first"""
+    try:
+        args = g.args
+        try:
+            results = search.search(db.session, args['q'], args.get('type'), args['limit'])
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({'success': True, 'query': args['q'], 'data': results}), 200
+    except Exception as e:
+        current_app.logger.error(f"Search error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ============================================================================
+# ANALYTICS ROUTES
+# ============================================================================
+
+@admin_bp.route('/api/analytics/timeseries')
+@require_admin
+@validate(query=TIMESERIES_QUERY)
+@cached('quotes', 'invoices')
+def analytics_timeseries():
+    """Quotes, conversions and revenue per day, week or month (last year by default)"""
+    try:
+        args = g.args
+        end = args['end'].date() if args.get('end') else datetime.utcnow().date() + timedelta(days=1)
+        start = args['start'].date() if args.get('start') else end - timedelta(days=365)
+        filters = {
+            group: args[field] for group, field in
+            (('location', 'location_id'), ('resolution', 'resolution'), ('service', 'service'))
+            if args.get(field) is not None
+        }
+        
+        try:
+            result = analytics.timeseries(db.session, start, end, args['bucket'], args.get('group_by'), filters)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        return jsonify({'success': True, **result}), 200
+    except Exception as e:
+        current_app.logger.error(f"Analytics error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# ============================================================================
+# RATE LIMITING
+# ============================================================================
+
+@admin_bp.route('/api/rate-limits')
+@require_admin
+def rate_limit_stats():
+    """Configured rate limits with allowed/limited counters for this node"""
+    try:
+        return jsonify({'success': True, **get_limiter().stats()}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -1,10 +1,38 @@
-from flask import request, jsonify, current_app, g
+from flask import request, jsonify, current_app, g, redirect
 from app.routes import api_bp
-from app.models import Location, CameraSpecification, InstallationDifficulty
-from app import db
+from app.catalog import get_catalog, LANGUAGES
+from app.pricing import MAX_CAMERAS
+from app.price_matrix import get_price_matrix
+from app import price_tokens
+from app.validation import Field, Schema, validate
+from urllib.parse import urlencode
+import hashlib
+
+PRICE_SCHEMA = Schema(
+    max_bytes=4 * 1024,
+    camera_count=Field('integer', required=True, min=1, max=MAX_CAMERAS),
+    resolution=Field('string', required=True, max_length=50),
+    location_id=Field('integer', required=True, min=1),
+    difficulty_level=Field('string', required=True, max_length=50),
+)
+
+PRICE_QUERY_SCHEMA = Schema(
+    resolution=Field('string', required=True, lower=True, max_length=50),
+    location=Field('integer', required=True, min=1),
+    difficulty=Field('string', required=True, lower=True, max_length=50),
+    cameras=Field('integer', required=True, min=1, max=MAX_CAMERAS),
+    lang=Field('string', lower=True, choices=LANGUAGES, default='ar'),
+)
+
+# Items are checked one by one so a bad item fails alone (see _parse_batch_item)
+PRICE_BATCH_SCHEMA = Schema(
+    max_bytes=512 * 1024,
+    items=Field('list', required=True, min_items=1),
+)
 
 
 @api_bp.route('/calculate-price', methods=['POST', 'OPTIONS'])
+@validate(body=PRICE_SCHEMA)
 def calculate_price():
     """Calculate price based on specifications
     
@@ -20,111 +48,237 @@ def calculate_price():
         return '', 204
     
     try:
-        data = request.get_json()
+        data = g.body
         lang = g.get('current_lang', 'ar')
         
-        # Validate input
-        camera_count = data.get('camera_count')
-        resolution = data.get('resolution')
-        location_id = data.get('location_id')
-        difficulty_level = data.get('difficulty_level')
-        
-        if not all([camera_count, resolution, location_id, difficulty_level]):
-            return jsonify({
-                'success': False,
-                'error': 'Missing required fields',
-                'required': ['camera_count', 'resolution', 'location_id', 'difficulty_level']
-            }), 400
+        camera_count = data['camera_count']
+        resolution = data['resolution']
+        location_id = data['location_id']
+        difficulty_level = data['difficulty_level']
         
-        try:
-            camera_count = int(camera_count)
-            location_id = int(location_id)
-        except (ValueError, TypeError):
-            return jsonify({
-                'success': False,
-                'error': 'Invalid data types',
-                'details': 'camera_count and location_id must be integers'
-            }), 400
-        
-        if camera_count <= 0 or camera_count > 100:
-            return jsonify({
-                'success': False,
-                'error': 'Invalid camera count',
-                'details': 'camera_count must be between 1 and 100'
-            }), 400
-        
-        # Get database records
-        camera_spec = CameraSpecification.query.filter_by(resolution=resolution).first()
-        location = Location.query.get(location_id)
-        difficulty = InstallationDifficulty.query.filter_by(level=difficulty_level).first()
+        # Look up the cached catalog entries
+        catalog = get_catalog()
+        camera_spec = catalog.resolution_by_name.get(resolution)
+        location = catalog.location_by_id.get(location_id)
+        difficulty = catalog.difficulty_by_level.get(difficulty_level)
         
         if not camera_spec:
             return jsonify({
                 'success': False,
                 'error': 'Invalid camera resolution',
-                'available': [c.resolution for c in CameraSpecification.query.all()]
+                'available': [c.resolution for c in catalog.resolutions]
             }), 400
         
         if not location:
             return jsonify({
                 'success': False,
                 'error': 'Invalid location',
-                'available_locations': [l.to_dict(lang) for l in Location.query.all()]
+                'available_locations': catalog.as_dicts('locations', lang)
             }), 400
         
         if not difficulty:
             return jsonify({
                 'success': False,
                 'error': 'Invalid difficulty level',
-                'available': [d.to_dict(lang) for d in InstallationDifficulty.query.all()]
+                'available': catalog.as_dicts('difficulties', lang)
             }), 400
         
-        # Calculate price
-        # Step 1: Base camera cost
-        base_cost = camera_spec.base_price * camera_count
+        return jsonify(_pricing_response(catalog, camera_count, camera_spec, location, difficulty, lang)), 200
+    
+    except Exception as e:
+        current_app.logger.error(f"Price calculation error: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Calculation error',
+            'message': str(e)
+        }), 500
+
+
+def _pricing_response(catalog, camera_count, camera_spec, location, difficulty, lang: str) -> dict:
+    """Build the calculate-price response body for validated catalog entries"""
+    # Precomputed matrix, or the formula if it is unavailable
+    matrix = get_price_matrix(catalog)
+    if matrix is not None:
+        price = matrix.lookup(camera_count, camera_spec, location, difficulty)
+    else:
+        price = catalog.pricing_plan.price(camera_count, camera_spec, location, difficulty)
+    
+    return {
+        'success': True,
+        'language': lang,
+        'currency': 'MAD',
+        'pricing': {
+            'camera_model': camera_spec.get_description(lang),
+            'camera_count': camera_count,
+            'base_cost': round(price['base_cost'], 2),
+            'location': location.get_name(lang),
+            'location_multiplier': location.difficulty_multiplier,
+            'difficulty': difficulty.get_level(lang),
+            'difficulty_multiplier': difficulty.cost_multiplier,
+            'hours_required': difficulty.hours_required,
+            'labor_rate': catalog.pricing_plan.labor_rate,
+            'labor_cost': round(price['labor_cost'], 2),
+            'travel_fee': price['travel_fee'],
+            'subtotal': round(price['subtotal'], 2),
+            'travel_cost': price['travel_fee'],
+            'total_price': round(price['total_price'], 2)
+        },
+        'breakdown': {
+            'equipment': round(price['equipment'], 2),
+            'labor': round(price['labor_cost'], 2),
+            'travel': price['travel_fee'],
+            'total': round(price['total_price'], 2)
+        },
+        'price_token': price_tokens.issue(
+            catalog.version, camera_count, camera_spec.resolution,
+            location.id, difficulty.level, round(price['total_price'], 2)
+        )
+    }
+
+
+@api_bp.route('/price', methods=['GET'])
+@validate(query=PRICE_QUERY_SCHEMA)
+def get_price():
+    """Cacheable GET form of the price calculator
+    
+    /api/price?resolution=4mp&location=1&difficulty=Medium&cameras=8&lang=fr
+    
+    Non-canonical URLs (other parameter order, different casing, extra
+    parameters) are redirected to the canonical one so the CDN and browsers
+    keep a single cache entry per configuration.
+    """
+    catalog = get_catalog()
+    canonical = _canonical_price_query(g.args, catalog)
+    
+    if isinstance(canonical, str):
+        response = jsonify({'success': False, 'error': canonical})
+        response.status_code = 400
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+    
+    query, (camera_count, camera_spec, location, difficulty, lang) = canonical
+    
+    if request.query_string.decode('utf-8', 'replace') != query:
+        response = redirect(f"{request.path}?{query}", code=301)
+        response.headers['Cache-Control'] = f"public, max-age={current_app.config['PRICE_CACHE_MAX_AGE']}"
+        return response
+    
+    etag = hashlib.sha1(f'{catalog.version}:{query}'.encode()).hexdigest()
+    response = jsonify(_pricing_response(catalog, camera_count, camera_spec, location, difficulty, lang))
+    response.set_etag(f'v{catalog.version}-{etag[:16]}')
+    response.headers['Cache-Control'] = f"public, max-age={current_app.config['PRICE_CACHE_MAX_AGE']}"
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+
+def _canonical_price_query(args, catalog):
+    """Resolve validated /api/price arguments against the catalog.
+    
+    Returns (canonical query string, parsed values) or an error string.
+    """
+    resolution = args['resolution']
+    difficulty_level = args['difficulty']
+    lang = args['lang']
+    location_id = args['location']
+    camera_count = args['cameras']
+    
+    camera_spec = next((c for c in catalog.resolutions if c.resolution.lower() == resolution), None)
+    if not camera_spec:
+        return 'Invalid camera resolution'
+    
+    location = catalog.location_by_id.get(location_id)
+    if not location:
+        return 'Invalid location'
+    
+    difficulty = next((d for d in catalog.difficulties if d.level.lower() == difficulty_level), None)
+    if not difficulty:
+        return 'Invalid difficulty level'
+    
+    query = urlencode([
+        ('resolution', camera_spec.resolution),
+        ('location', location.id),
+        ('difficulty', difficulty.level),
+        ('cameras', camera_count),
+        ('lang', lang),
+    ])
+    return query, (camera_count, camera_spec, location, difficulty, lang)
+
+
+@api_bp.route('/calculate-price/batch', methods=['POST', 'OPTIONS'])
+@validate(body=PRICE_BATCH_SCHEMA)
+def calculate_price_batch():
+    """Calculate prices for many configurations in one request
+    
+    Expected JSON body (items may also be
+    [camera_count, resolution, location_id, difficulty_level] arrays):
+    {
+        "items": [
+            {"camera_count": 8, "resolution": "4mp", "location_id": 1, "difficulty_level": "Medium"},
+            ...
+        ]
+    }
+    """
+    if request.method == 'OPTIONS':
+        return '', 204
+    
+    try:
+        lang = g.get('current_lang', 'ar')
+        items = g.body['items']
+        max_items = current_app.config['PRICE_BATCH_MAX_ITEMS']
+        
+        if len(items) > max_items:
+            return jsonify({
+                'success': False,
+                'error': 'Too many items',
+                'details': f'at most {max_items} items per batch'
+            }), 400
         
-        # Step 2: Apply difficulty multiplier
-        difficulty_adjusted = base_cost * difficulty.cost_multiplier
+        catalog = get_catalog()
+        results = [None] * len(items)
+        positions, counts, specs, locations, difficulties = [], [], [], [], []
         
-        # Step 3: Apply location multiplier
-        location_adjusted = difficulty_adjusted * location.difficulty_multiplier
+        for index, item in enumerate(items):
+            parsed = _parse_batch_item(item, catalog)
+            if isinstance(parsed, str):
+                results[index] = {'index': index, 'success': False, 'error': parsed}
+                continue
+            camera_count, camera_spec, location, difficulty = parsed
+            positions.append(index)
+            counts.append(camera_count)
+            specs.append(camera_spec)
+            locations.append(location)
+            difficulties.append(difficulty)
         
-        # Step 4: Labor cost (250 MAD per hour)
-        labor_cost = difficulty.hours_required * 250
+        columns = catalog.pricing_plan.batch_price(counts, specs, locations, difficulties)
         
-        # Step 5: Total
-        total_price = location_adjusted + labor_cost + location.travel_fee
+        for row, index in enumerate(positions):
+            results[index] = {
+                'index': index,
+                'success': True,
+                'camera_count': counts[row],
+                'resolution': specs[row].resolution,
+                'location_id': locations[row].id,
+                'difficulty_level': difficulties[row].level,
+                'breakdown': {
+                    'equipment': round(columns['equipment'][row], 2),
+                    'labor': round(columns['labor_cost'][row], 2),
+                    'travel': columns['travel_fee'][row],
+                    'total': round(columns['total_price'][row], 2)
+                },
+                'total_price': round(columns['total_price'][row], 2)
+            }
         
         return jsonify({
             'success': True,
             'language': lang,
             'currency': 'MAD',
-            'pricing': {
-                'camera_model': camera_spec.get_description(lang),
-                'camera_count': camera_count,
-                'base_cost': round(base_cost, 2),
-                'location': location.get_name(lang),
-                'location_multiplier': location.difficulty_multiplier,
-                'difficulty': difficulty.get_level(lang),
-                'difficulty_multiplier': difficulty.cost_multiplier,
-                'hours_required': difficulty.hours_required,
-                'labor_rate': 250,
-                'labor_cost': round(labor_cost, 2),
-                'travel_fee': location.travel_fee,
-                'subtotal': round(location_adjusted + labor_cost, 2),
-                'travel_cost': location.travel_fee,
-                'total_price': round(total_price, 2)
-            },
-            'breakdown': {
-                'equipment': round(location_adjusted, 2),
-                'labor': round(labor_cost, 2),
-                'travel': location.travel_fee,
-                'total': round(total_price, 2)
-            }
+            'count': len(items),
+            'priced': len(positions),
+            'results': results
         }), 200
     
     except Exception as e:
-        current_app.logger.error(f"Price calculation error: {e}")
+        current_app.logger.error(f"Batch price calculation error: {e}")
         return jsonify({
             'success': False,
             'error': 'Calculation error',
@@ -132,16 +286,57 @@ def calculate_price():
         }), 500
 
 
+def _parse_batch_item(item, catalog):
+    """Validate one batch item with the same rules as ``calculate_price``.
+    
+    Returns (camera_count, camera_spec, location, difficulty) or an error string.
+    """
+    if isinstance(item, (list, tuple)) and len(item) == 4:
+        camera_count, resolution, location_id, difficulty_level = item
+    elif isinstance(item, dict):
+        camera_count = item.get('camera_count')
+        resolution = item.get('resolution')
+        location_id = item.get('location_id')
+        difficulty_level = item.get('difficulty_level')
+    else:
+        return 'Invalid item format'
+    
+    if not all([camera_count, resolution, location_id, difficulty_level]):
+        return 'Missing required fields'
+    
+    try:
+        camera_count = int(camera_count)
+        location_id = int(location_id)
+    except (ValueError, TypeError):
+        return 'Invalid data types'
+    
+    if camera_count <= 0 or camera_count > MAX_CAMERAS:
+        return 'Invalid camera count'
+    
+    camera_spec = catalog.resolution_by_name.get(resolution)
+    if not camera_spec:
+        return 'Invalid camera resolution'
+    
+    location = catalog.location_by_id.get(location_id)
+    if not location:
+        return 'Invalid location'
+    
+    difficulty = catalog.difficulty_by_level.get(difficulty_level)
+    if not difficulty:
+        return 'Invalid difficulty level'
+    
+    return camera_count, camera_spec, location, difficulty
+
+
 @api_bp.route('/locations', methods=['GET'])
 def get_locations():
     """Get all locations"""
     try:
         lang = g.get('current_lang', 'ar')
-        locations = Location.query.all()
         return jsonify({
             'success': True,
             'language': lang,
-            'data': [l.to_dict(lang) for l in locations]
+            'data': get_catalog().as_dicts('locations', lang)
         }), 200
     except Exception as e:
         return jsonify({
@@ -155,12 +350,11 @@ def get_resolutions():
     """Get all camera resolutions"""
     try:
         lang = g.get('current_lang', 'ar')
-        resolutions = CameraSpecification.query.all()
         return jsonify({
             'success': True,
             'language': lang,
             'currency': 'MAD',
-            'data': [r.to_dict(lang) for r in resolutions]
+            'data': get_catalog().as_dicts('resolutions', lang)
         }), 200
     except Exception as e:
         return jsonify({
@@ -174,11 +368,10 @@ def get_difficulties():
     """Get all difficulty levels"""
     try:
         lang = g.get('current_lang', 'ar')
-        difficulties = InstallationDifficulty.query.all()
         return jsonify({
             'success': True,
             'language': lang,
-            'data': [d.to_dict(lang) for d in difficulties]
+            'data': get_catalog().as_dicts('difficulties', lang)
         }), 200
     except Exception as e:
         return jsonify({
@@ -1,150 +1,103 @@
-from flask import request, jsonify, current_app, g
+from flask import request, jsonify, current_app, g, Response, stream_with_context
+from werkzeug.wsgi import get_input_stream
 from app.routes import contact_bp
 from app.models import QuoteRequest
-from app import db, mail
-from flask_mail import Message
-import re
+from app import db, emails, export, group_commit, leads, outbox, partner_ingest
+from app.catalog import get_catalog, LANGUAGES
+from app.pricing import MAX_CAMERAS
+from app import price_tokens
+from app.i18n import get_translation
+from app.idempotency import idempotent
+from app.validation import Field, Schema, error_messages, validate
 from datetime import datetime
 
-# Translation strings
-TRANSLATIONS = {
-    'ar': {
-        'thank_you': 'شكراً لطلبك',
-        'received': 'تم استقبال طلبك بنجاح',
-        'error': 'حدث خطأ في المعالجة',
-        'invalid_email': 'البريد الإلكتروني غير صحيح',
-        'invalid_phone': 'رقم الهاتف غير صحيح',
-        'invalid_name': 'الاسم غير صحيح',
-        'invalid_message': 'الرسالة يجب أن تكون 10 أحرف على الأقل',
-        'quote_id': 'رقم الطلب',
-    },
-    'fr': {
-        'thank_you': 'Merci pour votre demande',
-        'received': 'Votre demande a été reçue avec succès',
-        'error': 'Une erreur s\'est produite lors du traitement',
-        'invalid_email': 'E-mail invalide',
-        'invalid_phone': 'Numéro de téléphone invalide',
-        'invalid_name': 'Nom invalide',
-        'invalid_message': 'Le message doit contenir au moins 10 caractères',
-        'quote_id': 'ID de devis',
-    },
-    'en': {
-        'thank_you': 'Thank you for your request',
-        'received': 'Your request has been received successfully',
-        'error': 'An error occurred during processing',
-        'invalid_email': 'Invalid email address',
-        'invalid_phone': 'Invalid phone number',
-        'invalid_name': 'Invalid name',
-        'invalid_message': 'Message must be at least 10 characters',
-        'quote_id': 'Quote ID',
-    }
-}
-
-
-def get_translation(lang: str, key: str) -> str:
-    """Get translated string"""
-    return TRANSLATIONS.get(lang, TRANSLATIONS['ar']).get(key, key)
-
-
-def validate_email(email: str) -> bool:
-    """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
-
-
-def validate_phone(phone: str) -> bool:
-    """Validate phone format (flexible for international formats)"""
-    # Remove spaces, dashes, parentheses
-    clean = re.sub(r'[\s\-\(\)\+]', '', phone)
-    # Should be only numbers
-    return clean.isdigit() and len(clean) >= 8
+QUOTE_SCHEMA = Schema(
+    max_bytes=16 * 1024,
+    name=Field('string', required=True, min_length=2, max_length=100, error='invalid_name'),
+    email=Field('email', required=True, error='invalid_email'),
+    phone=Field('phone', required=True, max_length=20, error='invalid_phone'),
+    service=Field('string', max_length=100, default=''),
+    message=Field('string', required=True, min_length=10, max_length=5000, error='invalid_message'),
+    location_id=Field('integer', min=1),
+    camera_count=Field('integer', min=1, max=MAX_CAMERAS),
+    resolution=Field('string', max_length=50),
+    difficulty_level=Field('string', max_length=50),
+    price_token=Field('string', max_length=512),
+)
+
+# One NDJSON line of /api/partner/quotes: a /quote body plus the partner's own reference
+PARTNER_QUOTE_SCHEMA = Schema(
+    max_bytes=QUOTE_SCHEMA.max_bytes,
+    **QUOTE_SCHEMA.fields,
+    ref=Field('any'),
+    language=Field('string', lower=True, choices=LANGUAGES, default='ar'),
+)
+
+QUOTE_EXPORT_QUERY = Schema(
+    format=Field('string', lower=True, choices=['json', 'ndjson', 'csv'], default='json'),
+    status=Field('string', choices=['new', 'contacted', 'converted', 'rejected']),
+    start=Field('datetime'),
+    end=Field('datetime'),
+)
+
+# CSV columns, in QuoteRequest.to_dict() order
+QUOTE_EXPORT_COLUMNS = [
+    'id', 'name', 'email', 'phone', 'service', 'message', 'language', 'location_id', 'camera_count',
+    'resolution', 'difficulty_level', 'estimated_price', 'status', 'duplicate_of_id', 'created_at',
+    'updated_at', 'currency',
+]
+
+QUOTE_UPDATE_SCHEMA = Schema(
+    status=Field('string', choices=['new', 'contacted', 'converted', 'rejected']),
+    notes=Field('string', strip=False, max_length=5000),
+    followed_up_at=Field('any'),
+)
 
 
 @contact_bp.route('/quote', methods=['POST', 'OPTIONS'])
+@idempotent
+@validate(body=QUOTE_SCHEMA)
 def submit_quote():
     """Handle quote request submission"""
     if request.method == 'OPTIONS':
         return '', 204
     
     try:
-        data = request.get_json() or {}
+        data = g.body
         lang = g.get('current_lang', 'ar')
         
-        # Extract form data
-        name = (data.get('name') or '').strip()
-        email = (data.get('email') or '').strip().lower()
-        phone = (data.get('phone') or '').strip()
-        service = (data.get('service') or '').strip()
-        message = (data.get('message') or '').strip()
-        location_id = data.get('location_id')
-        camera_count = data.get('camera_count')
-        resolution = data.get('resolution')
-        difficulty = data.get('difficulty_level')
-        estimated_price = data.get('estimated_price')
-        
-        # Validate
-        errors = {}
-        
-        if not name or len(name) < 2 or len(name) > 100:
-            errors['name'] = get_translation(lang, 'invalid_name')
-        
-        if not email or not validate_email(email):
-            errors['email'] = get_translation(lang, 'invalid_email')
-        
-        if not phone or not validate_phone(phone):
-            errors['phone'] = get_translation(lang, 'invalid_phone')
-        
-        if not message or len(message) < 10:
-            errors['message'] = get_translation(lang, 'invalid_message')
-        
-        if errors:
+        fields = quote_fields(data, lang)
+        if fields is None:
             return jsonify({
                 'success': False,
-                'errors': errors,
+                'errors': {'price_token': get_translation(lang, 'invalid_price_token')},
                 'language': lang
             }), 400
+        fields.update(ip_address=request.remote_addr, user_agent=request.headers.get('User-Agent'))
         
-        # Create quote request
-        quote = QuoteRequest(
-            name=name,
-            email=email,
-            phone=phone,
-            service=service or 'General Inquiry',
-            message=message,
-            language=lang,
-            location_id=location_id,
-            camera_count=camera_count,
-            resolution=resolution,
-            difficulty_level=difficulty,
-            estimated_price=estimated_price,
-            ip_address=request.remote_addr,
-            user_agent=request.headers.get('User-Agent'),
-            status='new'
-        )
+        quote_data = None
+        if group_commit.enabled():
+            try:
+                quote_data = group_commit.insert(QuoteRequest, fields, after_insert=queue_quote_emails)
+            except group_commit.Unavailable as e:
+                current_app.logger.warning(f"Group commit unavailable, committing directly: {e}")
         
-        db.session.add(quote)
-        db.session.commit()
-        
-        current_app.logger.info(f"New quote request #{quote.id} from {email}")
-        
-        # Send email to customer
-        try:
-            send_confirmation_email(quote, lang)
-        except Exception as e:
-            current_app.logger.warning(f"Could not send confirmation email: {e}")
+        if quote_data is None:
+            quote = QuoteRequest(**fields)
+            db.session.add(quote)
+            db.session.flush()
+            queue_quote_emails(quote)
+            db.session.commit()
+            quote_data = quote.to_dict()
         
-        # Send notification to admin
-        try:
-            send_admin_notification(quote, lang)
-        except Exception as e:
-            current_app.logger.warning(f"Could not send admin notification: {e}")
+        current_app.logger.info(f"New quote request #{quote_data['id']} from {fields['email']}")
         
         return jsonify({
             'success': True,
             'message': get_translation(lang, 'received'),
             'language': lang,
-            'quote_id': quote.id,
-            'quote_data': quote.to_dict()
+            'quote_id': quote_data['id'],
+            'quote_data': quote_data
         }), 201
     
     except Exception as e:
@@ -159,106 +112,204 @@ def submit_quote():
         }), 500
 
 
-def send_confirmation_email(quote: QuoteRequest, lang: str):
-    """Send confirmation email to customer"""
-    subject_text = {
-        'ar': f'طلبك #{quote.id} - نظام الكاميرات الأمنية',
-        'fr': f'Votre demande #{quote.id} - Système CCTV',
-        'en': f'Your Request #{quote.id} - CCTV System'
-    }
+@contact_bp.route('/api/partner/quotes', methods=['POST'])
+def ingest_partner_quotes():
+    """Bulk quote submission for partners: NDJSON in, one NDJSON result per line out"""
+    partner = partner_ingest.authenticate(request.headers.get(partner_ingest.HEADER))
+    if partner is None:
+        return jsonify({'success': False, 'error': 'Unauthorized'}), 401
+    
+    # Read the WSGI input directly: MAX_CONTENT_LENGTH is sized for single
+    # requests, uploads here are limited by PARTNER_INGEST_MAX_BYTES instead
+    max_bytes = current_app.config['PARTNER_INGEST_MAX_BYTES']
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({
+            'success': False,
+            'error': f'Upload larger than {max_bytes} bytes, split it into several requests'
+        }), 413
+    stream = get_input_stream(request.environ, max_content_length=max_bytes)
+    remote_addr = request.remote_addr
+    user_agent = request.headers.get('User-Agent')
+    
+    def build(data):
+        cleaned, errors = PARTNER_QUOTE_SCHEMA.validate(data)
+        if errors:
+            return None, error_messages('en', errors)
+        fields = quote_fields(cleaned, cleaned['language'])
+        if fields is None:
+            return None, {'price_token': get_translation('en', 'invalid_price_token')}
+        fields.update(ip_address=remote_addr, user_agent=user_agent)
+        return fields, None
+    
+    current_app.logger.info(f"Partner {partner} started a bulk quote upload")
+    lines = partner_ingest.read_lines(stream, PARTNER_QUOTE_SCHEMA.max_bytes)
+    results = partner_ingest.ingest(lines, partner, build, current_app.config['PARTNER_INGEST_CHUNK_SIZE'])
+    return Response(stream_with_context(results), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+
+def quote_fields(data: dict, lang: str):
+    """QuoteRequest columns for validated QUOTE_SCHEMA data, or None if its
+    price_token is invalid"""
+    camera_count = data.get('camera_count')
+    resolution = data.get('resolution')
+    location_id = data.get('location_id')
+    difficulty = data.get('difficulty_level')
+    price_token = data.get('price_token')
+    
+    # The price is never taken from the client: it comes from a signed
+    # token issued by /api/calculate-price, or is computed here.
+    if price_token:
+        token = price_tokens.verify(price_token)
+        if token is None:
+            return None
+        camera_count = token.camera_count
+        resolution = token.resolution
+        location_id = token.location_id
+        difficulty = token.difficulty_level
+        estimated_price = _token_price(token)
+    else:
+        estimated_price = _estimate_price(camera_count, resolution, location_id, difficulty)
     
-    body_text = {
-        'ar': f"""مرحباً {quote.name},
+    return dict(
+        name=data['name'],
+        email=data['email'],
+        phone=data['phone'],
+        service=data['service'] or 'General Inquiry',
+        message=data['message'],
+        language=lang,
+        location_id=location_id,
+        camera_count=camera_count,
+        resolution=resolution,
+        difficulty_level=difficulty,
+        estimated_price=estimated_price,
+        status='new',
+        **leads.contact_fields(data['email'], data['phone'])
+    )
 
-شكراً لطلبك. تم استقبال طلب التثبيت الخاص بك برقم {quote.id}.
 
-سيتم التواصل معك في أقرب وقت ممكن.
+def _token_price(token) -> float:
+    """Price from a verified token, re-priced only if the catalog moved since"""
+    catalog = get_catalog()
+    if token.catalog_version == catalog.version:
+        return token.total_price
+    return _estimate_price(token.camera_count, token.resolution, token.location_id,
+                           token.difficulty_level, catalog)
 
-البريد الإلكتروني: {quote.email}
-رقم الهاتف: {quote.phone}
 
-مع تحياتنا،
-فريق CCTV Pro
-""",
-        'fr': f"""Bonjour {quote.name},
+def _estimate_price(camera_count, resolution, location_id, difficulty_level, catalog=None):
+    """Price a configuration against the catalog, or None if it is incomplete"""
+    if not all([camera_count, resolution, location_id, difficulty_level]):
+        return None
+    
+    catalog = catalog or get_catalog()
+    try:
+        camera_count = int(camera_count)
+        location_id = int(location_id)
+    except (ValueError, TypeError):
+        return None
+    
+    camera_spec = catalog.resolution_by_name.get(resolution)
+    location = catalog.location_by_id.get(location_id)
+    level = catalog.difficulty_by_level.get(difficulty_level)
+    if not (camera_spec and location and level) or not 0 < camera_count <= MAX_CAMERAS:
+        return None
+    
+    return round(catalog.pricing_plan.price(camera_count, camera_spec, location, level)['total_price'], 2)
 
-Merci pour votre demande. Votre demande d'installation n°{quote.id} a été reçue.
 
-Nous vous contacterons très bientôt.
+def queue_quote_emails(quote: QuoteRequest):
+    """Queue the emails for a new quote in its transaction; the outbox
+    worker delivers them"""
+    queue_confirmation_email(quote, quote.language)
+    # A repeat from the same customer is triaged with the quote it duplicates
+    if quote.duplicate_of_id is None:
+        queue_admin_notification(quote, quote.language)
 
-E-mail : {quote.email}
-Téléphone : {quote.phone}
 
-Cordialement,
-Équipe CCTV Pro
-""",
-        'en': f"""Hello {quote.name},
+def queue_confirmation_email(quote: QuoteRequest, lang: str):
+    """Queue confirmation email to customer"""
+    email = emails.render('confirmation', lang, quote=quote)
+    outbox.enqueue(quote.email, email.subject, email.body, kind='confirmation',
+                   quote_id=quote.id, html=email.html)
 
-Thank you for your request. Your installation request ##{quote.id} has been received.
 
-We will contact you as soon as possible.
+def queue_admin_notification(quote: QuoteRequest, lang: str):
+    """Queue notification email to admin"""
+    admin_email = current_app.config.get('COMPANY_EMAIL')
+    if not admin_email:
+        return
+    
+    email = emails.render('admin_notification', 'en', quote=quote)
+    if current_app.config['ADMIN_NOTIFICATION_MODE'] == 'digest' and not is_urgent_quote(quote):
+        # One line per quote in the digest, followed by the full details
+        summary = (f"#{quote.id} {quote.name} <{quote.email}> - {quote.camera_count or '-'} x "
+                   f"{quote.resolution or '-'}, {quote.estimated_price or '-'} MAD")
+        outbox.enqueue_digest_item(admin_email, summary, email.body, quote_id=quote.id)
+    else:
+        outbox.enqueue(admin_email, email.subject, email.body, kind='admin_notification',
+                       quote_id=quote.id, html=email.html)
+
+
+def is_urgent_quote(quote: QuoteRequest) -> bool:
+    """Whether the admins should hear about this quote without waiting for the digest"""
+    min_price = current_app.config.get('ADMIN_URGENT_MIN_PRICE')
+    min_cameras = current_app.config.get('ADMIN_URGENT_MIN_CAMERAS')
+    if min_price and quote.estimated_price and quote.estimated_price >= min_price:
+        return True
+    if min_cameras and quote.camera_count:
+        try:
+            return int(quote.camera_count) >= min_cameras
+        except (ValueError, TypeError):
+            return False
+    return False
 
-Email: {quote.email}
-Phone: {quote.phone}
 
-Best regards,
-CCTV Pro Team
-"""
-    }
+@contact_bp.route('/quotes', methods=['GET'])
+@validate(query=QUOTE_EXPORT_QUERY)
+def get_quotes():
+    """Export quote requests (admin endpoint) as JSON, NDJSON or CSV.
     
-    subject = subject_text.get(lang, subject_text['en'])
-    body = body_text.get(lang, body_text['en'])
+    The response is streamed while the quotes are read in batches, so
+    memory use does not grow with the number of quotes.
+    """
+    args = g.args
+    query = db.select(QuoteRequest)
+    if args.get('status'):
+        query = query.where(QuoteRequest.status == args['status'])
+    if args.get('start'):
+        query = query.where(QuoteRequest.created_at >= args['start'])
+    if args.get('end'):
+        query = query.where(QuoteRequest.created_at < args['end'])
     
-    msg = Message(
-        subject=subject,
-        recipients=[quote.email],
-        body=body
+    # yield_per streams from a server-side cursor on Postgres
+    query = query.order_by(QuoteRequest.created_at.desc(), QuoteRequest.id.desc()).execution_options(
+        yield_per=current_app.config['EXPORT_BATCH_SIZE']
     )
-    mail.send(msg)
-
-
-def send_admin_notification(quote: QuoteRequest, lang: str):
-    """Send notification email to admin"""
-    subject = f"New Quote Request #{quote.id} from {quote.name}"
-    body = f"""New Quote Request Details:
-
-ID: {quote.id}
-Name: {quote.name}
-Email: {quote.email}
-Phone: {quote.phone}
-Service: {quote.service}
-Language: {lang}
-Location: {quote.location_id}
-Camera Count: {quote.camera_count}
-Resolution: {quote.resolution}
-Difficulty: {quote.difficulty_level}
-Estimated Price: {quote.estimated_price} MAD
-Message: {quote.message}
-IP Address: {quote.ip_address}
-Submitted: {quote.created_at}
-"""
+    rows = _export_rows(query)
     
-    admin_email = current_app.config.get('COMPANY_EMAIL')
-    if admin_email:
-        msg = Message(subject=subject, recipients=[admin_email], body=body)
-        mail.send(msg)
-
-
-@contact_bp.route('/quotes', methods=['GET'])
-def get_quotes():
-    """Get all quote requests (admin endpoint)"""
+    fmt = args['format']
+    headers = {'Cache-Control': 'no-store'}
+    if fmt == 'csv':
+        body, mimetype = export.iter_csv(rows, QUOTE_EXPORT_COLUMNS), 'text/csv'
+        headers['Content-Disposition'] = f'attachment; filename="quotes-{datetime.utcnow():%Y%m%d}.csv"'
+    elif fmt == 'ndjson':
+        body, mimetype = export.iter_ndjson(rows), 'application/x-ndjson'
+    else:
+        body, mimetype = export.iter_json(rows), 'application/json'
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+def _export_rows(query):
+    """Serialize quotes one by one, letting go of each row once it is written"""
     try:
-        quotes = QuoteRequest.query.order_by(QuoteRequest.created_at.desc()).all()
-        return jsonify({
-            'success': True,
-            'count': len(quotes),
-            'data': [q.to_dict() for q in quotes]
-        }), 200
+        for quote in db.session.scalars(query):
+            yield quote.to_dict()
+            db.session.expunge(quote)
     except Exception as e:
-        return jsonify({
-            'success': False,
-            'error': str(e)
-        }), 500
+        # Headers are already sent: the truncated body is all the client sees
+        current_app.logger.error(f"Quote export failed: {e}", exc_info=True)
+        raise
 
 
 @contact_bp.route('/quotes/<int:quote_id>', methods=['GET'])
@@ -283,6 +334,7 @@ def get_quote(quote_id: int):
 
 
 @contact_bp.route('/quotes/<int:quote_id>', methods=['PUT'])
+@validate(body=QUOTE_UPDATE_SCHEMA)
 def update_quote(quote_id: int):
     """Update quote status or notes"""
     try:
@@ -293,9 +345,9 @@ def update_quote(quote_id: int):
                 'error': 'Quote not found'
             }), 404
         
-        data = request.get_json() or {}
+        data = g.body
         
-        if 'status' in data and data['status'] in ['new', 'contacted', 'converted', 'rejected']:
+        if data.get('status'):
             quote.status = data['status']
         
         if 'notes' in data:
@@ -1,6 +1,8 @@
-from flask import jsonify, render_template, g
+from flask import jsonify, render_template, request, current_app, g, Response
 from app.routes import main_bp
-from app.models import Location, CameraSpecification, InstallationDifficulty
+from app.catalog import get_catalog
+import gzip
+import hashlib
 
 
 @main_bp.route('/')
@@ -23,31 +25,57 @@ def health():
 
 @main_bp.route('/data')
 def get_all_data():
-    """Get all pricing data for frontend in current language"""
+    """Get all pricing data for frontend in current language
+
+    The payload only changes with the catalog version, so it is serialized
+    (and gzipped) once per language and version and served with a strong ETag.
+    """
     try:
         lang = g.get('current_lang', 'ar')
         
-        locations = Location.query.all()
-        resolutions = CameraSpecification.query.all()
-        difficulties = InstallationDifficulty.query.all()
+        catalog = get_catalog()
+        body, gzipped, etag = catalog.memoize(('data', lang), lambda: _build_data_payload(catalog, lang))
         
-        return jsonify({
-            'success': True,
-            'language': lang,
-            'currency': 'MAD',
-            'locations': [l.to_dict(lang) for l in locations],
-            'resolutions': [r.to_dict(lang) for r in resolutions],
-            'difficulties': [d.to_dict(lang) for d in difficulties],
-            'company': {
-                'name': 'CCTV Pro',
-                'phone': '+212 5XX XXX XXX',
-                'email': 'info@cctvsystem.ma',
-                'address': 'Casablanca, Morocco'
-            }
-        }), 200
+        use_gzip = request.accept_encodings['gzip'] > 0
+        if use_gzip:
+            body, etag = gzipped, etag + '-gz'
+        
+        response = Response(status=200, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = f"public, max-age={current_app.config['DATA_CACHE_MAX_AGE']}"
+        response.vary.add('Accept-Encoding')
+        
+        if request.if_none_match.contains(etag):
+            response.status_code = 304
+            return response
+        
+        response.set_data(body)
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+        return response
     except Exception as e:
         return jsonify({
             'success': False,
             'error': 'Failed to fetch data',
             'message': str(e)
         }), 500
+
+
+def _build_data_payload(catalog, lang: str):
+    """Serialize the /data response once; returns (body, gzipped body, etag)"""
+    body = current_app.json.dumps({
+        'success': True,
+        'language': lang,
+        'currency': 'MAD',
+        'locations': catalog.as_dicts('locations', lang),
+        'resolutions': catalog.as_dicts('resolutions', lang),
+        'difficulties': catalog.as_dicts('difficulties', lang),
+        'company': {
+            'name': 'CCTV Pro',
+            'phone': '+212 5XX XXX XXX',
+            'email': 'info@cctvsystem.ma',
+            'address': 'Casablanca, Morocco'
+        }
+    }).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    return body, gzip.compress(body, compresslevel=9, mtime=0), etag
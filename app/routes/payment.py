@@ -1,10 +1,27 @@
-from flask import jsonify, request, current_app
+from flask import jsonify, current_app, g
 from app.routes import payment_bp
 from app.models import QuoteRequest
 from app.models_extended import Payment, Invoice
 from app import db
+from app.catalog import get_catalog
+from app.idempotency import idempotent
+from app.validation import Field, Schema, validate
 from datetime import datetime, timedelta
 
+CREATE_PAYMENT_SCHEMA = Schema(
+    quote_id=Field('integer', required=True, min=1),
+    payment_method=Field('string', choices=['stripe', 'paypal', 'maroc_telecom', 'cash', 'bank'],
+                         default='stripe'),
+    amount=Field('number', min=0, default=0),
+)
+
+VERIFY_PAYMENT_SCHEMA = Schema(
+    payment_id=Field('integer', required=True, min=1),
+    session_id=Field('string', required=True, max_length=255),
+)
+
+INVOICE_SCHEMA = Schema(subtotal=Field('number', min=0, default=0))
+
 
 # ============================================================================
 # PAYMENT GATEWAY INTEGRATIONS
@@ -103,12 +120,14 @@ class MarocTelecomGateway(PaymentGateway):
 # ============================================================================
 
 @payment_bp.route('/create-payment', methods=['POST'])
+@idempotent
+@validate(body=CREATE_PAYMENT_SCHEMA)
 def create_payment():
     """Initiate payment for a quote"""
     try:
-        data = request.get_json()
-        quote_id = data.get('quote_id')
-        payment_method = data.get('payment_method', 'stripe')  # stripe, paypal, cash, bank
+        data = g.body
+        quote_id = data['quote_id']
+        payment_method = data['payment_method']  # stripe, paypal, maroc_telecom, cash, bank
         
         quote = QuoteRequest.query.get(quote_id)
         if not quote:
@@ -126,7 +145,7 @@ def create_payment():
         # Create payment record
         payment = Payment(
             quote_id=quote_id,
-            amount=data.get('amount', 0),
+            amount=data['amount'],
             currency='MAD',
             payment_method=payment_method,
             due_date=datetime.utcnow() + timedelta(days=30)
@@ -192,12 +211,13 @@ def create_payment():
 
 
 @payment_bp.route('/verify-payment', methods=['POST'])
+@validate(body=VERIFY_PAYMENT_SCHEMA)
 def verify_payment():
     """Verify payment completion"""
     try:
-        data = request.get_json()
-        payment_id = data.get('payment_id')
-        session_id = data.get('session_id')
+        data = g.body
+        payment_id = data['payment_id']
+        session_id = data['session_id']
         
         payment = Payment.query.get(payment_id)
         if not payment:
@@ -291,6 +311,7 @@ def get_payment_status(payment_id):
 # ============================================================================
 
 @payment_bp.route('/invoice/<int:quote_id>/generate', methods=['POST'])
+@validate(body=INVOICE_SCHEMA)
 def generate_invoice(quote_id):
     """Generate PDF invoice"""
     try:
@@ -306,13 +327,12 @@ def generate_invoice(quote_id):
                 'invoice': existing_invoice.to_dict()
             }), 200
         
-        data = request.get_json()
+        data = g.body
         
-        # Calculate totals
-        subtotal = data.get('subtotal', 0)
-        tax_rate = 0.2  # 20% TVA in Morocco
-        tax_amount = subtotal * tax_rate
-        total_amount = subtotal + tax_amount
+        # Calculate totals (TVA rate comes from the pricing rules)
+        subtotal, tax_amount, total_amount = get_catalog().pricing_plan.invoice_totals(
+            data['subtotal']
+        )
         
         invoice = Invoice(
             quote_id=quote_id,
@@ -2,9 +2,33 @@ from flask import jsonify, render_template, request, current_app, g
 from app.routes import technician_bp
 from app.models_extended import Technician, Installation
 from app import db
+from app.validation import Field, Schema, validate
 from datetime import datetime
 from functools import wraps
 
+JOB_LIST_QUERY = Schema(
+    technician_id=Field('integer', required=True, min=1),
+    status=Field('string', max_length=20, default='pending'),
+)
+
+COMPLETE_JOB_SCHEMA = Schema(
+    labor_hours=Field('number', min=0, default=0),
+    issues=Field('string', max_length=5000, default=''),
+    notes=Field('string', max_length=5000, default=''),
+)
+
+ISSUE_SCHEMA = Schema(
+    issue_description=Field('string', max_length=5000, default=''),
+    admin_notes=Field('string', max_length=5000, default=''),
+)
+
+FEEDBACK_SCHEMA = Schema(satisfaction=Field('integer', min=1, max=5, default=5))
+
+PROFILE_UPDATE_SCHEMA = Schema(
+    phone=Field('phone', max_length=20),
+    specialization=Field('string', max_length=100),
+)
+
 # Technician authentication
 def require_technician(f):
     """Decorator to verify technician credentials"""
@@ -30,15 +54,13 @@ def technician_dashboard():
 
 @technician_bp.route('/api/jobs')
 @require_technician
+@validate(query=JOB_LIST_QUERY)
 def list_jobs():
     """Get technician's active jobs"""
     try:
         # TODO: Get technician_id from JWT token
-        technician_id = request.args.get('technician_id', type=int)
-        status = request.args.get('status', 'pending')  # pending, in-progress, completed
-        
-        if not technician_id:
-            return jsonify({'success': False, 'error': 'Technician ID required'}), 400
+        technician_id = g.args['technician_id']
+        status = g.args['status']  # pending, in-progress, completed
         
         technician = Technician.query.get(technician_id)
         if not technician:
@@ -151,10 +173,11 @@ def start_job(installation_id):
 
 @technician_bp.route('/api/jobs/<int:installation_id>/complete', methods=['POST'])
 @require_technician
+@validate(body=COMPLETE_JOB_SCHEMA)
 def complete_job(installation_id):
     """Mark job as complete with details"""
     try:
-        data = request.get_json()
+        data = g.body
         installation = Installation.query.get(installation_id)
         if not installation:
             return jsonify({'success': False, 'error': 'Job not found'}), 404
@@ -193,10 +216,11 @@ def complete_job(installation_id):
 
 @technician_bp.route('/api/jobs/<int:installation_id>/issue', methods=['POST'])
 @require_technician
+@validate(body=ISSUE_SCHEMA)
 def report_issue(installation_id):
     """Report issue with a job"""
     try:
-        data = request.get_json()
+        data = g.body
         installation = Installation.query.get(installation_id)
         if not installation:
             return jsonify({'success': False, 'error': 'Job not found'}), 404
@@ -282,10 +306,11 @@ def allowed_file(filename):
 
 @technician_bp.route('/api/jobs/<int:installation_id>/feedback', methods=['POST'])
 @require_technician
+@validate(body=FEEDBACK_SCHEMA)
 def submit_feedback(installation_id):
     """Submit customer feedback after installation"""
     try:
-        data = request.get_json()
+        data = g.body
         installation = Installation.query.get(installation_id)
         if not installation:
             return jsonify({'success': False, 'error': 'Job not found'}), 404
@@ -360,6 +385,7 @@ def get_profile(technician_id):
 
 @technician_bp.route('/api/technician/profile/<int:technician_id>', methods=['PUT'])
 @require_technician
+@validate(body=PROFILE_UPDATE_SCHEMA)
 def update_profile(technician_id):
     """Update technician profile"""
     try:
@@ -367,7 +393,7 @@ def update_profile(technician_id):
         if not technician:
             return jsonify({'success': False, 'error': 'Technician not found'}), 404
         
-        data = request.get_json()
+        data = g.body
         
         if 'phone' in data:
             technician.phone = data['phone']
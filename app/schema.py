@@ -0,0 +1,188 @@
+"""In-place schema upgrades for existing databases.
+
+``db.create_all()`` creates missing tables but never touches existing ones,
+so ``flask upgrade-db`` adds the columns and indexes the models gained since
+a database was created. New columns are always nullable, so adding them is
+a metadata-only change on SQLite and Postgres; foreign keys on added
+columns are not created. Nothing is dropped or altered.
+
+Indexes are built one at a time after the table changes are committed. On
+Postgres they use ``CREATE INDEX CONCURRENTLY`` so writes to the table go
+on while an index is built; an index left invalid by an interrupted build
+is dropped and rebuilt on the next run.
+
+``flask check-indexes`` runs the planner over the query shapes of the
+admin, technician and payment routes, and reports any that
+would scan a whole table or sort rows the index should already return in
+order.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, inspect, select, text, tuple_
+from sqlalchemy.schema import CreateIndex
+
+from app import db
+
+
+def upgrade() -> list:
+    """Create missing tables, columns and indexes; returns what was done"""
+    # Make sure every model is registered on the metadata
+    from app import models, models_extended  # noqa: F401
+
+    engine = db.engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    changes = []
+
+    with engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                # A new table is empty, so its indexes are built with it
+                table.create(connection)
+                changes.append(f'created table {table.name}')
+                continue
+
+            columns = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                ))
+                changes.append(f'added column {table.name}.{column.name}')
+
+    changes.extend(create_indexes())
+    return changes
+
+
+def create_indexes() -> list:
+    """Build the model indexes missing from the database, online where possible"""
+    engine = db.engine
+    postgres = engine.dialect.name == 'postgresql'
+    inspector = inspect(engine)
+    changes = []
+
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        invalid = set()
+        if postgres:
+            invalid = set(connection.execute(text(
+                'SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+                'WHERE NOT i.indisvalid'
+            )).scalars())
+
+        for table in db.metadata.sorted_tables:
+            existing = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in invalid:
+                    connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {index.name}'))
+                    existing.discard(index.name)
+                    changes.append(f'dropped invalid index {index.name}')
+                if index.name in existing:
+                    continue
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                if postgres:
+                    ddl = ddl.replace('INDEX', 'INDEX CONCURRENTLY', 1)
+                connection.execute(text(ddl))
+                changes.append(f'created index {index.name}')
+    return changes
+
+
+def _hot_queries() -> dict:
+    """Representative statements for the routes' filters and sort orders"""
+    from app.models import QuoteRequest
+    from app.models_extended import Installation, Invoice, Payment, Technician
+
+    now = datetime.utcnow()
+
+    def after(*keys):
+        # Keyset condition of a newest-first page (see app/pagination.py)
+        return tuple_(*keys) < tuple_(now, 1)
+
+    return {
+        # admin.py
+        'quotes by status': (select(QuoteRequest).where(
+            QuoteRequest.status == 'new', after(QuoteRequest.created_at, QuoteRequest.id)
+        ).order_by(QuoteRequest.created_at.desc(), QuoteRequest.id.desc()).limit(21), True),
+        'quotes': (select(QuoteRequest).where(after(QuoteRequest.created_at, QuoteRequest.id)).order_by(
+            QuoteRequest.created_at.desc(), QuoteRequest.id.desc()
+        ).limit(21), True),
+        'new quotes this week': (select(func.count()).select_from(QuoteRequest).where(
+            QuoteRequest.created_at >= now - timedelta(days=7), QuoteRequest.status == 'new'
+        ), False),
+        'quote detail installation': (select(Installation).where(Installation.quote_id == 1), False),
+        'quote detail invoice': (select(Invoice).where(Invoice.quote_id == 1), False),
+        'quote detail payment': (select(Payment).where(Payment.quote_id == 1), False),
+        'quote duplicates': (select(QuoteRequest).where(QuoteRequest.duplicate_of_id == 1), False),
+        'installations by status': (select(Installation).where(
+            Installation.status == 'pending', tuple_(Installation.scheduled_date, Installation.id) > tuple_(now, 1)
+        ).order_by(Installation.scheduled_date, Installation.id).limit(21), True),
+        'installations': (select(Installation).order_by(
+            Installation.scheduled_date, Installation.id
+        ).limit(21), True),
+        'unscheduled installations': (select(Installation).where(
+            Installation.scheduled_date.is_(None), Installation.id > 1
+        ).order_by(Installation.id).limit(21), True),
+        'payments by status': (select(Payment).where(
+            Payment.status == 'pending', after(Payment.created_at, Payment.id)
+        ).order_by(Payment.created_at.desc(), Payment.id.desc()).limit(21), True),
+        'payments': (select(Payment).order_by(Payment.created_at.desc(), Payment.id.desc()).limit(21), True),
+        'invoices by status': (select(Invoice).where(
+            Invoice.status == 'paid', after(Invoice.issued_date, Invoice.id)
+        ).order_by(Invoice.issued_date.desc(), Invoice.id.desc()).limit(21), True),
+        'invoices': (select(Invoice).order_by(Invoice.issued_date.desc(), Invoice.id.desc()).limit(21), True),
+        'revenue this month': (select(func.sum(Invoice.total_amount)).where(
+            Invoice.issued_date >= now.replace(day=1), Invoice.status.in_(['paid', 'issued'])
+        ), False),
+        'technicians by status': (select(Technician).where(Technician.status == 'available').order_by(
+            Technician.name, Technician.id
+        ).limit(21), True),
+        'installation counts by status': (select(func.count()).select_from(Installation).where(
+            Installation.status == 'completed'
+        ), False),
+        # technician.py
+        'technician jobs': (select(Installation).where(
+            Installation.technician_id == 1, Installation.status == 'pending'
+        ).order_by(Installation.scheduled_date.asc()), True),
+        'technician job counts': (select(func.count()).select_from(Installation).where(
+            Installation.technician_id == 1, Installation.status == 'completed'
+        ), False),
+        'technician satisfaction': (select(func.avg(Installation.customer_satisfaction)).where(
+            Installation.technician_id == 1
+        ), False),
+    }
+
+
+def _plan(connection, statement) -> list:
+    compiled = statement.compile(dialect=connection.dialect, compile_kwargs={'render_postcompile': True})
+    params = compiled.params
+    if connection.dialect.name == 'sqlite':
+        params = tuple(
+            value.isoformat(' ') if isinstance(value, datetime) else value
+            for value in (params[name] for name in compiled.positiontup)
+        )
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+        return [row[-1] for row in rows]
+    connection.execute(text('SET LOCAL enable_seqscan = off'))
+    return [row[0] for row in connection.exec_driver_sql(f'EXPLAIN {compiled}', params)]
+
+
+def _problems(plan: list, ordered: bool) -> list:
+    problems = []
+    for line in plan:
+        if ((line.startswith('SCAN ') and 'INDEX' not in line)
+                or 'Seq Scan' in line):
+            problems.append(f'full table scan: {line.strip()}')
+        if ordered and ('TEMP B-TREE' in line or line.strip().startswith('Sort')):
+            problems.append(f'sorts rows instead of reading them in index order: {line.strip()}')
+    return problems
+
+
+def check_indexes() -> dict:
+    """Return {query name: [problems]} for every hot query (empty if fine)"""
+    results = {}
+    with db.engine.connect() as connection:
+        for name, (statement, ordered) in _hot_queries().items():
+            with connection.begin():
+                results[name] = _problems(_plan(connection, statement), ordered)
+    return results
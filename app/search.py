@@ -0,0 +1,322 @@
+"""Full-text search over quotes, invoices and payments for the admin.
+
+The ``search_index`` table holds one document per quote (customer name,
+email, phone, message and notes), invoice (number and notes) and payment
+(gateway transaction id and notes). Documents and queries are normalized
+the same way: case folded, accents and Arabic diacritics (harakat, hamza
+and madda marks, tatweel) removed, alef wasla, alef maqsura and teh marbuta
+folded, and Arabic-Indic digits turned into 0-9; so 'Hélène' finds
+'helene' and 'احمد' finds 'أحمد'. Phones are also indexed as national and
+international digits, and a query made only of digits and separators is
+searched both as one number ('06 12 34' finds '+212612345678') and as
+typed ('2026-00042' finds 'INV-2026-00042').
+
+Every word of a query must occur in the document, anywhere in it, so
+fragments of a name, email, phone, invoice number (``INV-2026-00042``) or
+transaction id match. Words need 3 characters to be looked up in the index;
+shorter ones only narrow down the matches of the others. The index is:
+
+- SQLite: an FTS5 table with the trigram tokenizer (SQLite 3.34+)
+- Postgres: a table with a ``pg_trgm`` GIN index on the document
+
+It returns the newest ``MAX_CANDIDATES`` matching documents, which are
+ranked here the same way on both databases: whole words before word
+prefixes before fragments, and matches in the name, number or transaction
+id (the start of the document) before matches in the message. Scoring
+every match in SQL (``bm25``, ``ts_rank``) would cost as much as the
+number of documents sharing a common fragment such as '@gmail.com'.
+
+Documents are written by the session's ``after_flush`` hook, so they
+commit or roll back with the change. Rows inserted with
+``session.execute(insert(...))`` bypass the flush; their writer calls
+``reindex``. ``flask rebuild-search`` recomputes the whole index.
+"""
+import re
+import unicodedata
+
+from sqlalchemy import (
+    BigInteger, Column, Integer, MetaData, String, Table, Text, delete, event, literal_column, select, text
+)
+from sqlalchemy.orm import Session
+
+from app import db
+from app.leads import MOROCCO_CODE, normalize_phone
+from app.models import QuoteRequest
+from app.models_extended import Invoice, Payment
+
+KINDS = {
+    # kind: (model, indexed attributes, rowid code)
+    'quote': (QuoteRequest, ('name', 'email', 'phone', 'message', 'notes'), 1),
+    'invoice': (Invoice, ('invoice_number', 'notes'), 2),
+    'payment': (Payment, ('transaction_id', 'notes'), 3),
+}
+BY_MODEL = {model: kind for kind, (model, _, _) in KINDS.items()}
+MIN_TERM = 3
+MAX_CANDIDATES = 1000
+MAX_QUERY_LENGTH = 200
+BATCH_SIZE = 1000
+
+FOLDS = str.maketrans({
+    'ٱ': 'ا',  # alef wasla -> alef (hamza and madda forms decompose to alef)
+    'ى': 'ي',  # alef maqsura -> yeh
+    'ة': 'ه',  # teh marbuta -> heh
+    'ـ': None,  # tatweel
+    **{chr(0x0660 + i): str(i) for i in range(10)},  # Arabic-Indic digits
+    **{chr(0x06f0 + i): str(i) for i in range(10)},  # Extended (Persian) digits
+})
+WHITESPACE = re.compile(r'\s+')
+NUMBER = re.compile(r'\+?[\d\s\-\.\(\)]+')
+
+# Not on db.metadata: its DDL differs per database (see _create)
+search_index = Table(
+    'search_index', MetaData(),
+    # kind code + 4 * id, so a document is replaced by key on both databases
+    Column('rowid', BigInteger, primary_key=True),
+    Column('kind', String(10)),
+    Column('ref_id', Integer),
+    Column('quote_id', Integer),
+    Column('content', Text),
+)
+
+
+def normalize(value: str) -> str:
+    """Search form of ``value``"""
+    value = unicodedata.normalize('NFKD', value)
+    value = ''.join(c for c in value if not unicodedata.combining(c))
+    return WHITESPACE.sub(' ', value.translate(FOLDS).casefold()).strip()
+
+
+def _phone_forms(phone: str) -> list:
+    e164 = normalize_phone(phone)
+    if not e164:
+        return []
+    digits = e164.lstrip('+')
+    if digits.startswith(MOROCCO_CODE):
+        return [digits, '0' + digits[len(MOROCCO_CODE):]]
+    return [digits]
+
+
+def _document(kind: str, row) -> str:
+    _, attrs, _ = KINDS[kind]
+    values = [str(getattr(row, attr)) for attr in attrs if getattr(row, attr)]
+    if kind == 'quote' and row.phone:
+        values += _phone_forms(row.phone)
+    return normalize(' '.join(values))
+
+
+def _watched(kind: str) -> tuple:
+    return KINDS[kind][1] + (('quote_id',) if kind != 'quote' else ())
+
+
+def _entry(kind: str, row) -> dict:
+    return {
+        'rowid': row.id * 4 + KINDS[kind][2],
+        'kind': kind,
+        'ref_id': row.id,
+        'quote_id': row.id if kind == 'quote' else row.quote_id,
+        'content': _document(kind, row),
+    }
+
+
+def _create(target, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS search_index ('
+            'rowid BIGINT PRIMARY KEY, kind VARCHAR(10) NOT NULL, ref_id INTEGER NOT NULL, '
+            'quote_id INTEGER, content TEXT NOT NULL)'
+        ))
+        connection.execute(text(
+            'CREATE INDEX IF NOT EXISTS ix_search_index_trgm ON search_index USING gin (content gin_trgm_ops)'
+        ))
+    else:
+        connection.execute(text(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5('
+            "kind UNINDEXED, ref_id UNINDEXED, quote_id UNINDEXED, content, tokenize = 'trigram')"
+        ))
+
+
+def _drop(target, connection, **kw):
+    connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+
+# create_all (app startup, init-db) creates the index, drop_all drops it
+event.listen(db.metadata, 'after_create', _create)
+event.listen(db.metadata, 'before_drop', _drop)
+
+
+def _write(connection, removed: list, entries: list):
+    if removed:
+        connection.execute(delete(search_index).where(search_index.c.rowid.in_(removed)))
+    if entries:
+        connection.execute(search_index.insert(), entries)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):
+    removed, entries = [], []
+    for obj in session.new:
+        kind = BY_MODEL.get(type(obj))
+        if kind:
+            entries.append(_entry(kind, obj))
+    for obj in session.deleted:
+        kind = BY_MODEL.get(type(obj))
+        if kind:
+            removed.append(obj.id * 4 + KINDS[kind][2])
+    for obj in session.dirty:
+        kind = BY_MODEL.get(type(obj))
+        if kind and any(db.inspect(obj).attrs[attr].history.has_changes() for attr in _watched(kind)):
+            entry = _entry(kind, obj)
+            removed.append(entry['rowid'])
+            entries.append(entry)
+    if removed or entries:
+        _write(session.connection(), removed, entries)
+
+
+def reindex(session, model: type, ids):
+    """Index rows of ``model`` written without a flush (e.g. bulk inserts)"""
+    kind = BY_MODEL[model]
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        rows = session.execute(
+            select(model).where(model.id.in_(ids[start:start + BATCH_SIZE]))
+        ).scalars().all()
+        entries = [_entry(kind, row) for row in rows]
+        _write(session.connection(), [entry['rowid'] for entry in entries], entries)
+
+
+def rebuild(session) -> dict:
+    """Recompute the index from the live tables and commit; returns {kind: documents}"""
+    session.execute(delete(search_index))
+    counts = {}
+    for kind, (model, attrs, _) in KINDS.items():
+        columns = [model.id] + [getattr(model, attr) for attr in attrs]
+        if kind != 'quote':
+            columns.append(model.quote_id)
+        counts[kind] = 0
+        entries = []
+        for row in session.execute(select(*columns).order_by(model.id)).yield_per(BATCH_SIZE):
+            entries.append(_entry(kind, row))
+            if len(entries) == BATCH_SIZE:
+                session.execute(search_index.insert(), entries)
+                counts[kind] += len(entries)
+                entries = []
+        if entries:
+            session.execute(search_index.insert(), entries)
+            counts[kind] += len(entries)
+    session.commit()
+    return counts
+
+
+def unbuilt(session) -> bool:
+    """True if the index is empty although there are quotes"""
+    return (session.execute(select(search_index.c.rowid).limit(1)).first() is None
+            and session.execute(select(QuoteRequest.id).limit(1)).first() is not None)
+
+
+def _term_sets(query: str) -> list:
+    """The readings of ``query`` to search, each a list of terms"""
+    words = list(dict.fromkeys(normalize(query).split()))
+    if NUMBER.fullmatch(query.strip()) and sum(c.isdigit() for c in query) >= MIN_TERM:
+        # A phone number typed with spaces or dashes is one term, while an
+        # invoice number or transaction id keeps its separators
+        number = [re.sub(r'\D', '', query)]
+        return [number, words] if words != number else [number]
+    return [words]
+
+
+def _like(term: str) -> str:
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def _candidates(session, terms: list, kind: str) -> list:
+    """The newest MAX_CANDIDATES documents containing every term"""
+    content = search_index.c.content
+    where = [content.like(_like(term), escape='\\') for term in terms if len(term) < MIN_TERM]
+    if kind:
+        where.append(search_index.c.kind == kind)
+    long_terms = [term for term in terms if len(term) >= MIN_TERM]
+    if session.get_bind().dialect.name == 'postgresql':
+        where += [content.like(_like(term), escape='\\') for term in long_terms]
+    else:
+        # Quoted, each term matches as a substring of 3+ characters
+        match = ' AND '.join('"' + term.replace('"', '""') + '"' for term in long_terms)
+        where.insert(0, literal_column('search_index').op('MATCH')(match))
+    return session.execute(
+        select(search_index).where(*where).order_by(search_index.c.rowid.desc()).limit(MAX_CANDIDATES)
+    ).all()
+
+
+def _score(content: str, terms: list) -> float:
+    """Whole words beat word prefixes beat fragments; matches nearer the
+    start (the name, number or transaction id) beat later ones"""
+    score = 0.0
+    for term in terms:
+        escaped = re.escape(term)
+        found = re.search(rf'(?<!\w){escaped}(?!\w)', content)
+        weight = 3
+        if found is None:
+            found, weight = re.search(rf'(?<!\w){escaped}', content), 2
+        if found is None:
+            found, weight = re.search(escaped, content), 1
+        if found is not None:
+            score += weight + 1 - min(found.start(), 200) / 200
+    return score / len(terms)
+
+
+def search(session, query: str, kind: str = None, limit: int = 20) -> list:
+    """Ranked results for ``query``; raises ValueError for a query with no
+    word of MIN_TERM characters"""
+    if kind is not None and kind not in KINDS:
+        raise ValueError(f'type must be one of: {", ".join(KINDS)}')
+    term_sets = [
+        terms for terms in _term_sets(query[:MAX_QUERY_LENGTH])
+        if any(len(term) >= MIN_TERM for term in terms)
+    ]
+    if not term_sets:
+        raise ValueError(f'search for at least one word of {MIN_TERM} characters')
+
+    # A document found by several readings keeps its best score
+    scored = {}
+    for terms in term_sets:
+        for row in _candidates(session, terms, kind):
+            score = _score(row.content, terms)
+            if row.rowid not in scored or score > scored[row.rowid][0]:
+                scored[row.rowid] = (score, row)
+    # Equal scores stay newest first
+    matches = sorted(
+        scored.values(), key=lambda item: (item[0], item[1].rowid), reverse=True
+    )[:limit]
+    found = {}
+    for name, (model, _, _) in KINDS.items():
+        ids = {match.ref_id for _, match in matches if match.kind == name}
+        if name == 'quote':
+            ids |= {match.quote_id for _, match in matches if match.quote_id is not None}
+        if ids:
+            found[name] = {row.id: row for row in session.execute(
+                select(model).where(model.id.in_(ids))
+            ).scalars()}
+
+    results = []
+    for score, match in matches:
+        row = found.get(match.kind, {}).get(match.ref_id)
+        if row is None:
+            continue
+        quote = found.get('quote', {}).get(match.quote_id)
+        if match.kind == 'quote':
+            title, status = row.name, row.status
+        elif match.kind == 'invoice':
+            title, status = row.invoice_number, row.status
+        else:
+            title, status = row.transaction_id or f'Payment #{row.id}', row.status
+        results.append({
+            'type': match.kind,
+            'id': match.ref_id,
+            'quote_id': match.quote_id,
+            'title': title,
+            'status': status,
+            'customer': {'name': quote.name, 'email': quote.email, 'phone': quote.phone} if quote else None,
+            'score': round(score, 3),
+        })
+    return results
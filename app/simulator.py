@@ -0,0 +1,201 @@
+"""Pricing what-if simulator over historical quotes.
+
+Reprices the quote history under a proposed catalog and reports how revenue
+would have shifted per location, per resolution and per month.
+
+The history is read with one GROUP BY over (camera_count, resolution,
+location_id, difficulty_level, month), so the database returns at most
+locations x resolutions x difficulties x 100 x months rows however many
+quotes exist, and no ORM objects are created. The grouped rows are loaded
+into parallel columns with a weight (quote count) column and priced with
+``PricingPlan.batch_price`` under both the current and the proposed plan.
+"""
+from array import array
+from datetime import datetime
+from operator import mul
+
+from sqlalchemy import extract, func, select
+
+from app import db
+from app.models import QuoteRequest
+from app.pricing import compile_plan, MAX_CAMERAS
+
+
+class QuoteHistory:
+    """Historical quote configurations as parallel columns"""
+
+    def __init__(self):
+        self.camera_counts = array('i')
+        self.resolutions = []
+        self.location_ids = array('i')
+        self.difficulty_levels = []
+        self.months = array('i')  # yyyymm
+        self.weights = array('q')  # quotes sharing this row
+        self.recorded = array('d')  # sum of stored estimated_price
+
+    def __len__(self):
+        return len(self.weights)
+
+
+def load_history(start: datetime = None, end: datetime = None, statuses=None) -> QuoteHistory:
+    """Load quote configurations created in [start, end) as grouped columns"""
+    month = extract('year', QuoteRequest.created_at) * 100 + extract('month', QuoteRequest.created_at)
+    columns = (
+        QuoteRequest.camera_count,
+        QuoteRequest.resolution,
+        QuoteRequest.location_id,
+        QuoteRequest.difficulty_level,
+        month.label('month'),
+    )
+    stmt = (
+        select(*columns, func.count().label('weight'),
+               func.coalesce(func.sum(QuoteRequest.estimated_price), 0).label('recorded'))
+        .where(
+            QuoteRequest.camera_count.isnot(None),
+            QuoteRequest.resolution.isnot(None),
+            QuoteRequest.location_id.isnot(None),
+            QuoteRequest.difficulty_level.isnot(None),
+        )
+        .group_by(*columns)
+    )
+    if start:
+        stmt = stmt.where(QuoteRequest.created_at >= start)
+    if end:
+        stmt = stmt.where(QuoteRequest.created_at < end)
+    if statuses:
+        stmt = stmt.where(QuoteRequest.status.in_(statuses))
+
+    history = QuoteHistory()
+    result = db.session.execute(stmt.execution_options(yield_per=10000))
+    for partition in result.partitions():
+        for camera_count, resolution, location_id, difficulty_level, month_key, weight, recorded in partition:
+            history.camera_counts.append(camera_count)
+            history.resolutions.append(resolution)
+            history.location_ids.append(location_id)
+            history.difficulty_levels.append(difficulty_level)
+            history.months.append(int(month_key))
+            history.weights.append(weight)
+            history.recorded.append(recorded)
+    return history
+
+
+def proposed_catalog_entries(catalog, proposal: dict):
+    """Apply proposal overrides to the catalog entries.
+
+    ``proposal`` may contain ``locations`` (by id), ``resolutions`` (by
+    resolution) and ``difficulties`` (by level) mappings of field overrides,
+    plus a full ``rules`` definition. Raises ValueError on unknown keys.
+    """
+    overrides = {
+        'locations': (catalog.locations, lambda e: str(e.id), ('difficulty_multiplier', 'travel_fee')),
+        'resolutions': (catalog.resolutions, lambda e: e.resolution, ('base_price',)),
+        'difficulties': (catalog.difficulties, lambda e: e.level, ('cost_multiplier', 'hours_required')),
+    }
+    unknown = set(proposal) - set(overrides) - {'rules'}
+    if unknown:
+        raise ValueError(f"unknown proposal keys: {', '.join(sorted(unknown))}")
+
+    entries = {}
+    for kind, (current, key_of, fields) in overrides.items():
+        if not isinstance(proposal.get(kind) or {}, dict):
+            raise ValueError(f'{kind} must be an object')
+        changes = {str(k): v for k, v in (proposal.get(kind) or {}).items()}
+        known = {key_of(e) for e in current}
+        missing = set(changes) - known
+        if missing:
+            raise ValueError(f"unknown {kind}: {', '.join(sorted(missing))}")
+        updated = []
+        for entry in current:
+            change = changes.get(key_of(entry), {})
+            if not isinstance(change, dict):
+                raise ValueError(f'{kind}[{key_of(entry)}] must be an object')
+            bad = set(change) - set(fields)
+            if bad:
+                raise ValueError(f"{kind}[{key_of(entry)}] can only override {', '.join(fields)}")
+            for field, value in change.items():
+                if not isinstance(value, (int, float)) or isinstance(value, bool) or value < 0:
+                    raise ValueError(f'{kind}[{key_of(entry)}].{field} must be a non-negative number')
+            updated.append(entry._replace(**change))
+        entries[kind] = tuple(updated)
+    return entries['locations'], entries['resolutions'], entries['difficulties']
+
+
+def _reprice(plan, locations, resolutions, difficulties, history: QuoteHistory, rows):
+    location_by_id = {l.id: l for l in locations}
+    resolution_by_name = {r.resolution: r for r in resolutions}
+    difficulty_by_level = {d.level: d for d in difficulties}
+    columns = plan.batch_price(
+        [history.camera_counts[i] for i in rows],
+        [resolution_by_name[history.resolutions[i]] for i in rows],
+        [location_by_id[history.location_ids[i]] for i in rows],
+        [difficulty_by_level[history.difficulty_levels[i]] for i in rows],
+    )
+    return list(map(mul, columns['total_price'], [history.weights[i] for i in rows]))
+
+
+def simulate(catalog, proposal: dict, history: QuoteHistory) -> dict:
+    """Reprice ``history`` under the current and the proposed catalog"""
+    locations, resolutions, difficulties = proposed_catalog_entries(catalog, proposal)
+    # Proposed rule keys override the published rule set; the others stay as published
+    rules = catalog.pricing_plan.rules
+    if 'rules' in proposal:
+        if not isinstance(proposal['rules'], dict):
+            raise ValueError('rules must be an object')
+        rules = {**rules, **proposal['rules']}
+    proposed_plan = compile_plan(rules, locations, resolutions, difficulties)
+
+    # Rows the current catalog can price (deleted or malformed references are skipped)
+    rows = [
+        i for i in range(len(history))
+        if history.location_ids[i] in catalog.location_by_id
+        and history.resolutions[i] in catalog.resolution_by_name
+        and history.difficulty_levels[i] in catalog.difficulty_by_level
+        and 0 < history.camera_counts[i] <= MAX_CAMERAS
+    ]
+
+    baseline = _reprice(catalog.pricing_plan, catalog.locations, catalog.resolutions,
+                        catalog.difficulties, history, rows)
+    proposed = _reprice(proposed_plan, locations, resolutions, difficulties, history, rows)
+
+    groups = {'location': {}, 'resolution': {}, 'month': {}}
+    totals = {'quotes': 0, 'recorded': 0.0, 'baseline': 0.0, 'proposed': 0.0}
+    for n, i in enumerate(rows):
+        keys = {
+            'location': history.location_ids[i],
+            'resolution': history.resolutions[i],
+            'month': history.months[i],
+        }
+        for name, key in keys.items():
+            bucket = groups[name].setdefault(key, {'quotes': 0, 'baseline': 0.0, 'proposed': 0.0})
+            bucket['quotes'] += history.weights[i]
+            bucket['baseline'] += baseline[n]
+            bucket['proposed'] += proposed[n]
+        totals['quotes'] += history.weights[i]
+        totals['recorded'] += history.recorded[i]
+        totals['baseline'] += baseline[n]
+        totals['proposed'] += proposed[n]
+
+    def summarize(bucket: dict) -> dict:
+        delta = bucket['proposed'] - bucket['baseline']
+        summary = {k: round(v, 2) if isinstance(v, float) else v for k, v in bucket.items()}
+        summary['delta'] = round(delta, 2)
+        summary['delta_pct'] = round(delta / bucket['baseline'] * 100, 2) if bucket['baseline'] else None
+        return summary
+
+    unpriced = sum(history.weights) - totals['quotes']
+    return {
+        'quotes': totals['quotes'],
+        'unpriced_quotes': unpriced,
+        'totals': summarize(totals),
+        'by_location': [
+            dict(summarize(v), location_id=k, location=catalog.location_by_id[k].get_name('en'))
+            for k, v in sorted(groups['location'].items())
+        ],
+        'by_resolution': [
+            dict(summarize(v), resolution=k) for k, v in sorted(groups['resolution'].items())
+        ],
+        'by_month': [
+            dict(summarize(v), month=f'{k // 100:04d}-{k % 100:02d}')
+            for k, v in sorted(groups['month'].items())
+        ],
+    }
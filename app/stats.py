@@ -0,0 +1,83 @@
+"""Admin dashboard statistics.
+
+All the dashboard numbers come from one statement: a ``SELECT`` whose
+columns are scalar subqueries, one per number, so the whole dashboard is a
+single round trip to the database.
+
+Quote, revenue and installation totals are summed from the rollup tables
+(see app/rollups.py), whose size grows with days and statuses rather than
+rows. "New this week" needs the exact time, so it counts quotes directly;
+it reads only its range of ``ix_quote_requests_status_created``, as do the
+technician counts of their (small) table. See
+``benchmarks/dashboard_stats.py``.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from app.models import QuoteRequest
+from app.models_extended import InstallationStats, InvoiceDailyStats, QuoteDailyStats, Technician
+
+REVENUE_STATUSES = ('paid', 'issued')
+
+
+def _count(model, *conditions):
+    return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
+
+
+def _sum(column, *conditions):
+    return select(func.coalesce(func.sum(column), 0)).where(*conditions).scalar_subquery()
+
+
+def _revenue_since(start: datetime):
+    return _sum(InvoiceDailyStats.total_amount,
+                InvoiceDailyStats.status.in_(REVENUE_STATUSES), InvoiceDailyStats.day >= start.date())
+
+
+def dashboard_stats(session, now: datetime = None) -> dict:
+    """The numbers shown on the admin dashboard"""
+    now = now or datetime.utcnow()
+    month_start = datetime(now.year, now.month, 1)
+    year_start = datetime(now.year, 1, 1)
+
+    row = session.execute(select(
+        _sum(QuoteDailyStats.count),
+        _count(QuoteRequest, QuoteRequest.status == 'new',
+               QuoteRequest.created_at >= now - timedelta(days=7)),
+        _sum(QuoteDailyStats.count, QuoteDailyStats.status == 'converted'),
+        _revenue_since(month_start),
+        _revenue_since(year_start),
+        _sum(InstallationStats.count, InstallationStats.status == 'completed'),
+        _sum(InstallationStats.count, InstallationStats.status == 'pending'),
+        _sum(InstallationStats.count, InstallationStats.status == 'in-progress'),
+        _count(Technician),
+        _count(Technician, Technician.status == 'available'),
+        _count(Technician, Technician.status == 'busy'),
+    )).one()
+    (total_quotes, new_quotes, converted_quotes, month_revenue, year_revenue,
+     completed, pending, in_progress, team_total, available, busy) = row
+
+    conversion_rate = (converted_quotes / total_quotes * 100) if total_quotes > 0 else 0
+    return {
+        'quotes': {
+            'total': total_quotes,
+            'new': new_quotes,
+            'converted': converted_quotes,
+            'conversion_rate': round(conversion_rate, 2)
+        },
+        'revenue': {
+            'this_month': round(month_revenue, 2),
+            'this_year': round(year_revenue, 2),
+            'currency': 'MAD'
+        },
+        'installations': {
+            'completed': completed,
+            'pending': pending,
+            'in_progress': in_progress
+        },
+        'team': {
+            'available': available,
+            'busy': busy,
+            'total': team_total
+        }
+    }
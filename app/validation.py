@@ -0,0 +1,346 @@
+"""Declarative request validation.
+
+Routes declare what they accept and get cleaned values in ``g.body`` (JSON
+body) and ``g.args`` (query string):
+
+    QUOTE_SCHEMA = Schema(
+        name=Field('string', required=True, min_length=2, max_length=100),
+        camera_count=Field('integer', min=1, max=MAX_CAMERAS),
+    )
+
+    @validate(body=QUOTE_SCHEMA)
+    def submit_quote(): ...
+
+Each ``Field`` is compiled into a checking closure when the schema is built
+(at import time), with its regexes compiled and its bounds bound, so a request
+only runs a flat loop over prepared checks. Errors are collected per field and
+returned as one 400 response with messages from ``TRANSLATIONS`` in the
+request language. Bodies larger than the schema's ``max_bytes`` get a 413
+before they are parsed; ``MAX_CONTENT_LENGTH`` is the app-wide backstop.
+
+Only declared fields end up in the cleaned dict. A field that was not sent
+is left out unless it has a ``default``, so handlers can still tell
+"absent" from "sent as null".
+"""
+import copy
+import json
+import math
+import re
+from datetime import datetime
+from functools import wraps
+
+from flask import g, jsonify, request
+
+from app.i18n import current_language, get_translation
+
+DEFAULT_MAX_BYTES = 64 * 1024
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# Spaces, dashes, parentheses and + are allowed around the digits
+PHONE_SEPARATORS = re.compile(r'[\s\-\(\)\+]')
+
+MISSING = object()
+
+
+class Invalid(Exception):
+    """A field failed validation; ``key`` is a TRANSLATIONS key"""
+
+    def __init__(self, key: str, **params):
+        super().__init__(key)
+        self.key = key
+        self.params = params
+
+
+def _string(value, strip=True, lower=False, min_length=None, max_length=None, pattern=None):
+    if not isinstance(value, str):
+        raise Invalid('invalid_value')
+    if strip:
+        value = value.strip()
+    if lower:
+        value = value.lower()
+    if not value:
+        return value
+    if min_length is not None and len(value) < min_length:
+        raise Invalid('too_short', min_length=min_length)
+    if max_length is not None and len(value) > max_length:
+        raise Invalid('too_long', max_length=max_length)
+    if pattern is not None and not pattern.match(value):
+        raise Invalid('invalid_format')
+    return value
+
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise Invalid('invalid_value')
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        if not value.strip():
+            return MISSING
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise Invalid('invalid_value')
+
+
+def _number(value):
+    if isinstance(value, bool):
+        raise Invalid('invalid_value')
+    if isinstance(value, str):
+        if not value.strip():
+            return MISSING
+        try:
+            value = float(value)
+        except ValueError:
+            raise Invalid('invalid_value')
+    if isinstance(value, (int, float)) and math.isfinite(value):
+        return float(value)
+    raise Invalid('invalid_value')
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.lower() in ('true', '1', 'false', '0'):
+        return value.lower() in ('true', '1')
+    raise Invalid('invalid_value')
+
+
+def _datetime(value):
+    if not isinstance(value, str):
+        raise Invalid('invalid_date')
+    if not value.strip():
+        return MISSING
+    try:
+        return datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise Invalid('invalid_date')
+
+
+def _phone(value):
+    digits = PHONE_SEPARATORS.sub('', value)
+    if not (digits.isdigit() and len(digits) >= 8):
+        raise Invalid('invalid_format')
+    return value
+
+
+class Field:
+    """One declared field: ``type`` is string, integer, number, boolean,
+    email, phone, datetime, list, object or any."""
+
+    def __init__(self, type: str = 'string', *, required: bool = False, default=MISSING,
+                 min=None, max=None, min_length=None, max_length=None, pattern: str = None,
+                 choices=None, lower: bool = False, strip: bool = True, items: 'Field' = None,
+                 min_items: int = None, max_items: int = None, convert=None, error: str = None):
+        self.type = type
+        self.required = required
+        self.default = default
+        self.min = min
+        self.max = max
+        self.min_length = min_length
+        self.max_length = max_length
+        self.pattern = pattern
+        self.choices = tuple(choices) if choices is not None else None
+        self.lower = lower
+        self.strip = strip
+        self.items = items
+        self.min_items = min_items
+        self.max_items = max_items
+        # Applied to the checked value; raises Invalid to reject it
+        self.convert = convert
+        # Report every failure of this field with this TRANSLATIONS key
+        self.error = error
+
+    def compile(self):
+        """Return ``check(value)``: the cleaned value, MISSING for an empty
+        input, or raises Invalid"""
+        convert = self._converter()
+        if self.convert is not None:
+            convert = self._chain(convert, self.convert)
+        low, high, choices = self.min, self.max, self.choices
+
+        if low is None and high is None and choices is None:
+            return convert
+
+        def check(value):
+            value = convert(value)
+            if value is MISSING or value == '':
+                return value
+            if low is not None and value < low:
+                raise Invalid('too_small', min=low)
+            if high is not None and value > high:
+                raise Invalid('too_large', max=high)
+            if choices is not None and value not in choices:
+                raise Invalid('invalid_choice', choices=', '.join(map(str, choices)))
+            return value
+        return check
+
+    @staticmethod
+    def _chain(convert, extra):
+        def check(value):
+            value = convert(value)
+            if value is MISSING or value == '':
+                return value
+            return extra(value)
+        return check
+
+    def _converter(self):
+        kind = self.type
+        if kind in ('string', 'email', 'phone'):
+            pattern = re.compile(self.pattern) if self.pattern else None
+            max_length = self.max_length
+            lower = self.lower
+            if kind == 'email':
+                pattern, max_length, lower = EMAIL_PATTERN, max_length or 255, True
+            options = dict(strip=self.strip, lower=lower, min_length=self.min_length,
+                           max_length=max_length, pattern=pattern)
+            if kind == 'phone':
+                def check_phone(value):
+                    value = _string(value, **options)
+                    return _phone(value) if value else value
+                return check_phone
+            return lambda value: _string(value, **options)
+        if kind == 'integer':
+            return _integer
+        if kind == 'number':
+            return _number
+        if kind == 'boolean':
+            return _boolean
+        if kind == 'datetime':
+            return _datetime
+        if kind == 'object':
+            def check_object(value):
+                if not isinstance(value, dict):
+                    raise Invalid('invalid_value')
+                return value
+            return check_object
+        if kind == 'list':
+            return self._list_converter()
+        if kind == 'any':
+            return lambda value: value
+        raise ValueError(f'unknown field type {kind!r}')
+
+    def _list_converter(self):
+        check_item = self.items.compile() if self.items is not None else None
+        min_items, max_items = self.min_items, self.max_items
+
+        def check_list(value):
+            if not isinstance(value, list):
+                raise Invalid('invalid_value')
+            if min_items is not None and len(value) < min_items:
+                raise Invalid('required')
+            if max_items is not None and len(value) > max_items:
+                raise Invalid('too_many_items', max_items=max_items)
+            if check_item is None:
+                return value
+            cleaned = []
+            for item in value:
+                item = check_item(item)
+                if item is MISSING or item == '':
+                    raise Invalid('invalid_value')
+                cleaned.append(item)
+            return cleaned
+        return check_list
+
+
+class Schema:
+    """A set of fields compiled into a single ``validate(data)`` function"""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, **fields: Field):
+        self.fields = fields
+        self.max_bytes = max_bytes
+        self.validate = self._compile()
+
+    def _compile(self):
+        plan = tuple(
+            (name, field.required, field.default, field.error, field.compile())
+            for name, field in self.fields.items()
+        )
+
+        def validate(data):
+            """Return (cleaned, errors); errors maps field -> (key, params)"""
+            cleaned = {}
+            errors = {}
+            for name, required, default, error, check in plan:
+                value = data.get(name, MISSING)
+                if value is not MISSING and value is not None:
+                    try:
+                        value = check(value)
+                    except Invalid as e:
+                        errors[name] = (error, {}) if error else (e.key, e.params)
+                        continue
+                    if value == '' and (required or default is not MISSING):
+                        value = MISSING
+                if value is MISSING or (value is None and required):
+                    if required:
+                        errors[name] = (error or 'required', {})
+                    elif default is not MISSING:
+                        cleaned[name] = copy.copy(default)
+                    continue
+                cleaned[name] = value
+            return cleaned, errors
+        return validate
+
+
+def error_messages(lang: str, errors: dict) -> dict:
+    """Localize the errors returned by ``Schema.validate``"""
+    return {
+        name: get_translation(lang, error_key).format(**params)
+        for name, (error_key, params) in errors.items()
+    }
+
+
+def _error_response(lang: str, key: str, status: int, errors: dict = None):
+    body = {'success': False, 'error': get_translation(lang, key), 'language': lang}
+    if errors is not None:
+        body['errors'] = error_messages(lang, errors)
+    response = jsonify(body)
+    response.status_code = status
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def validate(body: Schema = None, query: Schema = None):
+    """Decorator validating the JSON body and/or query string of a route"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+            lang = current_language()
+
+            if query is not None:
+                cleaned, errors = query.validate(request.args)
+                if errors:
+                    return _error_response(lang, 'validation_failed', 400, errors)
+                g.args = cleaned
+
+            if body is not None:
+                length = request.content_length
+                if length is not None and length > body.max_bytes:
+                    return _error_response(lang, 'payload_too_large', 413)
+                raw = request.get_data(cache=True)
+                if len(raw) > body.max_bytes:
+                    return _error_response(lang, 'payload_too_large', 413)
+                try:
+                    data = json.loads(raw) if raw.strip() else {}
+                except ValueError:
+                    data = None
+                if not isinstance(data, dict):
+                    return _error_response(lang, 'invalid_json', 400)
+                cleaned, errors = body.validate(data)
+                if errors:
+                    return _error_response(lang, 'validation_failed', 400, errors)
+                g.body = cleaned
+
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
+
+def init_app(app):
+    """Answer requests over MAX_CONTENT_LENGTH with the same JSON error"""
+    app.register_error_handler(413, lambda e: _error_response(current_language(), 'payload_too_large', 413))
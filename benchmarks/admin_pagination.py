@@ -0,0 +1,95 @@
+"""Microbenchmark: OFFSET vs keyset pagination of the admin quote list.
+
+    python benchmarks/admin_pagination.py [--rows 200000] [--per-page 20]
+
+Fills a throwaway SQLite database with quotes, then times reading page 1,
+100, 500 and the last page newest-first both ways: ``.paginate()``-style
+(``COUNT(*)`` plus ``OFFSET``) and ``keyset_page`` following cursors.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db  # noqa: E402
+from app.models import QuoteRequest  # noqa: E402
+from app.pagination import decode_cursor, keyset_page  # noqa: E402
+
+REPEAT = 20
+
+
+def fill(session: Session, rows: int):
+    start = datetime(2024, 1, 1)
+    batch = []
+    for i in range(rows):
+        batch.append(dict(
+            name=f'Client {i}', email=f'client{i}@example.com', phone='+212612345678',
+            service='Installation', message='Need cameras for a warehouse entrance',
+            status='new', created_at=start + timedelta(seconds=i * 37),
+            updated_at=start + timedelta(seconds=i * 37),
+        ))
+        if len(batch) == 10000:
+            session.execute(insert(QuoteRequest), batch)
+            batch = []
+    if batch:
+        session.execute(insert(QuoteRequest), batch)
+    session.commit()
+
+
+def offset_page(session: Session, page: int, per_page: int):
+    query = session.query(QuoteRequest)
+    query.order_by(None).count()
+    return query.order_by(QuoteRequest.created_at.desc()).offset((page - 1) * per_page).limit(per_page).all()
+
+
+def timed(read) -> float:
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        read()
+    return (time.perf_counter() - start) / REPEAT
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--per-page', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with tempfile.TemporaryDirectory() as directory, app.app_context():
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        db.metadata.create_all(engine)
+        session = Session(engine)
+        fill(session, args.rows)
+
+        keys = [QuoteRequest.created_at, QuoteRequest.id]
+        last_page = -(-args.rows // args.per_page)
+        pages = sorted({p for p in (1, 100, 500, last_page) if p <= last_page})
+
+        # Walk the cursors once to get the cursor that opens each page
+        cursors = {1: None}
+        page_args = {'per_page': args.per_page, 'cursor': None}
+        for page in range(1, last_page):
+            result = keyset_page(session.query(QuoteRequest), keys, page_args, descending=True)
+            page_args = {'per_page': args.per_page, 'cursor': decode_cursor(result['next_cursor'])}
+            if page + 1 in pages:
+                cursors[page + 1] = page_args['cursor']
+
+        print(f"{args.rows} quotes, {args.per_page} per page")
+        for page in pages:
+            offset = timed(lambda: offset_page(session, page, args.per_page))
+            page_args = {'per_page': args.per_page, 'cursor': cursors[page]}
+            keyset = timed(lambda: keyset_page(session.query(QuoteRequest), keys, page_args, descending=True))
+            print(f"page {page:>6}: offset + count {offset * 1000:8.2f} ms   keyset {keyset * 1000:8.2f} ms")
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Benchmark: admin dashboard stats, one query per number vs one combined query.
+
+    python benchmarks/dashboard_stats.py [--quotes 1000000]
+
+Fills a throwaway SQLite database (with the model indexes) with quotes, a
+tenth as many installations and invoices, and 50 technicians. Then it
+compares the query count and latency of the previous implementation, which
+ran one count or sum per number, with ``app.stats.dashboard_stats``. The
+rows are bulk inserted, so the rollup tables are rebuilt once after loading.
+
+SQLite runs in-process, so a statement costs no network round trip; the
+last column adds ``--round-trip-ms`` per statement to estimate the latency
+against a database server.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db, rollups  # noqa: E402
+from app.models import QuoteRequest  # noqa: E402
+from app.models_extended import Installation, Invoice, Technician  # noqa: E402
+from app.stats import dashboard_stats  # noqa: E402
+
+REPEAT = 5
+BATCH = 50000
+
+
+def fill(session: Session, quotes: int):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    session.execute(insert(Technician), [dict(
+        name=f'Tech {i}', email=f'tech{i}@example.com', phone='+212612345678',
+        status=rng.choice(['available', 'busy', 'off-duty'])
+    ) for i in range(50)])
+
+    def batches(count, make):
+        for start in range(0, count, BATCH):
+            yield [make(i) for i in range(start, min(count, start + BATCH))]
+
+    for rows in batches(quotes, lambda i: dict(
+        name=f'Client {i}', email=f'client{i}@example.com', phone='+212612345678',
+        service='Installation', message='Need cameras', status=rng.choice(['new', 'contacted', 'converted', 'rejected']),
+        created_at=now - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60)), updated_at=now,
+    )):
+        session.execute(insert(QuoteRequest), rows)
+    for rows in batches(quotes // 10, lambda i: dict(
+        quote_id=i + 1, technician_id=rng.randrange(1, 51),
+        status=rng.choice(['pending', 'in-progress', 'completed', 'failed']),
+        scheduled_date=now - timedelta(days=rng.randrange(730)),
+    )):
+        session.execute(insert(Installation), rows)
+    for rows in batches(quotes // 10, lambda i: dict(
+        invoice_number=f'INV-{i:08d}', quote_id=i + 1, total_amount=rng.uniform(2000, 40000),
+        status=rng.choice(['draft', 'issued', 'paid', 'overdue']),
+        issued_date=now - timedelta(days=rng.randrange(730)),
+    )):
+        session.execute(insert(Invoice), rows)
+    session.commit()
+
+
+def previous_stats(session: Session) -> dict:
+    """The dashboard_stats view as it was: one query per number"""
+    today = datetime.utcnow().date()
+    month_start = today.replace(day=1)
+    year_start = today.replace(month=1, day=1)
+
+    total_quotes = session.query(QuoteRequest).count()
+    new_quotes = session.query(QuoteRequest).filter(
+        QuoteRequest.created_at >= datetime.utcnow() - timedelta(days=7),
+        QuoteRequest.status == 'new'
+    ).count()
+    converted_quotes = session.query(QuoteRequest).filter_by(status='converted').count()
+    month_revenue = session.query(db.func.sum(Invoice.total_amount)).filter(
+        Invoice.issued_date >= month_start, Invoice.status.in_(['paid', 'issued'])
+    ).scalar() or 0
+    year_revenue = session.query(db.func.sum(Invoice.total_amount)).filter(
+        Invoice.issued_date >= year_start, Invoice.status.in_(['paid', 'issued'])
+    ).scalar() or 0
+    completed = session.query(Installation).filter_by(status='completed').count()
+    pending = session.query(Installation).filter_by(status='pending').count()
+    in_progress = session.query(Installation).filter_by(status='in-progress').count()
+    available = session.query(Technician).filter_by(status='available').count()
+    busy = session.query(Technician).filter_by(status='busy').count()
+    return {
+        'quotes': {'total': total_quotes, 'new': new_quotes, 'converted': converted_quotes},
+        'revenue': {'this_month': round(month_revenue, 2), 'this_year': round(year_revenue, 2)},
+        'installations': {'completed': completed, 'pending': pending, 'in_progress': in_progress},
+        'team': {'available': available, 'busy': busy, 'total': session.query(Technician).count()},
+    }
+
+
+def measure(engine, read):
+    statements = []
+
+    def listener(*args):
+        statements.append(1)
+
+    event.listen(engine, 'before_cursor_execute', listener)
+    try:
+        with Session(engine) as session:
+            result = read(session)
+        statements.clear()
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            with Session(engine) as session:
+                read(session)
+        elapsed = (time.perf_counter() - start) / REPEAT
+    finally:
+        event.remove(engine, 'before_cursor_execute', listener)
+    return result, len(statements) // REPEAT, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quotes', type=int, default=1000000)
+    parser.add_argument('--round-trip-ms', type=float, default=1.0)
+    args = parser.parse_args()
+
+    app = create_app()
+    with tempfile.TemporaryDirectory() as directory, app.app_context():
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        db.metadata.create_all(engine)
+        start = time.perf_counter()
+        with Session(engine) as session:
+            fill(session, args.quotes)
+            rollups.rebuild(session)
+        print(f"{args.quotes} quotes loaded in {time.perf_counter() - start:.0f} s")
+
+        before, before_queries, before_time = measure(engine, previous_stats)
+        after, after_queries, after_time = measure(engine, dashboard_stats)
+        for section, values in before.items():
+            for name, value in values.items():
+                # Sums may differ in the last cent from the summation order
+                assert abs(after[section][name] - value) <= 0.01, (section, name, value, after[section][name])
+
+        for label, queries, elapsed in (('before', before_queries, before_time),
+                                        ('after', after_queries, after_time)):
+            print(f"{label + ':':7} {queries:2d} queries {elapsed * 1000:8.1f} ms"
+                  f"   {elapsed * 1000 + queries * args.round_trip_ms:8.1f} ms with round trips")
+
+
+if __name__ == '__main__':
+    main()
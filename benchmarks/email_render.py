@@ -0,0 +1,82 @@
+"""Microbenchmark: per-message cost of rendering quote emails.
+
+    python benchmarks/email_render.py [--messages 2000]
+
+Reports the first render of a fresh process with and without the on-disk
+bytecode cache, then the steady-state cost per message for ``render`` and
+``render_many``.
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, emails  # noqa: E402
+
+LANGUAGES = ('ar', 'fr', 'en')
+
+
+def sample_quote(i: int):
+    return SimpleNamespace(
+        id=i, name=f'Client {i}', email=f'client{i}@example.com', phone='+212612345678',
+        service='Installation', language=LANGUAGES[i % 3], location_id=1, camera_count=4,
+        resolution='1080p', difficulty_level='medium', estimated_price=5400.0,
+        message='Need cameras for a warehouse entrance', ip_address='127.0.0.1',
+        created_at=datetime.utcnow()
+    )
+
+
+def first_render(app, clear_cache: bool) -> float:
+    """Time from a fresh template set to the first rendered confirmation"""
+    cache_dir = os.path.join(app.instance_path, 'email_templates_cache')
+    if clear_cache:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    app.extensions.pop('email_templates', None)
+    start = time.perf_counter()
+    emails.render('confirmation', 'ar', quote=sample_quote(1))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app()
+    quotes = [sample_quote(i) for i in range(args.messages)]
+
+    with app.app_context():
+        cold = first_render(app, clear_cache=True)
+        warm = first_render(app, clear_cache=False)
+        print(f"first render, compiling templates:     {cold * 1000:8.2f} ms")
+        print(f"first render, from bytecode cache:     {warm * 1000:8.2f} ms")
+
+        for lang in LANGUAGES:
+            emails.render('confirmation', lang, quote=quotes[0])
+
+        start = time.perf_counter()
+        for quote in quotes:
+            emails.render('confirmation', quote.language, quote=quote)
+        single = (time.perf_counter() - start) / len(quotes)
+
+        start = time.perf_counter()
+        emails.render_many('confirmation', ((q.language, {'quote': q}) for q in quotes))
+        bulk = (time.perf_counter() - start) / len(quotes)
+
+        start = time.perf_counter()
+        for quote in quotes:
+            emails.render('admin_notification', 'en', quote=quote)
+        admin = (time.perf_counter() - start) / len(quotes)
+
+    print(f"confirmation via render()      (x{args.messages}): {single * 1e6:8.1f} us/message")
+    print(f"confirmation via render_many() (x{args.messages}): {bulk * 1e6:8.1f} us/message")
+    print(f"admin notification via render() (x{args.messages}): {admin * 1e6:8.1f} us/message")
+
+
+if __name__ == '__main__':
+    main()
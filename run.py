@@ -2,6 +2,8 @@
 """Application entry point"""
 import os
 import sys
+import json
+import click
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -155,6 +157,120 @@ def init_db():
         sys.exit(1)
 
 
+@app.cli.command('simulate-pricing')
+@click.argument('proposal_file', type=click.File('r'))
+@click.option('--start', type=click.DateTime(), help='Only quotes created on or after this date')
+@click.option('--end', type=click.DateTime(), help='Only quotes created before this date')
+@click.option('--status', 'statuses', multiple=True, help='Only quotes with this status (repeatable)')
+def simulate_pricing(proposal_file, start, end, statuses):
+    """Reprice historical quotes under the proposal in PROPOSAL_FILE (JSON)"""
+    from app.catalog import get_catalog
+    from app import simulator
+    
+    try:
+        proposal = json.load(proposal_file)
+        history = simulator.load_history(start, end, list(statuses) or None)
+        result = simulator.simulate(get_catalog(), proposal, history)
+    except ValueError as e:
+        print(f"❌ Invalid proposal: {e}", file=sys.stderr)
+        sys.exit(1)
+    
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+@app.cli.command('outbox-worker')
+@click.option('--once', is_flag=True, help='Exit when no email is due instead of polling')
+def outbox_worker(once):
+    """Deliver queued emails from the outbox"""
+    from app.outbox import run_worker
+    
+    print("📬 Outbox worker started")
+    try:
+        run_worker(once=once)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.cli.command('purge-idempotency-keys')
+def purge_idempotency_keys():
+    """Delete expired Idempotency-Key records"""
+    from app.idempotency import purge_expired
+    
+    print(f"✅ Deleted {purge_expired()} expired idempotency keys")
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Add new tables, columns and indexes to an existing database"""
+    from app.schema import upgrade
+    from app.leads import backfill
+    from app import rollups, search
+    
+    changes = upgrade()
+    for change in changes:
+        print(f"  • {change}")
+    print(f"✅ Schema up to date ({len(changes)} changes)")
+    print(f"✅ Normalized contacts for {backfill()} existing quotes")
+    if rollups.unbuilt(db.session):
+        rollups.rebuild(db.session)
+        print("✅ Rollup tables built")
+    if search.unbuilt(db.session):
+        search.rebuild(db.session)
+        print("✅ Search index built")
+
+
+@app.cli.command('check-indexes')
+def check_indexes():
+    """Check that every hot query is served by an index"""
+    from app.schema import check_indexes as run_check
+    
+    failures = 0
+    for name, problems in run_check().items():
+        if problems:
+            failures += 1
+            print(f"❌ {name}")
+            for problem in problems:
+                print(f"     {problem}")
+        else:
+            print(f"✅ {name}")
+    if failures:
+        print(f"{failures} queries need an index (run flask upgrade-db)")
+        sys.exit(1)
+
+
+@app.cli.command('rebuild-rollups')
+@click.option('--check', 'check_only', is_flag=True, help='Only compare the rollups with the live tables')
+def rebuild_rollups(check_only):
+    """Recompute the rollup tables from the live tables and verify them"""
+    from app import rollups
+    
+    if not check_only:
+        for table, rows in rollups.rebuild(db.session).items():
+            print(f"  • {table}: {rows} rows")
+    failures = 0
+    for table, problems in rollups.check(db.session).items():
+        if problems:
+            failures += 1
+            print(f"❌ {table} ({len(problems)} rows differ)")
+            for problem in problems[:20]:
+                print(f"     {problem}")
+        else:
+            print(f"✅ {table}")
+    if failures:
+        print(f"{failures} rollup tables differ from the live tables (run flask rebuild-rollups)")
+        sys.exit(1)
+
+
+@app.cli.command('rebuild-search')
+def rebuild_search():
+    """Recompute the admin search index from the live tables"""
+    from app import search
+    
+    for kind, documents in search.rebuild(db.session).items():
+        print(f"  • {kind}: {documents} documents")
+    print("✅ Search index rebuilt")
+
+
 if __name__ == '__main__':
     app.run(
         host=os.environ.get('FLASK_HOST', '127.0.0.1'),
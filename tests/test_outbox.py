@@ -0,0 +1,170 @@
+"""Outbox worker against a local SMTP sink.
+
+The sink is a minimal SMTP server on 127.0.0.1 that records what it accepts
+and can answer the next DATA commands with a scripted error, so the worker's
+real SMTP path (Flask-Mail over smtplib) is exercised end to end.
+"""
+import socketserver
+import threading
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from app import create_app, db, outbox
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 30
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line: str):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        sink = self.server
+        self.reply('220 localhost sink')
+        recipients = []
+        for raw in self.rfile:
+            command = raw.decode('ascii').strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                recipients = []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip().strip('<>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = b''.join(iter(self.rfile.readline, b'.\r\n'))
+                if sink.rejections:
+                    self.reply(sink.rejections.pop(0))
+                else:
+                    sink.messages.append((recipients, data))
+                    self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.messages = []  # (recipients, raw message) accepted
+        self.rejections = []  # replies to the next DATA commands instead of 250
+
+
+@pytest.fixture
+def sink():
+    server = SMTPSink()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def app(sink, tmp_path, monkeypatch):
+    monkeypatch.setenv('MAIL_SERVER', '127.0.0.1')
+    monkeypatch.setenv('MAIL_PORT', str(sink.server_address[1]))
+    monkeypatch.setenv('MAIL_USE_TLS', 'False')
+    monkeypatch.setenv('MAIL_USERNAME', '')
+    monkeypatch.setenv('MAIL_PASSWORD', '')
+    monkeypatch.setenv('OUTBOX_MAX_ATTEMPTS', str(MAX_ATTEMPTS))
+    monkeypatch.setenv('OUTBOX_BACKOFF_BASE', str(BACKOFF_BASE))
+    # The database lives in the instance folder; keep it out of the checkout
+    monkeypatch.setattr('app.Flask', lambda name: Flask(name, instance_path=str(tmp_path)))
+    application = create_app()
+    with application.app_context():
+        yield application
+        db.session.remove()
+
+
+def _enqueue():
+    entry = outbox.enqueue('customer@example.com', 'Quote received', 'Thank you for your request',
+                           kind='confirmation')
+    db.session.commit()
+    return entry
+
+
+def _run_worker(entry) -> float:
+    """Run one worker pass; returns the seconds until the entry's next attempt"""
+    started = datetime.utcnow()
+    outbox.run_worker(once=True)
+    return (entry.next_attempt_at - started).total_seconds()
+
+
+def _make_due(entry):
+    entry.next_attempt_at = datetime.utcnow()
+    db.session.commit()
+
+
+def test_delivers_pending_email(app, sink):
+    entry = _enqueue()
+
+    outbox.run_worker(once=True)
+
+    assert entry.status == 'sent'
+    assert entry.attempts == 1
+    assert entry.sent_at is not None
+    [(recipients, data)] = sink.messages
+    assert recipients == ['customer@example.com']
+    assert b'Subject: Quote received' in data
+
+
+def test_retries_with_backoff_after_temporary_error(app, sink):
+    sink.rejections.append('451 4.3.0 Try again later')
+    entry = _enqueue()
+
+    delay = _run_worker(entry)
+
+    assert entry.status == 'pending'
+    assert entry.attempts == 1
+    assert '451' in entry.last_error
+    # First retry after OUTBOX_BACKOFF_BASE, with +-20% jitter
+    assert BACKOFF_BASE * 0.8 - 1 <= delay <= BACKOFF_BASE * 1.2 + 1
+    assert sink.messages == []
+
+    # Not due yet: another pass leaves it alone
+    outbox.run_worker(once=True)
+    assert entry.attempts == 1
+
+    _make_due(entry)
+    outbox.run_worker(once=True)
+
+    assert entry.status == 'sent'
+    assert entry.attempts == 2
+    assert entry.last_error is None
+    assert len(sink.messages) == 1
+
+
+def test_fails_permanently_after_max_attempts(app, sink):
+    sink.rejections.extend(['550 5.1.1 Mailbox unavailable'] * MAX_ATTEMPTS)
+    entry = _enqueue()
+
+    for attempt in range(1, MAX_ATTEMPTS):
+        delay = _run_worker(entry)
+        assert entry.status == 'pending'
+        assert entry.attempts == attempt
+        # The delay doubles with each attempt
+        expected = BACKOFF_BASE * 2 ** (attempt - 1)
+        assert expected * 0.8 - 1 <= delay <= expected * 1.2 + 1
+        _make_due(entry)
+
+    outbox.run_worker(once=True)
+
+    assert entry.status == 'failed'
+    assert entry.attempts == MAX_ATTEMPTS
+    assert '550' in entry.last_error
+    assert sink.messages == []
+
+    # A failed email is never picked up again
+    outbox.run_worker(once=True)
+    assert entry.attempts == MAX_ATTEMPTS